@@ -2,8 +2,10 @@
 
 import os, json, time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import helpers
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import FileSystemEventHandler
 
 
@@ -56,56 +58,83 @@ class ReadFileHandler(FileSystemEventHandler):
                 # Update the last processed time
                 self.last_processed_time = current_time
 
-class RaceDataPoller(threading.Thread):
+
+class _LobbyFeed:
+    """One lobby's ingest file. At most one tick per lobby runs at a time; frames that arrive meanwhile coalesce."""
+
+    def __init__(self, file_path, manager):
+        self.file_path = file_path
+        self.manager = manager
+        self.lock = threading.Lock()
+        self.running = False
+        self.pending = False
+
+
+class LobbyDataPoller(threading.Thread):
     """
-    Dedicated thread for watching the specified race data file. 
-    It finds the file path, determines the watch directory, and manages the thread.
+    Watches the raceData.json of every lobby with one observer and runs the ticks on a shared
+    worker pool, so a slow lobby (upload, file retries) doesn't hold up the others. Ticks of the
+    same lobby stay in order: while one runs, newer writes only mark the lobby dirty and the
+    latest frame is read once it finishes.
     """
-    # KEY CHANGE 1: Accept file_name as an argument
-    def __init__(self, file_name, shared_state_manager):
-        """
-        Requires the file name (e.g., 'raceData.json') and the RaceManager instance.
-        """
-        super().__init__()
-        self.manager = shared_state_manager 
-        self.observer = Observer()
+
+    def __init__(self, lobbies, use_polling=False, max_workers=None):
+        super().__init__(name="LobbyDataPoller")
+        self.observer = PollingObserver(timeout=0.05) if use_polling else Observer()
         self.stop_event = threading.Event()
-        self.file_name = file_name # Store the name
-        # --- Internal Path Resolution ---
-        self.file_path = helpers.findFile(self.file_name)
-        if not self.file_path:
-            raise FileNotFoundError(f"FATAL: The file '{self.file_name}' could not be found by helpers.findFile. Check helper.py logic or file location.")
-        self.file_dir = os.path.dirname(self.file_path)
-        # --------------------------------
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or min(len(lobbies), 4) or 1, thread_name_prefix="LobbyTick")
+        self.feeds = []
+        for lobby in lobbies:
+            file_path = self._resolve(lobby.ingest_path)
+            if not file_path:
+                print(f"CRITICAL ERROR: raceData for lobby {lobby.id} ({lobby.ingest_path}) could not be found. Lobby is not monitored.")
+                continue
+            self.feeds.append(_LobbyFeed(file_path, lobby.manager))
 
-    def run(self):
-        # The pipeline function called by the ReadFileHandler
-        def full_pipeline(file_path):
-            raw_data = readFile(file_path)
-            if raw_data is None: #Guardrail
-                # File read failed (e.g., all retries for partial write failed)
-                #print(f"[{self.name}] Skipped processing due to failed file read or empty data.")
+    def _resolve(self, path):
+        if not os.path.dirname(path): # Bare file name: registered resource of the original single lobby
+            path = helpers.resource_path(path)
+            if not path:
+                return None
+        os.makedirs(os.path.dirname(path), exist_ok=True) # The game may not have written it yet
+        return path
+
+    def _schedule(self, feed):
+        with feed.lock:
+            if feed.running:
+                feed.pending = True
                 return
-            self.manager.process_and_broadcast_data(raw_data) 
-
-        # Setup Watchdog: Pass the *resolved* path to the handler
-        event_handler = ReadFileHandler(
-            process_callback=full_pipeline, 
-            file_to_watch=self.file_path 
-        )
-        # We tell the observer to watch the directory containing the file
-        self.observer.schedule(event_handler, self.file_dir, recursive=False)
-        self.observer.start()
+            feed.running = True
+        self.pool.submit(self._drain, feed)
+
+    def _drain(self, feed):
+        while True:
+            raw_data = readFile(feed.file_path)
+            if raw_data is not None:
+                try:
+                    feed.manager.process_and_broadcast_data(raw_data)
+                except Exception as e:
+                    print(f"[{self.name}] Tick failed for {feed.file_path}: {type(e).__name__}: {e}")
+            with feed.lock:
+                if not feed.pending:
+                    feed.running = False
+                    return
+                feed.pending = False
 
-        print(f"[{self.name}] Poller started, watching {self.file_dir} for {self.file_name}")
-        
+    def run(self):
+        for feed in self.feeds:
+            event_handler = ReadFileHandler(process_callback=lambda _path, feed=feed: self._schedule(feed), file_to_watch=feed.file_path)
+            self.observer.schedule(event_handler, os.path.dirname(os.path.abspath(feed.file_path)), recursive=False)
+        self.observer.start()
+        print(f"[{self.name}] Watching {len(self.feeds)} lobby file(s): {', '.join(feed.file_path for feed in self.feeds)}")
         try:
             while not self.stop_event.is_set():
-                time.sleep(1) 
+                time.sleep(1)
         finally:
             self.observer.stop()
             self.observer.join()
+            self.pool.shutdown(wait=False)
             print(f"[{self.name}] Poller stopped.")
 
     def stop(self):
-        self.stop_event.set()
\ No newline at end of file
+        self.stop_event.set()
@@ -0,0 +1,293 @@
+import json, time
+import threading
+from collections import deque
+from multiprocessing.connection import Listener, Client
+from urllib.parse import urlparse
+
+# Frame bus between the race manager process and Socket.IO edge workers.
+# Every overlay used to hang off the one Flask-SocketIO process that also ingests raceData, so
+# the watchdog tick paid for writing each frame to every connected client. With the bus the
+# manager publishes each broadcast once and any number of stateless edge workers
+# (socket_edge.py) subscribe and fan it out to their own clients, on their own cores.
+#
+# Backends (SMARL_FANOUT):
+#   local://127.0.0.1:5070   stand-in broker inside the manager process (multiprocessing.connection)
+#   redis://localhost:6379/0  Redis pub/sub (needs the redis package)
+#
+# Ordering: frames carry a global sequence number and every hop (publisher outbox, per edge
+# outbox, edge receive loop) is a FIFO, so an edge sees frames in publish order. A hop that falls
+# behind never blocks the one before it: outboxes are bounded and conflate state frames (raceData,
+# overlayData, entrantState) by keeping only the newest pending one per namespace/event. Event
+# frames (raceEvents, fastestLap) are never conflated; they are only dropped if an outbox overflows
+# with nothing left to conflate. Edges notice the sequence gaps and count them.
+
+DEFAULT_CHANNEL = "smarl:frames"
+AUTHKEY = b"smarl-frames"
+OUTBOX_LIMIT = 512 # Frames pending per hop before the oldest is dropped
+RECONNECT_MIN = 0.5
+RECONNECT_MAX = 10.0
+
+
+class Outbox:
+    """Bounded FIFO of serialized frames. A new state frame supersedes the pending one with the same key."""
+
+    def __init__(self, limit=OUTBOX_LIMIT):
+        self.limit = limit
+        self.cond = threading.Condition()
+        self.items = deque() # [data or None (superseded), key]
+        self.pending = {} # key -> its entry still in items
+        self.size = 0 # Live entries
+        self.superseded = 0 # Dead entries still in items, compacted away once there are more than limit
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, data, key=None):
+        with self.cond:
+            if key is not None:
+                previous = self.pending.get(key)
+                if previous is not None: # Not sent yet: the newer state replaces it (at the back, order kept)
+                    previous[0] = None
+                    self.size -= 1
+                    self.superseded += 1
+                    self.dropped += 1
+            entry = [data, key]
+            self.items.append(entry)
+            self.size += 1
+            if key is not None:
+                self.pending[key] = entry
+            while self.size > self.limit:
+                oldest = self.items.popleft()
+                if oldest[0] is None:
+                    self.superseded -= 1
+                else:
+                    self._forget(oldest)
+                    self.size -= 1
+                    self.dropped += 1
+            if self.superseded > self.limit: # Nobody is draining: keep items bounded by 2 * limit
+                self.items = deque(entry for entry in self.items if entry[0] is not None)
+                self.superseded = 0
+            self.cond.notify()
+
+    def _forget(self, entry):
+        if entry[1] is not None and self.pending.get(entry[1]) is entry:
+            del self.pending[entry[1]]
+
+    def get(self, timeout=None):
+        """Next frame in order, or None when closed/timed out."""
+        with self.cond:
+            while True:
+                while self.items and self.items[0][0] is None:
+                    self.items.popleft() # Superseded
+                    self.superseded -= 1
+                if self.items:
+                    entry = self.items.popleft()
+                    self._forget(entry)
+                    self.size -= 1
+                    return entry[0]
+                if self.closed or not self.cond.wait(timeout):
+                    return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+def encode_frame(seq, namespace, event, data, codec_encoded=False, to=None):
+    return json.dumps({'seq': seq, 'ns': namespace, 'ev': event, 'data': data, 'enc': codec_encoded, 'to': to},
+                      separators=(',', ':')).encode()
+
+
+# --- Publisher side (race manager process) ---
+class FramePublisher:
+    """publish() serializes once and returns; a sender thread hands frames to the backend."""
+
+    def __init__(self, url, conflate_events=('raceData', 'overlayData', 'entrantState')):
+        self.url = url
+        self.conflate_events = set(conflate_events)
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.outbox = Outbox()
+        self.backend = _make_backend(url)
+        self.sender = threading.Thread(target=self._send_loop, name="FramePublisher", daemon=True)
+        self.sender.start()
+        print(f"Frame bus publishing to {url}")
+
+    def publish(self, namespace, event, data, codec_encoded=False, to=None):
+        key = (namespace, event, to) if event in self.conflate_events else None
+        with self.lock: # Sequence numbers are assigned in outbox order
+            self.seq += 1
+            self.outbox.put((encode_frame(self.seq, namespace, event, data, codec_encoded, to), key), key)
+
+    def _send_loop(self):
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                return
+            frame, key = item
+            try:
+                self.backend.send(frame, key) # The key travels with the frame, backends never parse it
+            except Exception as e:
+                print(f"Frame bus send failed ({type(e).__name__}: {e})")
+
+    def stats(self):
+        return {'seq': self.seq, 'pending': self.outbox.size, 'dropped': self.outbox.dropped, **self.backend.stats()}
+
+    def close(self):
+        self.outbox.close()
+        self.backend.close()
+
+
+def _make_backend(url):
+    parsed = urlparse(url)
+    if parsed.scheme == 'local':
+        return LocalBroker(parsed.hostname or '127.0.0.1', parsed.port or 5070)
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown frame bus url {url} (use local://host:port or redis://...)")
+
+
+class LocalBroker:
+    """Stand-in for Redis: edges connect over a local socket and each gets its own outbox and sender thread."""
+
+    def __init__(self, host, port):
+        self.listener = Listener((host, port), authkey=AUTHKEY)
+        self.lock = threading.Lock()
+        self.edges = [] # [(outbox, address)]
+        threading.Thread(target=self._accept_loop, name="FrameBroker", daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except OSError: # Closed
+                return
+            except Exception as e: # Bad auth, half open connection...
+                print(f"Frame bus: rejected edge connection ({type(e).__name__}: {e})")
+                continue
+            outbox = Outbox()
+            address = self.listener.last_accepted
+            with self.lock:
+                self.edges.append((outbox, address))
+            print(f"Frame bus: edge connected from {address}")
+            threading.Thread(target=self._edge_loop, args=(conn, outbox, address), name="FrameEdgeSender", daemon=True).start()
+
+    def _edge_loop(self, conn, outbox, address):
+        try:
+            while True:
+                frame = outbox.get()
+                if frame is None:
+                    return
+                conn.send_bytes(frame) # Only this edge's thread waits on a slow edge
+        except (OSError, EOFError):
+            print(f"Frame bus: edge {address} disconnected")
+        finally:
+            with self.lock:
+                self.edges = [edge for edge in self.edges if edge[0] is not outbox]
+            outbox.close()
+            conn.close()
+
+    def send(self, frame, key=None):
+        """Queues frame for every edge. key: conflation key from FramePublisher.publish (None: always deliver)."""
+        with self.lock:
+            edges = list(self.edges)
+        for outbox, _ in edges:
+            outbox.put(frame, key)
+
+    def stats(self):
+        with self.lock:
+            return {'edges': len(self.edges), 'edge_dropped': sum(outbox.dropped for outbox, _ in self.edges)}
+
+    def close(self):
+        self.listener.close()
+
+
+class RedisBackend:
+    def __init__(self, url, channel=DEFAULT_CHANNEL):
+        import redis # Optional dependency, only needed for redis:// buses
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+        self.subscribers = 0
+
+    def send(self, frame, key=None):
+        self.subscribers = self.client.publish(self.channel, frame)
+
+    def stats(self):
+        return {'edges': self.subscribers}
+
+    def close(self):
+        self.client.close()
+
+
+# --- Subscriber side (edge workers) ---
+class FrameSubscriber:
+    """Receives frames in order on its own thread and calls handler(frame dict). Reconnects with backoff."""
+
+    def __init__(self, url, handler, channel=DEFAULT_CHANNEL):
+        self.url = url
+        self.handler = handler
+        self.channel = channel
+        self.last_seq = None
+        self.gaps = 0 # Frames the edge never saw (conflated or dropped upstream)
+        self.received = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="FrameSubscriber", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        parsed = urlparse(self.url)
+        delay = RECONNECT_MIN
+        while self.running:
+            try:
+                if parsed.scheme == 'local':
+                    self._run_local(parsed.hostname or '127.0.0.1', parsed.port or 5070)
+                else:
+                    self._run_redis()
+                delay = RECONNECT_MIN
+            except Exception as e:
+                print(f"Frame bus connection lost ({type(e).__name__}: {e}). Retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def _run_local(self, host, port):
+        conn = Client((host, port), authkey=AUTHKEY)
+        print(f"Frame bus: subscribed to {self.url}")
+        try:
+            while self.running:
+                self._deliver(conn.recv_bytes())
+        finally:
+            conn.close()
+
+    def _run_redis(self):
+        import redis
+        pubsub = redis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        print(f"Frame bus: subscribed to {self.url} ({self.channel})")
+        try:
+            for message in pubsub.listen():
+                if not self.running:
+                    return
+                self._deliver(message['data'])
+        finally:
+            pubsub.close()
+
+    def _deliver(self, raw):
+        frame = json.loads(raw)
+        seq = frame['seq']
+        if self.last_seq is not None:
+            if seq <= self.last_seq: # Publisher restarted
+                self.last_seq = None
+            elif seq > self.last_seq + 1:
+                self.gaps += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.received += 1
+        try:
+            self.handler(frame)
+        except Exception as e:
+            print(f"Frame handler error ({frame.get('ev')}): {type(e).__name__}: {e}")
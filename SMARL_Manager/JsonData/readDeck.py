@@ -1,234 +1,207 @@
 from pynput.keyboard import Listener  as KeyboardListener
 from pynput.mouse    import Listener  as MouseListener
 from pynput.keyboard import Key
-import time
+import os, sys, time
+import queue
+import threading
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir))
+import helpers # SMARL_Manager/helpers.py (atomic_write_json)
 #very hard coded and not dynamic because yolo
 
-_Running = True
-
-
-def outputZoomIn():
-    output =  "{\"zoomIn\": \"true\", \"zoomOut\": \"false\"}"
-    print("Writing  "+" - " +output)
-    with open('zoomControls.json', 'w') as outfile:
-        outfile.write(output)
-
-def outputZoomOut():
-    output =  "{\"zoomIn\": \"false\", \"zoomOut\": \"true\"}"
-    print("Writing  "+" - " +output)
-    with open('zoomControls.json', 'w') as outfile:
-        outfile.write(output)
-
-def outputStopInput():
-    output =  "{\"zoomIn\": \"false\", \"zoomOut\": \"false\"}"
-    print("Writing  "+" - " +output)
-    with open('zoomControls.json', 'w') as outfile:
-        outfile.write(output)
-
+# Stream deck / hotkey input for the game.
+# The listener callbacks used to open and rewrite cameraInput.json / zoomControls.json right
+# inside pynput's on_press/on_click, so key repeat and fast clicks meant dozens of full file
+# writes per second, and the game could read a half written file.
+#
+# Now the callbacks only put an event on a queue. One writer thread owns both files: it drains
+# the queue, coalesces what arrived since its last write (zoom keeps only the latest state,
+# camera commands keep their order) and writes each changed file once per game poll (DECK_TICK),
+# atomically (helpers.atomic_write_json). An event arriving after a quiet period is written at
+# once; only bursts wait for the next tick. A write that fails (on Windows os.replace raises
+# PermissionError while the game has the file open) keeps that file dirty and is retried every tick.
+#
+# Every command gets a sequence number. cameraInput.json carries the last COMMAND_HISTORY
+# commands with their seq plus the writer's session, so TwitchManager.readStreamDeck runs each
+# command exactly once without clearing the file (readDeck.py stays the only writer).
+
+CAMERA_FILE = 'cameraInput.json'
+ZOOM_FILE = 'zoomControls.json'
+DECK_TICK = 0.05 # TwitchManager.readStreamDeck polls every 0.05s
+COMMAND_HISTORY = 16 # Commands kept in the file for a reader that missed a poll
+
+KEY_COMMANDS = {
+    "/": ("cMode", "0"), # race cam
+    "`": ("cMode", "1"), # Drone cam
+    "\\": ("cMode", "2"), # Free cam
+    ",": ("cMode", "3"), # onboard cam
+    "~": ("exit", "0"),
+    "[": ("focusCycle", "-1"),
+    "]": ("focusCycle", "1"),
+    ";": ("camCycle", "-1"),
+    "'": ("camCycle", "1"),
+}
+SPECIAL_KEY_COMMANDS = {
+    Key.f1: ("autoFocus", "1"), # Toggle auto focus
+    Key.f2: ("autoFocus", "2"), # Toggle auto switch
+    Key.f3: ("autoSwitch", "1"), # auto focus once
+    Key.f4: ("autoSwitch", "2"), # auto switch once
+    Key.f5: ("raceMode", "0"),
+    Key.f6: ("raceMode", "1"),
+    Key.f7: ("raceMode", "2"),
+    Key.f8: ("raceMode", "3"),
+}
+ZOOM_KEYS = {"=": "in", "-": "out"} #TODO also read mousebuttond 3 and 4
+
+
+class InputChannel:
+    """Queue fed by the listeners, drained by one writer thread."""
+
+    def __init__(self, directory="."):
+        self.camera_path = os.path.join(directory, CAMERA_FILE)
+        self.zoom_path = os.path.join(directory, ZOOM_FILE)
+        self.events = queue.SimpleQueue()
+        self.session = int(time.time() * 1000) # Lets the game tell a restarted writer from an old file
+        self.seq = 0
+        self.commands = [] # Last COMMAND_HISTORY {"seq", "command", "value"}
+        self.zoom = None # "in", "out" or "stop"
+        self.zoom_written = None
+        self.camera_dirty = False
+        self.write_failed = False # Logged once per failure streak (the game holding a file open on Windows)
+        self.last_write = 0.0
+        self.writes = 0
+        self.events_in = 0
+        self.thread = threading.Thread(target=self._run, name="deck-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.events.put(None)
+        self.thread.join(timeout=1)
+
+    # --- Called from the pynput threads: never touch the files here ---
+    def command(self, command, value):
+        self.events.put(("command", command, value))
+
+    def set_zoom(self, state):
+        self.events.put(("zoom", state))
+
+    # --- Writer thread ---
+    def _run(self):
+        running = True
+        while running:
+            try:
+                # Something the last flush could not write is retried every tick, otherwise wait for input
+                event = self.events.get(timeout=DECK_TICK) if self._pending() else self.events.get()
+            except queue.Empty:
+                self._flush()
+                continue
+            # Coalesce everything that arrives until the next tick (nothing to wait for after a quiet period)
+            deadline = self.last_write + DECK_TICK
+            while event is not None:
+                self._apply(event)
+                remaining = deadline - time.monotonic()
+                try:
+                    event = self.events.get_nowait() if remaining <= 0 else self.events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            running = event is not None # None is stop()
+            self._flush()
+
+    def _apply(self, event):
+        self.events_in += 1
+        if event[0] == "zoom":
+            self.zoom = event[1]
+            return
+        _, command, value = event
+        self.seq += 1
+        self.commands.append({"seq": self.seq, "command": command, "value": value})
+        del self.commands[:-COMMAND_HISTORY]
+        self.camera_dirty = True
+
+    def _pending(self):
+        return self.camera_dirty or (self.zoom is not None and self.zoom != self.zoom_written)
+
+    def _write(self, path, data):
+        """atomic_write_json that reports failure instead of raising (the file stays dirty and is retried)."""
+        try:
+            helpers.atomic_write_json(path, data)
+        except OSError as e:
+            if not self.write_failed:
+                print(f"Could not write {path} ({e}), retrying every {DECK_TICK}s")
+                self.write_failed = True
+            return False
+        if self.write_failed:
+            print("Deck files writable again")
+            self.write_failed = False
+        return True
+
+    def _flush(self):
+        wrote = []
+        if self.camera_dirty:
+            latest = self.commands[-1]
+            if self._write(self.camera_path, {
+                "session": self.session, "seq": latest["seq"],
+                "command": latest["command"], "value": latest["value"], # Same fields as the old single command file
+                "commands": self.commands,
+            }):
+                self.camera_dirty = False
+                wrote.append(f"{latest['command']} {latest['value']} (seq {latest['seq']})")
+        if self.zoom is not None and self.zoom != self.zoom_written:
+            zoom = self.zoom
+            if self._write(self.zoom_path, {
+                "zoomIn": "true" if zoom == "in" else "false",
+                "zoomOut": "true" if zoom == "out" else "false",
+                "seq": self.seq,
+            }):
+                self.zoom_written = zoom
+                wrote.append(f"zoom {zoom}")
+        if wrote:
+            self.writes += 1
+            self.last_write = time.monotonic()
+            print(f"Writing - {', '.join(wrote)} ({self.events_in} events, {self.writes} writes)")
+
+
+_Channel = None
 
 
 def on_press(key):
-    global _Running
     #print("got ",key)
-    try:
-        result = key.char
-        if key.char == "=": #TODO also read mousebuttond 3 and 4
-            #print("zooming in")
-            outputZoomIn()
-
-        if key.char == "-":
-            #print("zoom out")
-            outputZoomOut()
-       
-        if key.char == "/":
-            output =  "{\"command\": \"cMode\", \"value\": \"0\"}" # race cam
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-        
-        if key.char == "`":
-            output =  "{\"command\": \"cMode\", \"value\": \"1\"}" # Drone cam
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-        
-        if key.char == "\\":
-            output =  "{\"command\": \"cMode\", \"value\": \"2\"}" # Free cam
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-
-        if key.char == ",":
-            output =  "{\"command\": \"cMode\", \"value\": \"3\"}" # onboard cam
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-
-       
-        if key.char == "~":
-            output =  "{\"command\": \"exit\", \"value\": \"0\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-
-        if key.char == "[":
-            output =  "{\"command\": \"focusCycle\", \"value\": \"-1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-        if key.char == "]":
-            output =  "{\"command\": \"focusCycle\", \"value\": \"1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-
-        if key.char == ";":
-            output =  "{\"command\": \"camCycle\", \"value\": \"-1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile:
-                outfile.write(output)
-        if key.char == "'":
-            output =  "{\"command\": \"camCycle\", \"value\": \"1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: # TODO: Can techincally have all this just be called to one output/writing command to save space
-                outfile.write(output)
-
-        
-
-    except:
-        #print(key)
-        if key == Key.end:
-            print("Exiting")
-            _Running = False
-            return False
-        
-
-        if key == Key.f1: # Toggle auto focus
-            output =  "{\"command\": \"autoFocus\", \"value\": \"1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #
-                outfile.write(output)
-        
-        if key == Key.f2: # Toggle auto switch
-            output =  "{\"command\": \"autoFocus\", \"value\": \"2\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #
-                outfile.write(output)
-
-        if key == Key.f3: # auto focus once
-            output =  "{\"command\": \"autoSwitch\", \"value\": \"1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #
-                outfile.write(output)
-        
-        if key == Key.f4: # auto switch once
-            output =  "{\"command\": \"autoSwitch\", \"value\": \"2\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #
-                outfile.write(output)
-
-        if key == Key.f5:
-            output =  "{\"command\": \"raceMode\", \"value\": \"0\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #TODO: rename cmaerainput to just control input to unify terms
-                outfile.write(output)
-
-        if key == Key.f6:
-            output =  "{\"command\": \"raceMode\", \"value\": \"1\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #TODO: rename cmaerainput to just control input to unify terms
-                outfile.write(output)
-
-        if key == Key.f7:
-            output =  "{\"command\": \"raceMode\", \"value\": \"2\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #TODO: rename cmaerainput to just control input to unify terms
-                outfile.write(output)
-
-        if key == Key.f8:
-            output =  "{\"command\": \"raceMode\", \"value\": \"3\"}"
-            print("Writing  "+" - " +output)
-            with open('cameraInput.json', 'w') as outfile: #TODO: rename cmaerainput to just control input to unify terms
-                outfile.write(output)
-        
-       
-
-        pass
-   
-def on_release(key):
-    try:
-        result = key.char
-        if key.char == "=":
-            outputStopInput()
+    char = getattr(key, 'char', None)
+    if char is not None:
+        if char in ZOOM_KEYS:
+            _Channel.set_zoom(ZOOM_KEYS[char])
+        elif char in KEY_COMMANDS:
+            _Channel.command(*KEY_COMMANDS[char])
+        return
+    if key == Key.end:
+        print("Exiting")
+        return False
+    if key in SPECIAL_KEY_COMMANDS: #TODO: rename cmaerainput to just control input to unify terms
+        _Channel.command(*SPECIAL_KEY_COMMANDS[key])
 
-        if key.char == "-":
-            outputStopInput()
-    except:
-        pass 
-    
-    #if key == keyboard.Key.esc:
-    #    # Stop listener
-    #    return False
-
-
-
-def on_move(x, y):
-    pass
-    #print('Pointer moved to {0}'.format(
-    #    (x, y)))
+def on_release(key):
+    if getattr(key, 'char', None) in ZOOM_KEYS:
+        _Channel.set_zoom("stop")
 
 def on_click(x, y, button, pressed):
-    if pressed:
-        if button == button.x1:
-            outputZoomOut()
-        if button == button.x2:
-            outputZoomIn()
-    #print('{0} at {1}'.format(
-    #   'Pressed' if pressed else 'Released',
-    #   (x, y)))
-    if not pressed:
-        if button == button.x1:
-            outputStopInput()
-        if button == button.x2:
-            outputStopInput()
-        
-
-def on_scroll(x, y, dx, dy):
-    pass
-    #print('Scrolled {0} at {1}'.format(
-    #    'down' if dy < 0 else 'up',
-    #    (x, y)))
-
-# Collect events until released
-
-
-# Collect events until released
-#Klistener = keyboard.Listener(
-#        on_press=on_press,
-#        on_release=on_release)
-
-# ...or, in a non-blocking fashion:
-#Mlistener = mouse.Listener(
-#    on_move=on_move,
-#    on_click=on_click,
-#    on_scroll=on_scroll)
+    if button == button.x1:
+        _Channel.set_zoom("out" if pressed else "stop")
+    if button == button.x2:
+        _Channel.set_zoom("in" if pressed else "stop")
+
 
 def main():
-    global _Running
+    global _Channel
+    _Channel = InputChannel(sys.argv[1] if len(sys.argv) > 1 else ".").start()
     print("Running listener")
-    with MouseListener(on_click=on_click) as listener:
+    with MouseListener(on_click=on_click):
         with KeyboardListener(on_press=on_press) as listener:
             listener.join()
+    _Channel.stop()
     print("Finished listener")
-    #Klistener.start()
-    #Mlistener.start()
-    
-    #while _Running:
-    #    if time.time()-LastTime >= 5: # the break time,5 is second
-    #        print("You need break your computer")
-    #        LastTime = time.time()
-    #    if _Running == False:
-    #        print("Exiting")
-
-    
-main()
+
+
+if __name__ == '__main__':
+    main()
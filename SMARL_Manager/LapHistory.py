@@ -0,0 +1,202 @@
+import threading
+import numpy as np
+
+# Per-racer lap history kept in preallocated NumPy ring buffers.
+# Previously the only lap info was the lastLap/bestLap strings in each raceData tick, so every
+# overlay rebuilt its own history client side and lost it on reload. The store records each lap
+# once (when a racer's lap number goes up), never allocates on append, and computes stats with
+# vectorized NumPy calls so /api/lap_history stays cheap no matter how often it is polled.
+
+MAX_LAPS = 256 # Laps kept per racer before the oldest are overwritten
+NUM_SECTORS = 3 # Matches driver.sectorTimes in DriverGen8.lua
+ROLLING_WINDOW = 5 # Laps used for the rolling average
+
+
+class RacerLapBuffer:
+    """Fixed size ring buffer of one racer's laps (lap number, time, sector splits, position at the line)."""
+
+    def __init__(self, capacity=MAX_LAPS):
+        self.capacity = capacity
+        self.lap_nums = np.zeros(capacity, dtype=np.int32)
+        self.lap_times = np.full(capacity, np.nan, dtype=np.float64)
+        self.sectors = np.full((capacity, NUM_SECTORS), np.nan, dtype=np.float64)
+        self.positions = np.zeros(capacity, dtype=np.int16)
+        self.head = 0 # Next slot to write
+        self.count = 0
+
+    def append(self, lap_num, lap_time, sectors, position):
+        """O(1): writes into the next slot, overwriting the oldest lap when full."""
+        i = self.head
+        self.lap_nums[i] = lap_num
+        self.lap_times[i] = lap_time if lap_time > 0 else np.nan # 0.0 means no valid time from the game
+        self.sectors[i] = sectors
+        self.positions[i] = position
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def set_last_sectors(self, lap_num, sectors):
+        """Fills in the splits of the newest lap if it is still lap_num. Returns False otherwise."""
+        i = (self.head - 1) % self.capacity
+        if self.count == 0 or self.lap_nums[i] != lap_num:
+            return False
+        self.sectors[i] = sectors
+        return True
+
+    def _order(self):
+        """Indices of the stored laps, oldest first."""
+        if self.count < self.capacity:
+            return np.arange(self.count)
+        return (np.arange(self.capacity) + self.head) % self.capacity
+
+    def ordered(self):
+        """Returns (lap_nums, lap_times, sectors, positions) in chronological order."""
+        order = self._order()
+        return self.lap_nums[order], self.lap_times[order], self.sectors[order], self.positions[order]
+
+
+def compute_stats(lap_times, window=ROLLING_WINDOW):
+    """Vectorized stats over a chronological array of lap times (NaN = invalid lap)."""
+    valid = lap_times[~np.isnan(lap_times)]
+    if valid.size == 0:
+        return {'laps': int(lap_times.size), 'mean': None, 'stddev': None, 'best': None,
+                'rolling_best': [], 'rolling_mean': []}
+    # Best lap so far at every lap (NaN laps carry the previous best forward)
+    rolling_best = np.fmin.accumulate(lap_times)
+    # Mean of the last `window` valid laps at every lap
+    filled = np.nan_to_num(lap_times)
+    counts = np.cumsum(~np.isnan(lap_times))
+    sums = np.cumsum(filled)
+    lagged_sums = np.concatenate((np.zeros(window), sums[:-window])) if sums.size > window else np.zeros(sums.size)
+    lagged_counts = np.concatenate((np.zeros(window), counts[:-window])) if counts.size > window else np.zeros(counts.size)
+    window_counts = counts - lagged_counts
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolling_mean = np.where(window_counts > 0, (sums - lagged_sums) / window_counts, np.nan)
+    return {
+        'laps': int(lap_times.size),
+        'mean': round(float(valid.mean()), 3),
+        'stddev': round(float(valid.std()), 3),
+        'best': round(float(valid.min()), 3),
+        'rolling_best': _to_list(rolling_best),
+        'rolling_mean': _to_list(rolling_mean)
+    }
+
+
+def _to_list(array):
+    """Rounds to milliseconds and turns NaN into None so the result is valid JSON."""
+    return [None if np.isnan(v) else v for v in np.round(array, 3).tolist()]
+
+
+def racer_key(racer_id):
+    """Game ids arrive as floats (1.0); every store keys racers by the plain string id ("1")."""
+    return str(int(racer_id)) if isinstance(racer_id, float) else str(racer_id)
+
+
+class LapHistoryStore:
+    """Thread-safe lap history for every racer in the current session."""
+
+    def __init__(self, capacity=MAX_LAPS):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.buffers = {} # racer_id -> RacerLapBuffer
+        self.last_lap_num = {} # racer_id -> last lap number seen in realtime data
+        self.last_sector_lap = {} # racer_id -> last 'lsn' seen (bumped by the game when 'lst' changes)
+        self.ready_sectors = {} # racer_id -> completed splits that arrived before their lap number went up
+        self.awaiting_sectors = {} # racer_id -> recorded lap whose splits have not arrived yet
+
+    def record_realtime(self, rt_list):
+        """
+        Feeds one tick of raw realtime ('rt') racer data. A lap is recorded only when the racer's
+        lap number increases, so repeated ticks of the same lap are ignored.
+        'st' is reset by the game as soon as a car enters sector 1, so the last split is never seen
+        there. Splits come from 'lst' (the completed lap's sectors, re-sent with a new 'lsn' each lap),
+        which can land a tick before or after the lap number goes up; either order is matched here.
+        Returns the laps completed this tick as [(racer_id, lap_num, lap_time_seconds), ...].
+        """
+        completed = []
+        with self.lock:
+            for data in rt_list:
+                racer_id = data.get('id')
+                if racer_id is None:
+                    continue
+                racer_id = racer_key(racer_id)
+                lap_num = int(data.get('lap', data.get('lapNum', 0)) or 0)
+                previous = self.last_lap_num.get(racer_id)
+                self.last_lap_num[racer_id] = lap_num
+                self._take_sectors(racer_id, data, first_sighting=previous is None)
+                if previous is not None and lap_num < previous:
+                    self.ready_sectors.pop(racer_id, None) # Reset; splits of the old run no longer apply
+                    self.awaiting_sectors.pop(racer_id, None)
+                if previous is None or lap_num <= previous:
+                    continue # First sighting or same lap (or a reset); nothing completed yet
+                buffer = self.buffers.get(racer_id)
+                if buffer is None:
+                    buffer = self.buffers[racer_id] = RacerLapBuffer(self.capacity)
+                lap_time = float(data.get('lastLap', 0.0) or 0.0)
+                if 'lsn' in data:
+                    sectors = self.ready_sectors.pop(racer_id, None)
+                    if sectors is None:
+                        sectors = np.full(NUM_SECTORS, np.nan)
+                        self.awaiting_sectors[racer_id] = lap_num - 1
+                else:
+                    sectors = _parse_sectors(data.get('st')) # Older game scripts without 'lst'
+                buffer.append(lap_num - 1, lap_time, sectors, int(data.get('place', 0) or 0))
+                completed.append((racer_id, lap_num - 1, lap_time))
+        return completed
+
+    def _take_sectors(self, racer_id, data, first_sighting):
+        """Picks up a new 'lst' set and gives it to the lap waiting for it, or keeps it for the next one."""
+        sector_lap = data.get('lsn')
+        if sector_lap is None or sector_lap == self.last_sector_lap.get(racer_id):
+            return
+        self.last_sector_lap[racer_id] = sector_lap
+        if first_sighting:
+            return # Splits of a lap that was never recorded here
+        sectors = _parse_sectors(data.get('lst'))
+        lap_num = self.awaiting_sectors.pop(racer_id, None)
+        buffer = self.buffers.get(racer_id)
+        if lap_num is None or buffer is None or not buffer.set_last_sectors(lap_num, sectors):
+            self.ready_sectors[racer_id] = sectors
+
+    def racer_history(self, racer_id):
+        """Compact history + stats for one racer, or None if nothing was recorded."""
+        with self.lock:
+            buffer = self.buffers.get(str(racer_id))
+            if buffer is None:
+                return None
+            lap_nums, lap_times, sectors, positions = buffer.ordered()
+        return {
+            'racer_id': str(racer_id),
+            'lap_nums': lap_nums.tolist(),
+            'lap_times': _to_list(lap_times),
+            'sectors': [_to_list(col) for col in sectors.T], # One list per sector
+            'positions': positions.tolist(),
+            'stats': compute_stats(lap_times)
+        }
+
+    def all_history(self):
+        with self.lock:
+            racer_ids = list(self.buffers)
+        return {racer_id: self.racer_history(racer_id) for racer_id in racer_ids}
+
+    def reset(self):
+        """Clears everything (new race)."""
+        with self.lock:
+            self.buffers.clear()
+            self.last_lap_num.clear()
+            self.last_sector_lap.clear()
+            self.ready_sectors.clear()
+            self.awaiting_sectors.clear()
+
+
+def _parse_sectors(raw_sectors):
+    """Sector splits arrive as a list of floats (or an empty string before the first sector)."""
+    sectors = np.full(NUM_SECTORS, np.nan)
+    if isinstance(raw_sectors, (list, tuple)):
+        for i, value in enumerate(raw_sectors[:NUM_SECTORS]):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if value > 0:
+                sectors[i] = value
+    return sectors
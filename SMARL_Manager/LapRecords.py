@@ -0,0 +1,225 @@
+import os, json, time
+import threading
+import helpers
+import laptime
+from LapHistory import racer_key
+
+# Incremental fastest-lap / track record tracker.
+# The fastest lap used to be found by rescanning: every racer's bestLap against every other
+# (determineFastestLap, O(n^2) with a datetime per comparison), the finish data again at upload
+# time (getFastestLap_racer) and all user stats at startup (_load_track_record). The tracker is
+# fed each completed lap once and keeps the session best, each racer's personal best, the
+# all-time best for the current track and the last lap's delta to the racer's personal best,
+# all updated in O(1) per lap. The track record is persisted per track id and listeners get a
+# 'fastest lap' event whenever the session best or the track record is beaten; a lap that beats
+# both sends both events, session first.
+#
+# Ids: racer_id is always the car id of the live data (racer_key), the key every lap is fed
+# with. owner_id is the racer's stats/league id (raw 'owner'), the one that survives a
+# restart. A record migrated from the user stats only knows the owner, so its racer_id is None.
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+RECORDS_PATH = os.path.join(dir_path, "JsonData/TrackRecords")
+DEFAULT_TRACK_ID = "default" # Twitch races have no league track id
+
+SCOPE_SESSION = 'session'
+SCOPE_TRACK = 'track'
+
+
+class LapRecordTracker:
+    """Session/personal/track bests for the current track. All times are int ms."""
+
+    def __init__(self, track_id=DEFAULT_TRACK_ID, base_path=RECORDS_PATH):
+        self.base_path = base_path
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.version = 0 # Bumped whenever the session best or the track record changes
+        self.personal_best = {} # racer_id -> ms
+        self.last_delta = {} # racer_id -> last lap minus personal best before that lap (ms, None for a first lap)
+        self.session_best = None # {'time_ms', 'racer_id', 'name', 'lap'}
+        self.track_id = None
+        self.track_record = None # {'time_ms', 'racer_id', 'owner_id', 'name', 'set_at'}
+        self.set_track(track_id)
+
+    # --- Track records ---
+    def _record_path(self, track_id):
+        return os.path.join(self.base_path, f"{track_id}.json")
+
+    def set_track(self, track_id):
+        """Switches to track_id and loads its saved record (if any)."""
+        track_id = str(track_id or DEFAULT_TRACK_ID)
+        record = None
+        try:
+            with open(self._record_path(track_id), 'r') as infile:
+                record = json.load(infile)
+            record['time_ms'] = laptime.parse(record.get('time')) # The file keeps the readable "MM:SS.mmm"
+            if record['time_ms'] is None:
+                record = None
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"Lap records: ignoring unreadable record for track {track_id}: {e}")
+        with self.lock:
+            self.track_id = track_id
+            self.track_record = record
+            self.version += 1
+        return record
+
+    def has_saved_record(self):
+        return os.path.exists(self._record_path(self.track_id))
+
+    def _save_track_record(self, record):
+        os.makedirs(self.base_path, exist_ok=True)
+        helpers.atomic_write_json(self._record_path(self.track_id), {
+            'track_id': self.track_id,
+            'time': laptime.format_ms(record['time_ms']),
+            'racer_id': record['racer_id'],
+            'owner_id': record.get('owner_id'),
+            'name': record['name'],
+            'set_at': record['set_at']
+        }, indent=4)
+
+    def seed_track_record(self, owner_id, name, time_ms):
+        """
+        Sets the record without an event, e.g. when migrating an old best lap from the user stats
+        (keyed by owner, no car of this session set it). Only lowers it.
+        """
+        if time_ms is None:
+            return False
+        with self.lock:
+            if self.track_record is not None and time_ms >= self.track_record['time_ms']:
+                return False
+            record = {'time_ms': time_ms, 'racer_id': None, 'owner_id': racer_key(owner_id) if owner_id is not None else None,
+                      'name': name, 'set_at': time.time()}
+            self.track_record = record
+            self.version += 1
+        self._save_track_record(record)
+        return True
+
+    def reset_track_record(self):
+        """Forgets the current track's record (track layout changed)."""
+        with self.lock:
+            self.track_record = None
+            self.version += 1
+        try:
+            os.remove(self._record_path(self.track_id))
+        except FileNotFoundError:
+            pass
+
+    # --- Laps ---
+    def add_listener(self, callback):
+        """Registers callback(event) to run whenever the session best or track record is beaten (once per scope)."""
+        if callback not in self.listeners:
+            self.listeners.append(callback)
+
+    def record_lap(self, racer_id, name, time_ms, lap=None, completed_lap=True, owner_id=None):
+        """
+        Feeds one lap. O(1): compares against the racer's personal best, the session best and the
+        track record. Re-feeding a time that is not faster changes nothing, so the bestLap of
+        finish data can be passed through with completed_lap=False (leaves the last lap delta alone).
+        owner_id (the raw 'owner') is kept with a track record so it can be tied to the user stats.
+        Returns the fastest lap events in order: a lap that beats both the session best and the track
+        record gives a 'session' event followed by a 'track' event (empty list if neither was beaten).
+        """
+        if time_ms is None or racer_id is None:
+            return []
+        racer_id = racer_key(racer_id)
+        events = []
+        save = None
+        with self.lock:
+            previous_pb = self.personal_best.get(racer_id)
+            if completed_lap:
+                self.last_delta[racer_id] = time_ms - previous_pb if previous_pb is not None else None
+            if previous_pb is None or time_ms < previous_pb:
+                self.personal_best[racer_id] = time_ms
+
+            if self.session_best is None or time_ms < self.session_best['time_ms']:
+                previous = self.session_best
+                self.session_best = {'time_ms': time_ms, 'racer_id': racer_id, 'name': name, 'lap': lap}
+                self.version += 1
+                events.append(_event(SCOPE_SESSION, self.session_best, previous, self.track_id))
+
+            if self.track_record is None or time_ms < self.track_record['time_ms']:
+                previous = self.track_record
+                save = self.track_record = {'time_ms': time_ms, 'racer_id': racer_id, 'name': name, 'set_at': time.time(),
+                                            'owner_id': racer_key(owner_id) if owner_id is not None else None}
+                self.version += 1
+                events.append(_event(SCOPE_TRACK, dict(save, lap=lap), previous, self.track_id))
+        if save is not None:
+            print(f"NEW TRACK RECORD! {laptime.format_ms(time_ms)} by {name}")
+            self._save_track_record(save)
+        for event in events:
+            self._notify(event)
+        return events
+
+    def _notify(self, event):
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"Lap record listener error: {type(e).__name__}: {e}")
+
+    def reset_session(self):
+        """Clears session and personal bests (new race). The track record is kept."""
+        with self.lock:
+            self.personal_best.clear()
+            self.last_delta.clear()
+            self.session_best = None
+            self.version += 1
+
+    # --- Reading ---
+    def session_fastest(self):
+        """(racer_id, time_ms) of the session best, or (None, None)."""
+        with self.lock:
+            best = self.session_best
+        return (best['racer_id'], best['time_ms']) if best else (None, None)
+
+    def track_record_text(self):
+        """'MM:SS.mmm by Name' for the ticker."""
+        with self.lock:
+            record = self.track_record
+        if record is None:
+            return f"{laptime.NO_TIME} by N/A"
+        return f"{laptime.format_ms(record['time_ms'])} by {record['name']}"
+
+    def racer_summary(self, racer_id):
+        racer_id = racer_key(racer_id)
+        with self.lock:
+            best = self.personal_best.get(racer_id)
+            delta = self.last_delta.get(racer_id)
+        return {'racer_id': racer_id, 'best_ms': best, 'best': laptime.format_ms(best), 'last_delta_ms': delta}
+
+    def snapshot(self, racers=False):
+        """JSON ready view for overlays. racers=True adds every racer's personal best and last delta."""
+        with self.lock:
+            data = {
+                'version': self.version,
+                'track_id': self.track_id,
+                'session_best': _public(self.session_best),
+                'track_record': _public(self.track_record),
+            }
+            racer_ids = list(self.personal_best) if racers else []
+        if racers:
+            data['racers'] = {racer_id: self.racer_summary(racer_id) for racer_id in racer_ids}
+        return data
+
+
+def _public(record):
+    if record is None:
+        return None
+    return dict(record, time=laptime.format_ms(record['time_ms']))
+
+
+def _event(scope, record, previous, track_id):
+    return {
+        'scope': scope, # 'session' or 'track'
+        'track_id': track_id,
+        'racer_id': record['racer_id'],
+        'owner_id': record.get('owner_id'),
+        'name': record['name'],
+        'lap': record.get('lap'),
+        'time_ms': record['time_ms'],
+        'time': laptime.format_ms(record['time_ms']),
+        'improvement_ms': previous['time_ms'] - record['time_ms'] if previous else None,
+        'previous_name': previous['name'] if previous else None
+    }
@@ -0,0 +1,160 @@
+import os, json
+import sharedData
+import WireCodec
+from sharedData import CommandChannel
+
+# Lobbies: several independent races (game instances or tracks) hosted by one server.
+# Everything a race used to share through module globals or fixed paths is scoped per lobby:
+# the raceData.json it ingests, the command/ack files of its game instance, the user stats and
+# settings files, its track records, its telemetry archive and the Socket.IO namespace its
+# overlays connect to. Each lobby gets its own RaceManager; ticks from all lobbies run on one
+# shared worker pool (FileWatcher.LobbyDataPoller).
+#
+# JsonData/lobbies.json lists the lobbies. Without it there is a single "main" lobby on the
+# original paths and the default namespace, exactly like before:
+#   [
+#       {"id": "main"},
+#       {"id": "oval", "track_id": 12},
+#       {"id": "rally", "dir": "//RALLY-PC/SMARL/SMARL_Manager/JsonData/Lobbies/rally", "primary": false}
+#   ]
+# The primary lobby (the first one unless another sets "primary": true) is the one on stream:
+# it keeps the default namespace, the game paths it always had, and is the only one that drives
+# OBS, the music player and the chat bot (TwitchPlays follows the default namespace).
+#
+# Game side: a game instance feeds a secondary lobby when LOBBY_ID is set to the lobby id in the
+# Scripts/globals.lua of the mod copy it loads. It then writes raceData.json and reads
+# commands_to_lua.json / lua_ack.json in SMARL_Manager/JsonData/Lobbies/<id>/ of that copy
+# instead of RaceOutput/ and JsonData/. "dir" is that folder as the server sees it and defaults
+# to this copy's JsonData/Lobbies/<id>; set it when the instance runs from another copy (another
+# PC's share). Server side files (stats, settings, telemetry, track records) always stay in
+# JsonData/Lobbies/<id> here. Lap results for the tuning lab are pooled across lobbies.
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+LOBBY_CONFIG = os.path.join(dir_path, "JsonData/lobbies.json")
+LOBBY_ROOT = os.path.join(dir_path, "JsonData/Lobbies")
+DEFAULT_LOBBY_ID = "main"
+DEFAULT_NAMESPACE = '/'
+NAMESPACE_PREFIX = '/lobby/'
+
+# Original single lobby paths
+TWITCH_BOT_DATA = os.path.join(dir_path, "TwitchPlays", "BotData")
+LEGACY_RACE_DATA = "raceData.json" # Resolved by helpers.resource_path
+LEGACY_STATS = os.path.join(TWITCH_BOT_DATA, "user_race_stats.json")
+LEGACY_SETTINGS = os.path.join(TWITCH_BOT_DATA, "settings.json")
+LEGACY_TELEMETRY = os.path.join(dir_path, "JsonData/Telemetry")
+LEGACY_RECORDS = os.path.join(dir_path, "JsonData/TrackRecords") # LapRecords.RECORDS_PATH
+
+
+class LobbyEmitter:
+    """
+    Stands in for the Socket.IO server in a RaceManager: every emit goes to the lobby's namespace.
+    With a frame bus (FrameBus.FramePublisher) broadcasts are also published once for the edge workers.
+    """
+
+    def __init__(self, socketio, namespace, bus=None):
+        self.socketio = socketio
+        self.namespace = namespace
+        self.bus = bus
+
+    def emit(self, event, *args, **kwargs):
+        kwargs.setdefault('namespace', self.namespace)
+        if self.bus is not None and 'to' not in kwargs and 'room' not in kwargs and len(args) == 1:
+            self.bus.publish(kwargs['namespace'], event, args[0])
+        return self.socketio.emit(event, *args, **kwargs)
+
+    def emit_encoded(self, event, payload):
+        """WireCodec.emit_encoded for this namespace; edges get the raw payload and encode per codec themselves."""
+        if self.bus is not None:
+            self.bus.publish(self.namespace, event, payload, codec_encoded=True)
+        WireCodec.emit_encoded(self, event, payload) # Codec room emits have a 'to', so they stay local
+
+
+class Lobby:
+    """Paths, command channel and namespace of one race. manager is set once its RaceManager exists."""
+
+    def __init__(self, lobby_id, primary=False, base_dir=None, track_id=None):
+        self.id = str(lobby_id)
+        self.primary = primary
+        self.track = track_id # None: follow the league race data (sharedData._SpecificRaceData)
+        self.manager = None
+        self.packets = {} # Last relayed *Packet socket data (application.py), by kind
+        if primary and base_dir is None:
+            self.namespace = DEFAULT_NAMESPACE
+            self.ingest_path = LEGACY_RACE_DATA
+            self.stats_path = LEGACY_STATS
+            self.settings_path = LEGACY_SETTINGS
+            self.telemetry_path = LEGACY_TELEMETRY
+            self.records_path = LEGACY_RECORDS
+            self.commands = sharedData.DEFAULT_CHANNEL
+        else:
+            state_dir = os.path.join(LOBBY_ROOT, self.id)
+            game_dir = base_dir or state_dir # Lua LOBBY_DATA_PATH of the game instance (globals.lua)
+            self.namespace = DEFAULT_NAMESPACE if primary else NAMESPACE_PREFIX + self.id
+            self.ingest_path = os.path.join(game_dir, "raceData.json")
+            self.commands = CommandChannel(os.path.join(game_dir, "commands_to_lua.json"), os.path.join(game_dir, "lua_ack.json"))
+            self.stats_path = os.path.join(state_dir, "user_race_stats.json")
+            self.settings_path = os.path.join(state_dir, "settings.json")
+            self.telemetry_path = os.path.join(state_dir, "Telemetry")
+            self.records_path = os.path.join(state_dir, "TrackRecords")
+            os.makedirs(state_dir, exist_ok=True)
+            os.makedirs(game_dir, exist_ok=True)
+
+    def track_id(self):
+        if self.track is not None:
+            return self.track
+        return sharedData._SpecificRaceData.get('track_id')
+
+    def __repr__(self):
+        return f"<Lobby {self.id} ns={self.namespace}{' primary' if self.primary else ''}>"
+
+
+class LobbyRegistry:
+    """All lobbies of this server, by id and by Socket.IO namespace."""
+
+    def __init__(self, lobbies):
+        self.lobbies = {lobby.id: lobby for lobby in lobbies}
+        self.by_namespace = {lobby.namespace: lobby for lobby in lobbies}
+        self.default = next((lobby for lobby in lobbies if lobby.primary), lobbies[0])
+
+    @classmethod
+    def load(cls, config_path=LOBBY_CONFIG):
+        entries = [{"id": DEFAULT_LOBBY_ID}]
+        if os.path.exists(config_path):
+            try:
+                with open(config_path, 'r') as infile:
+                    loaded = json.load(infile)
+                if isinstance(loaded, list) and loaded:
+                    entries = loaded
+                else:
+                    print(f"Lobbies: {config_path} should be a non-empty list. Using a single lobby.")
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Lobbies: could not read {config_path} ({e}). Using a single lobby.")
+        unique = {} # lobby id -> entry, first one wins; dropped before the primary is picked
+        for i, entry in enumerate(entries):
+            lobby_id = str(entry.get('id') or f"lobby{i + 1}")
+            if lobby_id in unique:
+                print(f"Lobbies: entry {i + 1} ({entry}) ignored, lobby id {lobby_id} is already used by {unique[lobby_id]}")
+                continue
+            unique[lobby_id] = entry
+        primary_id = next((lobby_id for lobby_id, entry in unique.items() if entry.get('primary')), next(iter(unique)))
+        lobbies = [Lobby(lobby_id, primary=lobby_id == primary_id, base_dir=entry.get('dir'), track_id=entry.get('track_id'))
+                   for lobby_id, entry in unique.items()]
+        print(f"Lobbies: {', '.join(repr(lobby) for lobby in lobbies)}")
+        return cls(lobbies)
+
+    def get(self, lobby_id):
+        if lobby_id is None:
+            return self.default
+        return self.lobbies.get(str(lobby_id))
+
+    def for_namespace(self, namespace):
+        return self.by_namespace.get(namespace or DEFAULT_NAMESPACE, self.default)
+
+    def namespaces(self):
+        return list(self.by_namespace)
+
+    def __iter__(self):
+        return iter(self.lobbies.values())
+
+    def __len__(self):
+        return len(self.lobbies)
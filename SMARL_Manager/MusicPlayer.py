@@ -1,20 +1,118 @@
 import os
-import pygame.mixer
-import pygame.event
+import json
 import random
 import time
-from typing import Tuple, List
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, List, Dict
+import helpers
 
-# --- Pygame Initialization ---
-# Setting environment variables for systems without a display/sound (like a server)
-os.environ['SDL_VIDEODRIVER'] = 'dummy' 
-os.environ['SDL_AUDIODRIVER'] = 'dsound'
+try: # Optional: only used to read track durations for the index
+    from mutagen import File as MutagenFile
+except ImportError:
+    MutagenFile = None
+
+# --- Audio backend ---
+# Nothing touches pygame or the Music folders at import time anymore. The mixer is started and
+# the playlists are loaded on first use (or in the background via preload_async()), so importing
+# RaceManager is cheap and a machine without audio falls back to a silent backend instead of crashing.
+# Playback runs on two mixer channels so the outgoing and incoming tracks can overlap during a crossfade.
+NULL_AUDIO = os.environ.get('SMARL_NULL_AUDIO', '0') == '1' # Force the silent backend (tests/headless servers)
+NUM_CHANNELS = 2 # Outgoing + incoming track during a crossfade
+
+
+class NullSound:
+    """Placeholder for a decoded track. Uses the indexed duration (if known) to simulate the track ending."""
+
+    def __init__(self, path: str, length: float | None):
+        self.path = path
+        self.length = length
+
+    def get_length(self) -> float | None:
+        return self.length
+
+
+class NullAudioBackend:
+    """Silent stand-in for the pygame mixer. Keeps channel state so the audio engine still works."""
+    name = "null"
+
+    def __init__(self):
+        self.channels = [None] * NUM_CHANNELS # (sound, start_time) or None
+
+    def load(self, path: str) -> NullSound:
+        return NullSound(path, TRACK_DURATIONS.get(path))
+
+    def play(self, channel: int, sound: NullSound, fade_ms: int = 0):
+        self.channels[channel] = (sound, time.monotonic())
+
+    def is_busy(self, channel: int) -> bool:
+        playing = self.channels[channel]
+        if playing is None:
+            return False
+        sound, started = playing
+        # Unknown lengths never end on their own, the engine still swaps them on state changes
+        return sound.length is None or time.monotonic() - started < sound.length
+
+    def fadeout(self, channel: int, ms: int):
+        self.channels[channel] = None
+
+    def stop(self, channel: int):
+        self.channels[channel] = None
+
+    def set_volume(self, volume: float):
+        pass
+
+
+class PygameAudioBackend:
+    """Two reserved pygame mixer channels playing fully decoded Sounds."""
+    name = "pygame"
+
+    def __init__(self):
+        # Setting environment variables for systems without a display/sound (like a server)
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dsound')
+        import pygame
+        self.pygame = pygame
+        pygame.mixer.init()
+        pygame.mixer.set_reserved(NUM_CHANNELS) # Keep other sounds from stealing the music channels
+        self.channels = [pygame.mixer.Channel(i) for i in range(NUM_CHANNELS)]
+
+    def load(self, path: str):
+        """Decodes the whole track up front (slow, only ever called off the race thread)."""
+        sound = self.pygame.mixer.Sound(path)
+        sound.set_volume(MASTER_VOLUME)
+        return sound
+
+    def play(self, channel: int, sound, fade_ms: int = 0):
+        self.channels[channel].play(sound, fade_ms=fade_ms)
+
+    def is_busy(self, channel: int) -> bool:
+        return self.channels[channel].get_busy()
+
+    def fadeout(self, channel: int, ms: int):
+        self.channels[channel].fadeout(ms)
+
+    def stop(self, channel: int):
+        self.channels[channel].stop()
+
+    def set_volume(self, volume: float):
+        for channel in self.channels:
+            sound = channel.get_sound()
+            if sound is not None:
+                sound.set_volume(volume)
+
+
+def _create_backend():
+    if NULL_AUDIO:
+        print("MusicPlayer: SMARL_NULL_AUDIO set, using silent audio backend.")
+        return NullAudioBackend()
+    try:
+        return PygameAudioBackend()
+    except Exception as e:
+        print(f"MusicPlayer: Audio unavailable ({type(e).__name__}: {e}). Using silent audio backend.")
+        return NullAudioBackend()
 
-# Initialize the mixer once at the start of your script
-SONG_END_EVENT = pygame.USEREVENT + 1
-pygame.mixer.init()
-pygame.init()
-pygame.mixer.music.set_endevent(SONG_END_EVENT)
 
 # --- Global Music States ---
 FADE_TIME = 2000 # Milliseconds
@@ -23,6 +121,9 @@ LAST_PLAYED = None # Tracks the full path of the last song played (to prevent im
 MASTER_VOLUME = 0.1
 CURRENT_PLAYING_TITLE = "Nothing Playing"
 CURRENT_PLAYING_ARTIST = ""
+BACKEND = None # Audio backend, created lazily by ensure_initialized()
+ENGINE = None # AudioEngine thread, created lazily by start_engine()
+TRACK_LISTENERS = [] # Called with no arguments after the playing track changes
 
 # --- New Global State for Playlist Management ---
 # MASTER_PLAYLISTS: Stores the full, never-mutated list of tracks for each state.
@@ -35,36 +136,21 @@ ACTIVE_QUEUES = {
     "FINAL": [],
     "RESET": []
 }
+# Folder each state pulls its playlist from
+MUSIC_FOLDERS = {
+    "PREP": "Music/Prep",
+    "START": "Music/Start",
+    "RACE": "Music/Race",
+    "FINAL": "Music/Final",
+    "RESET": "Music/Cooldown",
+}
+TRACK_INDEX_FILE = "Music/track_index.json" # Cached (path, mtime, title, artist, duration) per folder
+TRACK_INFO: Dict[str, Tuple[str, str]] = {} # path -> (title, artist), filled from the index
+TRACK_DURATIONS: Dict[str, float | None] = {} # path -> seconds (None when mutagen is not installed)
 
-
-def load_playlist_from_folder(folder_path: str) -> List[str]:
-    """
-    Scans a directory for all .mp3 files and returns their full paths.
-    """
-    playlist = []
-    
-    # 1. Check if folder exists before trying to list contents
-    if not os.path.isdir(folder_path):
-        print(f"Error: Music folder not found at '{folder_path}'. Skipping playlist load.")
-        return []
-        
-    for filename in os.listdir(folder_path):
-        # 2. Check if the file ends with .mp3 (case-insensitive)
-        if filename.lower().endswith(".mp3"):
-            # 3. Construct the full, correct path
-            full_path = os.path.join(folder_path, filename)
-            playlist.append(full_path)
-            
-    # NOTE: No shuffling here; shuffling happens when the queue is loaded/refilled.
-    print(f"Loaded {len(playlist)} songs from: {folder_path}")
-    return playlist
-
-# Load MASTER Playlists once at startup
-MASTER_PLAYLISTS["PREP"] = load_playlist_from_folder("Music/Prep")
-MASTER_PLAYLISTS["START"] = load_playlist_from_folder("Music/Start")
-MASTER_PLAYLISTS["RACE"] = load_playlist_from_folder("Music/Race")
-MASTER_PLAYLISTS["FINAL"] = load_playlist_from_folder("Music/Final")
-MASTER_PLAYLISTS["RESET"] = load_playlist_from_folder("Music/Cooldown")
+_init_lock = threading.Lock()
+_engine_lock = threading.Lock()
+_initialized = False
 
 
 def parse_track_info(track_path: str) -> Tuple[str, str]:
@@ -89,6 +175,110 @@ def parse_track_info(track_path: str) -> Tuple[str, str]:
     return title, artist
 
 
+def _read_duration(track_path: str) -> float | None:
+    """Track length in seconds if mutagen is installed, otherwise None."""
+    if MutagenFile is None:
+        return None
+    try:
+        audio = MutagenFile(track_path)
+        return round(audio.info.length, 3) if audio and audio.info else None
+    except Exception:
+        return None
+
+
+def _load_track_index() -> Dict:
+    try:
+        with open(TRACK_INDEX_FILE, 'r') as infile:
+            index = json.load(infile)
+            return index if isinstance(index, dict) else {}
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _scan_folder(folder_path: str, cached: Dict | None) -> Dict:
+    """
+    Returns the index entry for one folder. Reuses the cached entry when the folder mtime is
+    unchanged, and reuses per-track metadata for files whose mtime did not change.
+    """
+    if not os.path.isdir(folder_path):
+        print(f"Error: Music folder not found at '{folder_path}'. Skipping playlist load.")
+        return {"mtime": None, "tracks": []}
+    folder_mtime = os.stat(folder_path).st_mtime
+    if cached and cached.get("mtime") == folder_mtime:
+        return cached # Nothing added/removed/renamed since the last scan
+
+    known = {t["path"]: t for t in (cached or {}).get("tracks", [])}
+    tracks = []
+    with os.scandir(folder_path) as entries:
+        for entry in entries:
+            # Check if the file ends with .mp3 (case-insensitive)
+            if not entry.is_file() or not entry.name.lower().endswith(".mp3"):
+                continue
+            full_path = os.path.join(folder_path, entry.name)
+            mtime = entry.stat().st_mtime
+            previous = known.get(full_path)
+            if previous and previous.get("mtime") == mtime:
+                tracks.append(previous)
+                continue
+            title, artist = parse_track_info(full_path)
+            tracks.append({"path": full_path, "mtime": mtime, "title": title,
+                           "artist": artist, "duration": _read_duration(full_path)})
+    print(f"Rescanned {len(tracks)} songs from: {folder_path}")
+    return {"mtime": folder_mtime, "tracks": tracks}
+
+
+def load_playlists():
+    """Loads every state's playlist from the track index, rescanning only changed folders (in parallel)."""
+    index = _load_track_index()
+    cached_folders = index.get("folders", {})
+    with ThreadPoolExecutor(max_workers=len(MUSIC_FOLDERS)) as pool:
+        futures = {folder: pool.submit(_scan_folder, folder, cached_folders.get(folder))
+                   for folder in set(MUSIC_FOLDERS.values())}
+        folders = {folder: future.result() for folder, future in futures.items()}
+
+    for state_key, folder in MUSIC_FOLDERS.items():
+        tracks = folders[folder]["tracks"]
+        # NOTE: No shuffling here; shuffling happens when the queue is loaded/refilled.
+        MASTER_PLAYLISTS[state_key] = [t["path"] for t in tracks]
+        for t in tracks:
+            TRACK_INFO[t["path"]] = (t["title"], t["artist"])
+            TRACK_DURATIONS[t["path"]] = t.get("duration")
+        print(f"Loaded {len(tracks)} songs for {state_key}")
+
+    if folders != cached_folders and os.path.isdir(os.path.dirname(TRACK_INDEX_FILE)):
+        try:
+            helpers.atomic_write_json(TRACK_INDEX_FILE, {"folders": folders})
+        except OSError as e:
+            print(f"Warning: Could not save track index: {e}")
+
+
+def load_playlist_from_folder(folder_path: str) -> List[str]:
+    """
+    Scans a directory for all .mp3 files and returns their full paths (uncached).
+    """
+    return [t["path"] for t in _scan_folder(folder_path, None)["tracks"]]
+
+
+def ensure_initialized():
+    """Creates the audio backend and loads playlists on first use. Safe to call from any thread."""
+    global BACKEND, _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        start = time.time()
+        BACKEND = _create_backend()
+        load_playlists()
+        _initialized = True
+        print(f"MusicPlayer ready ({BACKEND.name} backend) in {time.time() - start:.2f}s")
+
+
+def preload_async():
+    """Starts the audio engine, which initializes the mixer and playlists on its own thread."""
+    start_engine()
+
+
 def get_next_track(state_key: str) -> Tuple[str, Tuple[str, str]]:
     """
     Selects the next track from the active queue for the given state.
@@ -124,97 +314,190 @@ def get_next_track(state_key: str) -> Tuple[str, Tuple[str, str]]:
     # 5. Update the global LAST_PLAYED tracker (This is redundant due to the check on refill)
     # LAST_PLAYED = track_path
     
-    return track_path, parse_track_info(track_path)
+    info = TRACK_INFO.get(track_path) or parse_track_info(track_path)
+    return track_path, info
 
 
-def play_dynamic_music(state_key: str):
-    global CURRENT_PLAYING_STATE
-    global CURRENT_PLAYING_ARTIST
-    global CURRENT_PLAYING_TITLE
+# --- Audio Engine ---
+# The race tick thread used to fade out, busy-wait up to FADE_TIME and decode the next mp3 inline.
+# Now it only drops a state request on a queue. The engine thread owns the mixer, crossfades the
+# two channels, starts the next track FADE_TIME before the current one ends and decodes upcoming
+# tracks in the background so a transition never waits on disk or the mp3 decoder.
+ENGINE_TICK = 0.05 # Seconds between engine checks when no commands arrive
+STALL_RETRY = 5.0 # Seconds before a request for a stalled state (nothing playable) is tried again
+_STOP = object() # Sentinel command that shuts the engine down
+
+
+class AudioEngine(threading.Thread):
+    """Owns the audio backend. Takes state changes through a queue and handles crossfades/looping."""
+
+    def __init__(self):
+        super().__init__(name="AudioEngine", daemon=True)
+        self.commands = queue.Queue()
+        self.requested_state = None # Last state requested by callers (for dedupe)
+        self.active_channel = 0
+        self.track_ends_at = None # Monotonic time the active track finishes (None if unknown)
+        self.preloader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="MusicPreload")
+        self.preloaded = None # (state_key, track_path, info, future) for the next track
+        self.stalled = False # Set when the current state has nothing playable, until the next state change
+        self.retry_at = 0.0 # Monotonic time a repeated request may retry the stalled state
+
+    # --- Called from any thread ---
+    def request_state(self, state_key: str):
+        """Queues a state change. Repeated requests for the current state are dropped here (unless it stalled)."""
+        if state_key == self.requested_state and not (self.stalled and time.monotonic() >= self.retry_at):
+            return
+        self.retry_at = time.monotonic() + STALL_RETRY
+        self.requested_state = state_key
+        self.commands.put(state_key)
+
+    def shutdown(self):
+        self.commands.put(_STOP)
+
+    # --- Engine thread ---
+    def run(self):
+        ensure_initialized()
+        while True:
+            try:
+                command = self.commands.get(timeout=ENGINE_TICK)
+            except queue.Empty:
+                command = None
+            # Only the newest request matters if several piled up during a transition
+            while command is not _STOP:
+                try:
+                    command = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+            if command is _STOP:
+                break
+            try:
+                if command is not None and (command != CURRENT_PLAYING_STATE or self.stalled): # A stalled state may have tracks now
+                    self._change_state(command)
+                self._check_track_end()
+            except Exception as e:
+                print(f"Audio engine error: {type(e).__name__}: {e}")
+        for channel in range(NUM_CHANNELS):
+            BACKEND.stop(channel)
+        self.preloader.shutdown(wait=False)
+
+    def _change_state(self, state_key: str):
+        global CURRENT_PLAYING_STATE
+        if state_key not in MASTER_PLAYLISTS:
+            print(f"Error: Unknown state key '{state_key}'")
+            return
+        print("getting track for",state_key)
+        CURRENT_PLAYING_STATE = state_key
+        self.stalled = False
+        self._crossfade_to_next(state_key)
+
+    def _check_track_end(self):
+        """Starts the next track early enough that it fades in while the current one fades out."""
+        if CURRENT_PLAYING_STATE is None or self.stalled:
+            return
+        now = time.monotonic()
+        if self.track_ends_at is not None and now < self.track_ends_at - FADE_TIME / 1000.0:
+            return
+        if self.track_ends_at is None and BACKEND.is_busy(self.active_channel):
+            return
+        print(f"[{CURRENT_PLAYING_STATE}] track finishing. Crossfading into next unique track...")
+        self._crossfade_to_next(CURRENT_PLAYING_STATE)
+
+    def _take_track(self, state_key: str):
+        """Returns (track_path, info, sound), using the background decoded track when it matches."""
+        if self.preloaded is not None:
+            pre_state, track_path, info, future = self.preloaded
+            self.preloaded = None
+            if pre_state == state_key:
+                return track_path, info, future.result()
+            # State changed before the preloaded track was used, put it back for next time
+            ACTIVE_QUEUES[pre_state].append(track_path)
+        track_path, info = get_next_track(state_key)
+        return track_path, info, helpers.run_blocking(BACKEND.load, track_path)
+
+    def _preload_next(self, state_key: str):
+        try:
+            track_path, info = get_next_track(state_key)
+        except IndexError:
+            return
+        self.preloaded = (state_key, track_path, info, self.preloader.submit(helpers.run_blocking, BACKEND.load, track_path))
+
+    def _stall(self):
+        """Nothing playable: a request for the same state retries it, at most every STALL_RETRY seconds."""
+        self.track_ends_at = None
+        self.retry_at = time.monotonic() + STALL_RETRY
+        self.stalled = True
+
+    def _crossfade_to_next(self, state_key: str):
+        global CURRENT_PLAYING_TITLE, CURRENT_PLAYING_ARTIST, LAST_PLAYED
+        try:
+            track_path, (title, artist), sound = self._take_track(state_key)
+        except IndexError as e:
+            print(f"Cannot play music: {e}")
+            self._stall()
+            return
+        except Exception as e:
+            print(f"Could not load track for {state_key}: {type(e).__name__}: {e}")
+            self._stall()
+            return
+
+        outgoing = self.active_channel
+        incoming = (outgoing + 1) % NUM_CHANNELS
+        if BACKEND.is_busy(outgoing):
+            BACKEND.fadeout(outgoing, FADE_TIME) # Overlaps with the incoming fade in
+        BACKEND.play(incoming, sound, fade_ms=FADE_TIME)
+        self.active_channel = incoming
+        length = sound.get_length()
+        self.track_ends_at = time.monotonic() + length if length else None
+
+        LAST_PLAYED = track_path
+        CURRENT_PLAYING_TITLE = title
+        CURRENT_PLAYING_ARTIST = artist
+        self._preload_next(state_key)
+        for listener in list(TRACK_LISTENERS):
+            try:
+                listener()
+            except Exception as e:
+                print(f"Track listener error: {type(e).__name__}: {e}")
+
+
+def add_track_listener(callback):
+    """Registers callback() to run (on the engine thread) whenever a new track starts."""
+    if callback not in TRACK_LISTENERS:
+        TRACK_LISTENERS.append(callback)
 
-    # Check 1: If the state is already correct and music is playing, do nothing.
-    if state_key == CURRENT_PLAYING_STATE and pygame.mixer.music.get_busy():
-        return
-    
-    print("getting track for",state_key)
-    # --- STEP 1: FADE OUT AND STOP OLD MUSIC ---
-    if pygame.mixer.music.get_busy():
-        pygame.mixer.music.fadeout(FADE_TIME)
-        
-        start_time = time.time()
-        # Wait for the fadeout duration (or until the music stops)
-        # We only wait for FADE_TIME + a small buffer.
-        while pygame.mixer.music.get_busy() and (time.time() - start_time) < (FADE_TIME / 1000.0) + 0.1: 
-            pygame.event.pump() 
-            time.sleep(0.01)
-        
-        # Final stop just in case
-        if pygame.mixer.music.get_busy():
-            pygame.mixer.music.stop()
-        
-    # --- STEP 2: VALIDATE AND SET NEW STATE ---
-    if state_key not in MASTER_PLAYLISTS:
-        print(f"Error: Unknown state key '{state_key}'")
-        return
-        
-    CURRENT_PLAYING_STATE = state_key
-    
-    # --- STEP 3: Load and Play the NEW track ---
-    try:
-        # get_next_track manages the unique playback logic internally
-        track_path, (title, artist) = get_next_track(state_key)
-    except IndexError as e:
-        print(f"Cannot play music: {e}")
-        return
-    
-    CURRENT_PLAYING_TITLE = title
-    CURRENT_PLAYING_ARTIST = artist
-    
-    pygame.mixer.music.load(track_path)
-    
-    pygame.mixer.music.set_volume(MASTER_VOLUME) 
-    # Use play(0) which means "play once". The SONG_END_EVENT will handle the loop.
-    pygame.mixer.music.play(0) 
+
+def start_engine() -> AudioEngine:
+    """Starts the audio engine thread once. Safe to call from any thread."""
+    global ENGINE
+    with _engine_lock:
+        if ENGINE is None or not ENGINE.is_alive():
+            ENGINE = AudioEngine()
+            ENGINE.start()
+        return ENGINE
+
+
+def stop_engine():
+    global ENGINE
+    with _engine_lock:
+        if ENGINE is not None:
+            ENGINE.shutdown()
+            ENGINE.join(timeout=1.0)
+            ENGINE = None
+
+
+def play_dynamic_music(state_key: str):
+    """Requests the music for a race state. Returns immediately, the engine thread does the crossfade."""
+    start_engine().request_state(state_key)
 
 
 def check_music_finished_and_loop():
     """
-    Checks the pygame event queue for the SONG_END_EVENT.
-    If found, a new unique song is loaded and played from the current playlist.
+    Kept for callers in the race loop. Looping is now handled by the audio engine thread,
+    so this only makes sure the engine is running.
     """
-    global CURRENT_PLAYING_ARTIST
-    global CURRENT_PLAYING_TITLE
-    global CURRENT_PLAYING_STATE
-    
-    # Iterate through all pending pygame events
-    for event in pygame.event.get():
-        if event.type == SONG_END_EVENT:
-            
-            # 1. Check if we have a valid state to loop in
-            if CURRENT_PLAYING_STATE is None or CURRENT_PLAYING_STATE not in MASTER_PLAYLISTS:
-                print("Music ended but state is invalid or missing. Stopping loop.")
-                return 
+    if ENGINE is None or not ENGINE.is_alive():
+        start_engine()
 
-            print(f"[{CURRENT_PLAYING_STATE}] track finished. Loading next unique track...")
-            
-            # 2. Load and Play the NEW unique track using the correct state key
-            try:
-                track_path, (title, artist) = get_next_track(CURRENT_PLAYING_STATE)
-            except IndexError as e:
-                print(f"Cannot continue loop: {e}")
-                return
-            
-            CURRENT_PLAYING_TITLE = title
-            CURRENT_PLAYING_ARTIST = artist
-            
-            pygame.mixer.music.load(track_path)
-            
-            # 3. Resume playback
-            pygame.mixer.music.set_volume(MASTER_VOLUME) 
-            pygame.mixer.music.play(0) 
-            
-            # IMPORTANT: Return after handling the event
-            return
             
 """
  Example of how to use this loop structure (Main Game Loop Mockup) ---
@@ -232,8 +515,7 @@ if __name__ == '__main__':
     
     try:
         while running:
-            # Check for music events every frame
-            check_music_finished_and_loop()
+            # Music transitions and looping happen on the audio engine thread
             
             # Print status update every few seconds
             if time.time() - state_timer > 5.0:
@@ -262,7 +544,6 @@ if __name__ == '__main__':
         running = False
         
     finally:
-        pygame.mixer.music.stop()
-        pygame.quit()
+        stop_engine()
         print("\nMusic playback stopped.")
 """
\ No newline at end of file
@@ -0,0 +1,235 @@
+import json, time
+import threading
+from collections import deque
+from obswebsocket import obsws, events as obs_events, requests as obs_requests
+
+# Stateful OBS controller.
+# RaceManager used to connect to obs-websocket synchronously in __init__ (startup waited on
+# OBS) and obs_switch_scene made a blocking ws.call from onJoin, openEntries, onFinish and the
+# onUpdate timers. A dropped connection was never re-established, so scene automation stayed
+# dead until a restart.
+#
+# The controller owns the connection on its own worker thread. Callers only record what they
+# want: switch_scene() stores the desired program scene (a burst of switches coalesces to the
+# latest one, and asking for the scene OBS already shows is a no-op) and call_batch() queues
+# requests that are sent pipelined and answered together. The worker keeps the current program
+# scene cached (seeded on connect, updated by CurrentProgramSceneChanged so manual switches in
+# OBS are respected) and reconnects with exponential backoff whenever the socket drops.
+
+RECONNECT_MIN = 1.0 # Seconds before the first reconnect attempt
+RECONNECT_MAX = 30.0 # Cap on the reconnect backoff
+CALL_TIMEOUT = 5.0 # Seconds to wait for OBS to answer a request (or a batch)
+
+
+class ObsController:
+    """Program scene + request queue for OBS. Every public method returns immediately."""
+
+    def __init__(self, host, port, password, client_factory=obsws):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.client_factory = client_factory
+        self.cond = threading.Condition()
+        self.client = None
+        self.connected = False
+        self.running = False
+        self.worker = None
+        self.current_scene = None # Program scene OBS reported last (None until known)
+        self.desired_scene = None # Latest scene asked for; the worker converges OBS to it
+        self.batches = deque() # (requests, callback)
+        self.reconnect_delay = RECONNECT_MIN
+        self.switches_sent = 0
+        self.switches_skipped = 0
+
+    # --- Lifecycle ---
+    def start(self):
+        with self.cond:
+            if self.running:
+                return
+            self.running = True
+        self.worker = threading.Thread(target=self._run, name="ObsController", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self._disconnect()
+
+    # --- Caller side ---
+    @property
+    def scene(self):
+        """The scene OBS shows or is about to show (what callers should compare against)."""
+        with self.cond:
+            return self.desired_scene if self.desired_scene is not None else self.current_scene
+
+    def switch_scene(self, scene_name):
+        """Asks for scene_name as program scene. Returns False when that is already the target."""
+        with self.cond:
+            target = self.desired_scene if self.desired_scene is not None else self.current_scene
+            if scene_name == target:
+                self.switches_skipped += 1
+                return False
+            self.desired_scene = scene_name
+            self.cond.notify_all()
+        return True
+
+    def call_batch(self, requests, callback=None):
+        """
+        Queues obs-websocket request objects to be sent together once connected.
+        callback(requests) runs on the worker thread with the answered requests (status/datain filled).
+        """
+        with self.cond:
+            self.batches.append((list(requests), callback))
+            self.cond.notify_all()
+
+    def status(self):
+        with self.cond:
+            return {
+                'connected': self.connected,
+                'current_scene': self.current_scene,
+                'desired_scene': self.desired_scene,
+                'queued_batches': len(self.batches),
+                'switches_sent': self.switches_sent,
+                'switches_skipped': self.switches_skipped
+            }
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+            if not self.connected:
+                if not self._connect():
+                    with self.cond:
+                        self.cond.wait(self.reconnect_delay) # stop() wakes this early
+                        self.reconnect_delay = min(self.reconnect_delay * 2, RECONNECT_MAX)
+                    continue
+                self.reconnect_delay = RECONNECT_MIN
+
+            with self.cond:
+                while self.running and self.connected and not self.batches and not self._needs_switch():
+                    self.cond.wait()
+                if not self.running or not self.connected:
+                    continue
+                batch = self.batches.popleft() if self.batches else None
+                scene_name = self.desired_scene if self._needs_switch() else None
+            try:
+                if scene_name is not None:
+                    self._switch(scene_name)
+                if batch is not None:
+                    self._run_batch(*batch)
+            except Exception as e:
+                print(f"OBS connection lost ({type(e).__name__}: {e}). Reconnecting...")
+                if batch is not None:
+                    with self.cond:
+                        self.batches.appendleft(batch) # Retried after the reconnect
+                self._disconnect()
+
+    def _needs_switch(self):
+        return self.desired_scene is not None and self.desired_scene != self.current_scene
+
+    def _connect(self):
+        client = self.client_factory(self.host, self.port, self.password, timeout=CALL_TIMEOUT,
+                                     on_disconnect=self._on_disconnect)
+        try:
+            client.connect()
+            client.register(self._on_scene_changed, obs_events.CurrentProgramSceneChanged)
+            current = client.call(obs_requests.GetCurrentProgramScene())
+            scene_name = current.datain.get('currentProgramSceneName') or current.datain.get('sceneName')
+        except Exception as e:
+            if self.reconnect_delay == RECONNECT_MIN: # Only log the first failure of a streak
+                print(f"Failed to connect to OBS: {e}")
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+            return False
+        with self.cond:
+            self.client = client
+            self.connected = True
+            self.current_scene = scene_name
+        print(f"Successfully connected to OBS-WebSocket. Program scene: {scene_name}")
+        return True
+
+    def _disconnect(self):
+        with self.cond:
+            client, self.client = self.client, None
+            self.connected = False
+            self.cond.notify_all()
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def _on_disconnect(self, client):
+        # Called by obswebsocket's receive thread when the socket closes
+        with self.cond:
+            if client is self.client:
+                self.connected = False
+                self.cond.notify_all()
+
+    def _on_scene_changed(self, event):
+        # Someone switched in OBS (or our own switch landed): follow it instead of fighting it
+        scene_name = event.datain.get('sceneName')
+        with self.cond:
+            if self.desired_scene == self.current_scene:
+                self.desired_scene = scene_name
+            self.current_scene = scene_name
+
+    def _switch(self, scene_name):
+        request = self._call_many([obs_requests.SetCurrentProgramScene(sceneName=scene_name)])[0]
+        with self.cond:
+            if request.status:
+                self.current_scene = scene_name
+                self.switches_sent += 1
+                print(f"OBS scene switched to: {scene_name}")
+            else:
+                print(f"Error switching scene to {scene_name}: {request.datain}")
+                if self.desired_scene == scene_name: # Don't retry a scene OBS rejected
+                    self.desired_scene = self.current_scene
+
+    def _run_batch(self, requests, callback):
+        answered = self._call_many(requests)
+        if callback:
+            try:
+                callback(answered)
+            except Exception as e:
+                print(f"OBS batch callback error: {type(e).__name__}: {e}")
+
+    def _call_many(self, requests):
+        """
+        Sends all requests before waiting for any answer, so a batch costs one round trip.
+        Uses obswebsocket's pending answer table the same way obsws.call does.
+        """
+        client = self.client
+        if client is None:
+            raise ConnectionError("not connected")
+        if client.legacy:
+            return [client.call(request) for request in requests]
+        pending = []
+        for request in requests:
+            message_id = str(client.id)
+            client.id += 1
+            answered = threading.Event()
+            client.events[message_id] = answered
+            pending.append((message_id, answered, request))
+            client.ws.send(json.dumps({
+                "op": 6,
+                "d": {"requestId": message_id, "requestType": request.name, "requestData": request.data()}
+            }))
+        deadline = time.monotonic() + CALL_TIMEOUT
+        missing = 0
+        for message_id, answered, request in pending:
+            answered.wait(max(0.0, deadline - time.monotonic()))
+            client.events.pop(message_id, None)
+            answer = client.answers.pop(message_id, None)
+            if answer is None:
+                missing += 1
+                continue
+            request.input(answer.get('responseData', {}), answer['requestStatus']['result'])
+        if missing:
+            raise TimeoutError(f"OBS did not answer {missing} of {len(pending)} requests")
+        return requests
@@ -0,0 +1,205 @@
+import time
+import threading
+import numpy as np
+from LapHistory import racer_key
+
+# Server side race event detection.
+# Every consumer used to work out what happened by diffing frames itself: each browser overlay
+# compared positions between raceData ticks, onFinish counted finishers and the music logic
+# watched lapsLeft. The detector diffs consecutive parsed frames once per tick on the server
+# (positions, laps and pit states as NumPy arrays, aligned by racer id) and turns the changes
+# into typed events. Events go out on the 'raceEvents' Socket.IO event (one list per tick) and
+# through the in-process EventBus so the chat bot, camera and music logic can react to the
+# same stream.
+#
+# Event types:
+#   status      race status changed (meta_data status)
+#   overtake    racer passed another car on track (neither car in the pits)
+#   pit_entry   racer entered the pit lane (ps went to >= PIT_IN_LANE)
+#   pit_exit    racer rejoined the track (ps back to 0)
+#   best_lap    racer set a new personal best (session_best=True when it is the fastest on the field)
+#   lapped      racer put a full lap on another car
+#   finish      racer crossed the line to finish
+#   dnf         racer disappeared from the field without finishing while the race was running and
+#               stayed gone for DNF_GRACE_PERIOD (or until the race stopped running); a car that
+#               is despawned and respawned within the grace period is not a dnf
+
+PIT_IN_LANE = 2 # DriverGen8.pitState: 0 race, 1 requested, 2 in lane ... 6 exit lane
+RACING_STATUSES = ("Green Flag", "Caution")
+DNF_GRACE_PERIOD = 5.0 # Seconds a car may be missing mid race before it is a dnf (same as SpawnReconciler.GRACE_PERIOD)
+EVENT_TYPES = ('status', 'overtake', 'pit_entry', 'pit_exit', 'best_lap', 'lapped', 'finish', 'dnf')
+
+
+class EventBus:
+    """Tiny in-process pub/sub. Callbacks run synchronously on the publishing (race tick) thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {} # event type ('*' = all) -> [callback]
+
+    def subscribe(self, callback, event_type='*'):
+        """Registers callback(event). Returns a function that unsubscribes it."""
+        with self.lock:
+            self.subscribers.setdefault(event_type, []).append(callback)
+
+        def unsubscribe():
+            with self.lock:
+                callbacks = self.subscribers.get(event_type, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+        return unsubscribe
+
+    def publish(self, event):
+        with self.lock:
+            callbacks = self.subscribers.get(event['type'], []) + self.subscribers.get('*', [])
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Race event subscriber error ({event['type']}): {type(e).__name__}: {e}")
+
+
+BUS = EventBus()
+
+
+class _Frame:
+    """One parsed realtime frame as aligned arrays."""
+
+    def __init__(self, realtime_data):
+        racers = [r for r in realtime_data if r.get('id') is not None]
+        self.ids = [racer_key(r['id']) for r in racers]
+        self.names = [r.get('name') for r in racers]
+        self.index = {racer_id: i for i, racer_id in enumerate(self.ids)}
+        self.pos = np.array([_int(r.get('pos')) for r in racers], dtype=np.int32)
+        self.lap = np.array([_int(r.get('lapNum')) for r in racers], dtype=np.int32)
+        # Laps plus the fraction of the current lap, for lapping
+        self.progress = self.lap + np.array([_float(r.get('prog')) for r in racers], dtype=np.float64)
+        self.pit = np.array([_int(r.get('ps')) for r in racers], dtype=np.int8)
+        self.finished = np.array([r.get('finished') in (True, 'true', 1) for r in racers], dtype=bool)
+        self.best = np.array([-1 if r.get('bestLapMs') is None else r['bestLapMs'] for r in racers], dtype=np.int64)
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class RaceEventDetector:
+    """Compares each parsed frame with the previous one and publishes the differences as events."""
+
+    def __init__(self, bus=BUS, lobby_id=None, dnf_grace_period=DNF_GRACE_PERIOD):
+        self.bus = bus
+        self.lobby_id = lobby_id # Tagged on every event so bus subscribers can tell lobbies apart
+        self.dnf_grace_period = dnf_grace_period
+        self.previous = None
+        self.status = None
+        self.missing = {} # racer_id -> (time it went missing, name, position, lap) while it may still come back
+        self.seq = 0
+
+    def reset(self):
+        """Forgets the last frame (new race), so the first frame of the next race emits nothing."""
+        self.previous = None
+        self.status = None
+        self.missing.clear()
+
+    def _event(self, event_type, now, **fields):
+        self.seq += 1
+        fields.update(type=event_type, seq=self.seq, time=now)
+        if self.lobby_id is not None:
+            fields['lobby'] = self.lobby_id
+        return fields
+
+    def process(self, parsed_data):
+        """Diffs parsed_data against the previous frame. Returns the events (already published on the bus)."""
+        now = time.time()
+        meta = parsed_data.get('meta_data', {})
+        status = meta.get('status')
+        events = []
+        if self.status is not None and status != self.status:
+            events.append(self._event('status', now, previous=self.status, status=status, lapsLeft=meta.get('lapsLeft')))
+        self.status = status
+
+        frame = _Frame(parsed_data.get('realtime_data', []))
+        previous, self.previous = self.previous, frame
+        if previous is not None and (frame.ids or previous.ids or self.missing):
+            racing = status in RACING_STATUSES and not meta.get('qualifying')
+            events.extend(self._diff(previous, frame, racing, now))
+
+        for event in events:
+            self.bus.publish(event)
+        return events
+
+    def _diff(self, prev, cur, racing, now):
+        events = []
+        # Racers present in both frames, as index arrays into each frame
+        common = [(cur.index[racer_id], prev.index[racer_id]) for racer_id in cur.ids if racer_id in prev.index]
+        if common:
+            ci, pi = (np.array(idx, dtype=np.intp) for idx in zip(*common))
+            ids = [cur.ids[i] for i in ci]
+            names = [cur.names[i] for i in ci]
+            pos_now, pos_before = cur.pos[ci], prev.pos[pi]
+            pit_now, pit_before = cur.pit[ci], prev.pit[pi]
+
+            if racing:
+                # a overtook b: a was behind b last frame and is ahead now, both on track
+                on_track = (pit_now == 0) & (pit_before == 0) & (pos_now > 0) & (pos_before > 0)
+                passed = ((pos_before[:, None] > pos_before[None, :]) & (pos_now[:, None] < pos_now[None, :])
+                          & on_track[:, None] & on_track[None, :])
+                for a, b in np.argwhere(passed):
+                    events.append(self._event('overtake', now, racer_id=ids[a], name=names[a], position=int(pos_now[a]),
+                                              passed_id=ids[b], passed_name=names[b], lap=int(cur.lap[ci[a]])))
+
+                # a lapped b: the whole-lap gap between them grew to at least one
+                progress_now, progress_before = cur.progress[ci], prev.progress[pi]
+                laps_ahead_now = np.floor(progress_now[:, None] - progress_now[None, :])
+                laps_ahead_before = np.floor(progress_before[:, None] - progress_before[None, :])
+                lapped = (laps_ahead_now >= 1) & (laps_ahead_now > laps_ahead_before)
+                for a, b in np.argwhere(lapped):
+                    events.append(self._event('lapped', now, racer_id=ids[a], name=names[a], lapped_id=ids[b],
+                                              lapped_name=names[b], laps_ahead=int(laps_ahead_now[a, b])))
+
+            for i in np.flatnonzero((pit_before < PIT_IN_LANE) & (pit_now >= PIT_IN_LANE)):
+                events.append(self._event('pit_entry', now, racer_id=ids[i], name=names[i], lap=int(cur.lap[ci[i]])))
+            for i in np.flatnonzero((pit_before > 0) & (pit_now == 0)):
+                events.append(self._event('pit_exit', now, racer_id=ids[i], name=names[i], position=int(pos_now[i])))
+
+            best_now, best_before = cur.best[ci], prev.best[pi]
+            improved = (best_now > 0) & ((best_before <= 0) | (best_now < best_before))
+            if improved.any():
+                valid = cur.best[cur.best > 0]
+                field_best = int(valid.min()) if valid.size else None
+                for i in np.flatnonzero(improved):
+                    events.append(self._event('best_lap', now, racer_id=ids[i], name=names[i], time_ms=int(best_now[i]),
+                                              session_best=int(best_now[i]) == field_best))
+
+            for i in np.flatnonzero(cur.finished[ci] & ~prev.finished[pi]):
+                events.append(self._event('finish', now, racer_id=ids[i], name=names[i], position=int(pos_now[i])))
+
+        if racing:
+            for racer_id in prev.ids:
+                i = prev.index[racer_id]
+                if racer_id not in cur.index and not prev.finished[i] and racer_id not in self.missing:
+                    self.missing[racer_id] = (now, prev.names[i], int(prev.pos[i]), int(prev.lap[i]))
+        if self.missing:
+            events.extend(self._missing_dnfs(cur, now, race_over=not racing))
+        return events
+
+    def _missing_dnfs(self, cur, now, race_over):
+        """dnf events for missing cars past the grace period (all still missing once the race stops running)."""
+        events = []
+        for racer_id, (since, name, position, lap) in list(self.missing.items()):
+            if racer_id in cur.index: # Respawned in time
+                del self.missing[racer_id]
+            elif race_over or now - since >= self.dnf_grace_period:
+                del self.missing[racer_id]
+                events.append(self._event('dnf', now, racer_id=racer_id, name=name, position=position, lap=lap))
+        return events
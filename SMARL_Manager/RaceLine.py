@@ -0,0 +1,457 @@
+import os, sys, json, time
+import glob
+import argparse
+import numpy as np
+import helpers
+import TrackBinary
+
+# Offline racing line optimizer.
+# The in game line (TrackScanner.optimizeRacingLine) is a few relaxation passes of Lua over the
+# scanned nodes, limited by what one server tick can afford. This tool works from the exported
+# track spine instead (TrackData/<id>_*.json: midX/midY/midZ/width per node) and solves for the
+# minimum curvature line properly:
+#
+#   line_i = mid_i + alpha_i * perp_i        lateral offset per node, |alpha_i| <= width_i/2 - margin
+#
+# The objective is the integral of curvature^2 along the lap plus a small weight on the lap
+# length (--length-weight: 0 is the pure minimum curvature line, larger values cut corners more).
+# The squared second difference of the line is linear in alpha and gives the start point (one
+# box constrained quadratic program over all nodes, five nonzeros per row); damped Gauss-Newton
+# iterations on the exact curvature then refine it, each one another box constrained QP with the
+# sparse Jacobian (three nonzeros per row, built with one finite difference per node color).
+# The QPs are solved with a primal active set method; each step is one sparse solve
+# (scipy.sparse when installed, dense numpy otherwise).
+#
+# A speed profile is computed on the result: corner limit sqrt(lateral_accel / curvature),
+# then forward (acceleration) and backward (braking) passes around the closed lap.
+#
+# Output: JsonData/TrackData/<id>_raceline.json and current_raceline.json, in the node format
+# TrackScanner.serializeTrackData uses (pos/mid/left/right/perp/out tables, width, dist, prog)
+# plus speed and curv per node. raceLineLoader (crouch + Use) reads current_raceline.json and
+# merges the line into the track stored in the block by node id.
+#
+#   python RaceLine.py --list
+#   python RaceLine.py --track 1
+#   python RaceLine.py --input "JsonData/TrackData/1_Test Oval.json" --margin 3 --lateral-accel 16
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+TRACK_DATA_PATH = os.path.join(dir_path, "JsonData/TrackData")
+CURRENT_LINE_FILE = "current_raceline.json" # Scripts/globals.lua RACE_LINE_PATH
+LINE_SUFFIX = "_raceline"
+SKIP_FILES = ("current_map.json", CURRENT_LINE_FILE) # Same folder, not track spines
+
+MARGIN = 2.5 # Meters kept between the line and the track edge (half a car plus some)
+CENTER_WEIGHT = 1e-6 # Tie break toward the middle where the curvature does not care (straights)
+ITERATIONS = 30 # Gauss-Newton iterations at most
+DAMPING = 1e-9 # Gauss-Newton step damping (grows when a step makes the line worse)
+TOLERANCE = 1e-3 # Meters of offset change that count as converged
+LENGTH_WEIGHT = 3e-4 # Weight of the lap length against the curvature integral (shorter lines vs gentler ones)
+MAX_ACTIVE_SET_STEPS = 5000
+# Speed profile defaults, in the units DecisionModule uses
+LATERAL_ACCEL = 18.0 # DecisionModule lateralGrip (v^2 / r)
+BRAKE_DECEL = 15.0 # DecisionModule brakingForceConstant
+DRIVE_ACCEL = 8.0
+MAX_SPEED = 100.0
+
+try:
+    import scipy.sparse as sparse
+    import scipy.sparse.linalg as sparse_linalg
+except ImportError:
+    sparse = None
+
+
+# --- Track input ---
+def find_track_file(track_id, base_path=TRACK_DATA_PATH):
+    """TrackData/<id>_<name>.json for a track id, None if there is none."""
+    return TrackBinary.find_track_json(track_id, base_path)
+
+
+def list_tracks(base_path=TRACK_DATA_PATH):
+    """[(track_id, name, path)] of every track spine in base_path."""
+    tracks = []
+    for path in sorted(glob.glob(os.path.join(base_path, "*.json"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if os.path.basename(path) in SKIP_FILES or stem.endswith(LINE_SUFFIX) or '_' not in stem:
+            continue
+        track_id, name = stem.split('_', 1)
+        tracks.append((track_id, name, path))
+    return tracks
+
+
+def load_track(path):
+    """(ids, mid (n, 3), width (n,)) from a TrackData spine (.json list of nodes or {'nodes': [...]}, or .smtk)."""
+    if path.endswith(TrackBinary.EXTENSION):
+        with TrackBinary.TrackFile(path) as track:
+            nodes = track.nodes()
+    else:
+        with open(path, 'r') as infile:
+            nodes = json.load(infile)
+    if isinstance(nodes, dict):
+        nodes = nodes.get('nodes') or nodes.get('raceChain') or []
+    if len(nodes) < 5:
+        raise ValueError(f"{path}: needs at least 5 nodes, found {len(nodes)}")
+    ids = [int(node['id']) if float(node['id']).is_integer() else node['id'] for node in nodes]
+    mid = np.array([[node['midX'], node['midY'], node.get('midZ', 0.0)] for node in nodes], dtype=np.float64)
+    width = np.array([node.get('width', 20.0) for node in nodes], dtype=np.float64)
+    # A closing node duplicated onto the first one would give a zero length segment
+    if np.linalg.norm(mid[-1, :2] - mid[0, :2]) < 1e-6:
+        ids, mid, width = ids[:-1], mid[:-1], width[:-1]
+    return ids, mid, width
+
+
+# --- Geometry ---
+def segment_lengths(points):
+    """Planar length of segment i -> i+1 around the closed loop."""
+    return np.linalg.norm(np.roll(points[:, :2], -1, axis=0) - points[:, :2], axis=1)
+
+
+def track_normals(mid):
+    """Unit tangent and right hand normal (tangent x up, TrackScanner's perp) per node."""
+    tangent = np.roll(mid[:, :2], -1, axis=0) - np.roll(mid[:, :2], 1, axis=0)
+    tangent /= np.maximum(np.linalg.norm(tangent, axis=1, keepdims=True), 1e-9)
+    normal = np.stack([tangent[:, 1], -tangent[:, 0]], axis=1)
+    return tangent, normal
+
+
+def curvature(points):
+    """Unsigned curvature (1 / circumradius) through each node and its neighbours."""
+    p0, p1, p2 = np.roll(points[:, :2], 1, axis=0), points[:, :2], np.roll(points[:, :2], -1, axis=0)
+    a = np.linalg.norm(p1 - p0, axis=1)
+    b = np.linalg.norm(p2 - p1, axis=1)
+    c = np.linalg.norm(p2 - p0, axis=1)
+    cross = np.abs((p1[:, 0] - p0[:, 0]) * (p2[:, 1] - p0[:, 1]) - (p1[:, 1] - p0[:, 1]) * (p2[:, 0] - p0[:, 0]))
+    return np.where(a * b * c > 1e-9, 2.0 * cross / np.maximum(a * b * c, 1e-9), 0.0)
+
+
+def _second_difference(lengths):
+    """Cyclic second derivative operator for nodes spaced by lengths, as (rows, cols, values)."""
+    n = len(lengths)
+    h_prev, h_next = np.roll(lengths, 1), lengths
+    prev_coef = 2.0 / (h_prev * (h_prev + h_next))
+    next_coef = 2.0 / (h_next * (h_prev + h_next))
+    index = np.arange(n)
+    rows = np.concatenate([index, index, index])
+    cols = np.concatenate([(index - 1) % n, index, (index + 1) % n])
+    values = np.concatenate([prev_coef, -(prev_coef + next_coef), next_coef])
+    return rows, cols, values
+
+
+# --- Quadratic program ---
+class _Matrix:
+    """Operator built from (row, col, value) triplets: scipy.sparse when available, dense numpy otherwise."""
+
+    def __init__(self, rows, cols, values, n, m=None):
+        shape = (m or n, n)
+        if sparse is not None:
+            self.data = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+        else:
+            self.data = np.zeros(shape)
+            np.add.at(self.data, (rows, cols), values)
+
+    def dot(self, vector):
+        return self.data @ vector
+
+    def transpose_dot(self, vector):
+        return self.data.T @ vector
+
+    def gram(self, weights, scale):
+        """(A diag(scale))^T diag(weights) (A diag(scale)), A being this operator."""
+        if sparse is not None:
+            scaled = self.data @ sparse.diags(scale)
+            return scaled.T @ sparse.diags(weights) @ scaled
+        scaled = self.data * scale[None, :]
+        return scaled.T @ (weights[:, None] * scaled)
+
+    @staticmethod
+    def solve(matrix, free, rhs):
+        """Solves matrix[free, free] x = rhs."""
+        if sparse is not None:
+            sub = matrix[free][:, free].tocsc()
+            return np.atleast_1d(sparse_linalg.spsolve(sub, rhs))
+        return np.linalg.solve(matrix[np.ix_(free, free)], rhs)
+
+
+def solve_box_qp(H, g, lower, upper, max_steps=MAX_ACTIVE_SET_STEPS):
+    """
+    min 0.5 x'Hx + g'x  subject to lower <= x <= upper (H symmetric positive definite).
+    Primal active set: start feasible at the clipped zero, solve on the free variables, step
+    until a bound blocks and fix it there, release a bound whose multiplier has the wrong sign.
+    Returns (x, steps).
+    """
+    n = len(g)
+    x = np.clip(np.zeros(n), lower, upper)
+    state = np.zeros(n, dtype=np.int8) # 0 free, -1 at lower, 1 at upper
+    for step in range(max_steps):
+        free = np.flatnonzero(state == 0)
+        fixed = state != 0
+        if len(free):
+            coupling = (H @ np.where(fixed, x, 0.0))[free]
+            target = _Matrix.solve(H, free, -(g[free] + coupling))
+            direction = target - x[free]
+            # Largest step along direction that stays inside the box
+            with np.errstate(divide='ignore', invalid='ignore'):
+                to_upper = np.where(direction > 1e-12, (upper[free] - x[free]) / direction, np.inf)
+                to_lower = np.where(direction < -1e-12, (lower[free] - x[free]) / direction, np.inf)
+            limits = np.minimum(to_upper, to_lower)
+            t = min(1.0, float(limits.min()))
+            x[free] += t * direction
+            if t < 1.0:
+                blocking = free[limits <= t + 1e-12]
+                state[blocking] = np.where(direction[limits <= t + 1e-12] > 0, 1, -1)
+                x[state == 1] = upper[state == 1]
+                x[state == -1] = lower[state == -1]
+                continue
+        gradient = H @ x + g
+        # At a lower bound the gradient must point inward (>= 0), at an upper bound (<= 0)
+        wrong = np.where(state == -1, -gradient, np.where(state == 1, gradient, 0.0))
+        worst = int(np.argmax(wrong))
+        if wrong[worst] <= 1e-9:
+            return x, step + 1
+        state[worst] = 0
+    print(f"RaceLine: active set did not settle in {max_steps} steps, using the last feasible line")
+    return x, max_steps
+
+
+def _line_residuals(offsets, mid, normal, length_weight):
+    """
+    Signed curvature per node times sqrt(local length), then sqrt(length_weight * segment length)
+    per segment: the squared sum is the integral of curvature^2 plus length_weight * lap length.
+    """
+    line = mid[:, :2] + offsets[:, None] * normal
+    p0, p1, p2 = np.roll(line, 1, axis=0), line, np.roll(line, -1, axis=0)
+    a = np.linalg.norm(p1 - p0, axis=1)
+    b = np.linalg.norm(p2 - p1, axis=1)
+    c = np.linalg.norm(p2 - p0, axis=1)
+    cross = (p1[:, 0] - p0[:, 0]) * (p2[:, 1] - p0[:, 1]) - (p1[:, 1] - p0[:, 1]) * (p2[:, 0] - p0[:, 0])
+    kappa = 2.0 * cross / np.maximum(a * b * c, 1e-9)
+    return np.concatenate([kappa * np.sqrt((a + b) / 2.0), np.sqrt(length_weight * b)])
+
+
+def _node_colors(n):
+    """Groups of nodes no residual depends on twice (every third node, wrap handled)."""
+    colors = np.arange(n) % 3
+    if n % 3:
+        colors[n - n % 3:] = 3 + np.arange(n % 3)
+    return colors
+
+
+def _line_jacobian(offsets, mid, normal, length_weight, colors, step=1e-4):
+    """Sparse Jacobian of _line_residuals (curvature row i depends on nodes i-1, i, i+1, length row
+    on i, i+1), one central difference per node color instead of one per node."""
+    n = len(offsets)
+    rows, cols, values = [], [], []
+    index = np.arange(n)
+    for color in range(colors.max() + 1):
+        bump = np.where(colors == color, step, 0.0)
+        change = (_line_residuals(offsets + bump, mid, normal, length_weight)
+                  - _line_residuals(offsets - bump, mid, normal, length_weight)) / (2.0 * step)
+        for block, shifts in ((0, (-1, 0, 1)), (n, (0, 1))):
+            for shift in shifts:
+                neighbour = (index + shift) % n
+                hit = colors[neighbour] == color
+                rows.append(block + index[hit])
+                cols.append(neighbour[hit])
+                values.append(change[block:block + n][hit])
+    return _Matrix(np.concatenate(rows), np.concatenate(cols), np.concatenate(values), n, 2 * n)
+
+
+def _identity(n):
+    return sparse.identity(n, format='csr') if sparse is not None else np.eye(n)
+
+
+def _initial_offsets(mid, normal, lower, upper):
+    """
+    Start point: the line minimizing the squared second difference, which is linear in the
+    offsets (one QP). With the node spacing held fixed it favours shorter lines, so it cuts
+    apexes too tight; the curvature iterations below correct that.
+    """
+    n = len(mid)
+    lengths = np.maximum(segment_lengths(mid), 1e-3)
+    operator = _Matrix(*_second_difference(lengths), n)
+    weights = (lengths + np.roll(lengths, 1)) / 2.0
+    H = operator.gram(weights, normal[:, 0]) + operator.gram(weights, normal[:, 1]) + _identity(n) * CENTER_WEIGHT
+    g = np.zeros(n)
+    for axis in range(2):
+        g += normal[:, axis] * operator.transpose_dot(operator.dot(mid[:, axis]) * weights)
+    return solve_box_qp(H, g, lower, upper)
+
+
+def minimum_curvature_offsets(mid, normal, width, margin=MARGIN, iterations=ITERATIONS, length_weight=LENGTH_WEIGHT):
+    """
+    Lateral offset per node (along normal) of the line minimizing the integral of curvature^2
+    (plus length_weight * lap length), and the active set steps used. Damped Gauss-Newton on the
+    exact (circumradius) curvature: each iteration is one box constrained QP with the sparse Jacobian.
+    """
+    n = len(mid)
+    half = np.maximum(width / 2.0 - margin, 0.0)
+    lower, upper = -half, half
+    offsets, steps = _initial_offsets(mid, normal, lower, upper)
+    colors = _node_colors(n)
+    residuals = _line_residuals(offsets, mid, normal, length_weight)
+    cost = float(residuals @ residuals)
+    damping = DAMPING
+    for _ in range(iterations):
+        jacobian = _line_jacobian(offsets, mid, normal, length_weight, colors)
+        # min |r + J (x - x0)|^2 + damping |x - x0|^2 + CENTER_WEIGHT |x|^2
+        H = jacobian.gram(np.ones(2 * n), np.ones(n)) + _identity(n) * (damping + CENTER_WEIGHT)
+        g = jacobian.transpose_dot(residuals - jacobian.dot(offsets)) - damping * offsets
+        candidate, used = solve_box_qp(H, g, lower, upper)
+        steps += used
+        candidate_residuals = _line_residuals(candidate, mid, normal, length_weight)
+        candidate_cost = float(candidate_residuals @ candidate_residuals)
+        if candidate_cost >= cost:
+            damping *= 10.0 # Linearization too optimistic, take a shorter step
+            continue
+        moved = float(np.max(np.abs(candidate - offsets)))
+        offsets, residuals, cost = candidate, candidate_residuals, candidate_cost
+        damping = max(damping / 3.0, DAMPING)
+        if moved < TOLERANCE:
+            break
+    return offsets, steps
+
+
+# --- Speed profile ---
+def speed_profile(points, lateral_accel=LATERAL_ACCEL, brake_decel=BRAKE_DECEL, drive_accel=DRIVE_ACCEL, max_speed=MAX_SPEED):
+    """Target speed per node around the closed lap, and the curvature it was based on."""
+    kappa = curvature(points)
+    lengths = segment_lengths(points)
+    n = len(points)
+    limit = np.minimum(np.sqrt(lateral_accel / np.maximum(kappa, 1e-9)), max_speed)
+    speed = limit.copy()
+    start = int(np.argmin(limit)) # The slowest corner pins the closed loop passes
+    for k in range(1, n + 1): # Forward: how fast the car can be after accelerating out of corners
+        i, prev = (start + k) % n, (start + k - 1) % n
+        speed[i] = min(speed[i], np.sqrt(speed[prev] ** 2 + 2.0 * drive_accel * lengths[prev]))
+    for k in range(1, n + 1): # Backward: how fast it can arrive and still brake for the next one
+        i, nxt = (start - k) % n, (start - k + 1) % n
+        speed[i] = min(speed[i], np.sqrt(speed[nxt] ** 2 + 2.0 * brake_decel * lengths[i]))
+    return speed, kappa
+
+
+def lap_time(points, speed):
+    lengths = segment_lengths(points)
+    average = np.maximum((speed + np.roll(speed, -1)) / 2.0, 1e-3)
+    return float(np.sum(lengths / average))
+
+
+# --- Export ---
+def _vec(x, y, z):
+    return {'x': round(float(x), 4), 'y': round(float(y), 4), 'z': round(float(z), 4)}
+
+
+def build_race_chain(ids, mid, width, normal, offsets, speed, kappa):
+    """Nodes in the TrackScanner.serializeTrackData layout, plus speed and curv."""
+    line = np.column_stack([mid[:, :2] + offsets[:, None] * normal, mid[:, 2]])
+    forward = np.roll(line, -1, axis=0) - line
+    forward /= np.maximum(np.linalg.norm(forward, axis=1, keepdims=True), 1e-9)
+    lengths = segment_lengths(line)
+    dist = np.concatenate([[0.0], np.cumsum(lengths)[:-1]])
+    total = float(np.sum(lengths))
+    chain = []
+    for i, node_id in enumerate(ids):
+        perp = _vec(normal[i, 0], normal[i, 1], 0.0)
+        half = width[i] / 2.0
+        chain.append({
+            'id': node_id,
+            'pos': _vec(*line[i]),
+            'mid': _vec(*mid[i]),
+            'left': _vec(mid[i, 0] - normal[i, 0] * half, mid[i, 1] - normal[i, 1] * half, mid[i, 2]), # Left is -perp
+            'right': _vec(mid[i, 0] + normal[i, 0] * half, mid[i, 1] + normal[i, 1] * half, mid[i, 2]),
+            'perp': perp,
+            'out': _vec(*forward[i]),
+            'width': round(float(width[i]), 4),
+            'dist': round(float(dist[i]), 3),
+            'prog': round(float(dist[i] / total), 6),
+            'offset': round(float(offsets[i]), 4),
+            'curv': round(float(kappa[i]), 6),
+            'speed': round(float(speed[i]), 3),
+        })
+    return chain, total
+
+
+def optimize_track(path, margin=MARGIN, iterations=ITERATIONS, length_weight=LENGTH_WEIGHT, lateral_accel=LATERAL_ACCEL,
+                   brake_decel=BRAKE_DECEL, drive_accel=DRIVE_ACCEL, max_speed=MAX_SPEED):
+    """Optimizes one track spine, returns the export document."""
+    started = time.perf_counter()
+    ids, mid, width = load_track(path)
+    _, normal = track_normals(mid)
+    offsets, steps = minimum_curvature_offsets(mid, normal, width, margin, iterations, length_weight)
+    line = mid[:, :2] + offsets[:, None] * normal
+    speed, kappa = speed_profile(line, lateral_accel, brake_decel, drive_accel, max_speed)
+    mid_speed, mid_kappa = speed_profile(mid[:, :2], lateral_accel, brake_decel, drive_accel, max_speed)
+    chain, length = build_race_chain(ids, mid, width, normal, offsets, speed, kappa)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    track_id, _, name = stem.partition('_')
+    solve_time = time.perf_counter() - started
+    document = {
+        'N': name or stem,
+        'I': int(track_id) if track_id.isdigit() else track_id,
+        'timestamp': int(time.time()),
+        'source': os.path.basename(path),
+        'solver': 'scipy.sparse' if sparse is not None else 'numpy',
+        'params': {'margin': margin, 'iterations': iterations, 'length_weight': length_weight, 'lateral_accel': lateral_accel,
+                   'brake_decel': brake_decel, 'drive_accel': drive_accel, 'max_speed': max_speed},
+        'length': round(length, 3),
+        'lapTime': round(lap_time(line, speed), 3),
+        'centerLapTime': round(lap_time(mid[:, :2], mid_speed), 3), # Same speed model on the spine, for comparison
+        'maxCurvature': round(float(kappa.max()), 6),
+        'centerMaxCurvature': round(float(mid_kappa.max()), 6),
+        'C': {'raceChain': chain, 'pitChain': []},
+    }
+    print(f"RaceLine: {document['N']} ({len(chain)} nodes, {length:.0f} m) solved in {solve_time * 1000:.0f} ms "
+          f"({steps} active set steps, {document['solver']}): est. lap {document['lapTime']:.2f}s vs "
+          f"{document['centerLapTime']:.2f}s on the center line, max curvature {document['maxCurvature']:.4f} "
+          f"vs {document['centerMaxCurvature']:.4f}")
+    return document
+
+
+def export(document, base_path=TRACK_DATA_PATH, current=True):
+    """Writes <id>_raceline.json (and current_raceline.json for the loader). Returns the paths."""
+    os.makedirs(base_path, exist_ok=True)
+    paths = [os.path.join(base_path, f"{document['I']}{LINE_SUFFIX}.json")]
+    if current:
+        paths.append(os.path.join(base_path, CURRENT_LINE_FILE))
+    for path in paths:
+        helpers.atomic_write_json(path, document)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Minimum curvature racing line and speed profile from TrackData spines")
+    parser.add_argument('--track', action='append', help="Track id (repeatable), reads TrackData/<id>_*.json")
+    parser.add_argument('--input', action='append', help="Track spine file (repeatable)")
+    parser.add_argument('--list', action='store_true', help="List track spines in TrackData")
+    parser.add_argument('--output', default=TRACK_DATA_PATH, help="Folder for <id>_raceline.json")
+    parser.add_argument('--no-current', action='store_true', help=f"Do not update {CURRENT_LINE_FILE}")
+    parser.add_argument('--margin', type=float, default=MARGIN, help="Meters kept from the track edges")
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help="Gauss-Newton iterations at most")
+    parser.add_argument('--length-weight', type=float, default=LENGTH_WEIGHT, help="Lap length against curvature (0: pure minimum curvature)")
+    parser.add_argument('--lateral-accel', type=float, default=LATERAL_ACCEL)
+    parser.add_argument('--brake-decel', type=float, default=BRAKE_DECEL)
+    parser.add_argument('--drive-accel', type=float, default=DRIVE_ACCEL)
+    parser.add_argument('--max-speed', type=float, default=MAX_SPEED)
+    args = parser.parse_args()
+
+    if args.list:
+        for track_id, name, path in list_tracks():
+            print(f"{track_id:>6}  {name}  ({os.path.basename(path)})")
+        return
+    paths = list(args.input or [])
+    for track_id in args.track or []:
+        path = find_track_file(track_id)
+        if path is None:
+            print(f"No TrackData/{track_id}_*.json found")
+            sys.exit(1)
+        paths.append(path)
+    if not paths:
+        parser.error("give --track or --input (or --list)")
+    for index, path in enumerate(paths):
+        document = optimize_track(path, args.margin, args.iterations, args.length_weight, args.lateral_accel, args.brake_decel,
+                                  args.drive_accel, args.max_speed)
+        # With several tracks the last one becomes the current line
+        written = export(document, args.output, current=not args.no_current and index == len(paths) - 1)
+        print(f"RaceLine: wrote {', '.join(written)}")
+
+
+if __name__ == '__main__':
+    main()
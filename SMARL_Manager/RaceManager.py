@@ -1,25 +1,27 @@
 import MusicPlayer
 from MusicPlayer import play_dynamic_music, check_music_finished_and_loop
-import os, json, random, math, time
-import requests
+import json, random, math, time
+import threading
 import sharedData
 import datetime
-from sharedData import addToQueue
 import helpers
-from obswebsocket import obsws, requests as obs_requests
+import laptime
+from SettingsStore import SettingsStore
+from LapHistory import LapHistoryStore, racer_key
+from LapRecords import LapRecordTracker
+from SpawnReconciler import SpawnReconciler
+from RaceEvents import RaceEventDetector
+from TelemetryArchive import TelemetryRecorder
+from TuningLab import LapResultLog
+from TwitchHelix import HelixClient, Predictions
+import Lobbies
+from ObsController import ObsController
 # Add this:
 # import logging
 # logging.basicConfig(level=logging.INFO) # optional: better logging for debugging
 
 #Twitch Chat Scopes: 'channel:bot channel:manage:ads channel:read:ads channel:edit:commercial channel:read:polls channel:manage:polls channel:read:predictions channel:manage:predictions channel:read:redemptions channel:manage:redemptions user:bot user:write:chat'
 
-dir_path = os.path.dirname(os.path.realpath(__file__))
-main_path = dir_path
-realtime_path = os.path.join(main_path,"JsonData/RaceOutput/raceData.json")
-twitch_path =  os.path.join(main_path, "TwitchPlays")
-Twitch_json = os.path.join(twitch_path, "BotData")
-sim_settings = os.path.join(Twitch_json, 'settings.json')
-STATS_FILENAME =  os.path.join(Twitch_json,"user_race_stats.json")
 FIELD_RACER_TITLE = "The Field (Other Racers)"
 ALL_NAMES = [] # List of Bot names that Race manager can choose from when spawning bots
 ALL_BPS = ["typea","typeb","typec","typed"]
@@ -67,11 +69,14 @@ INTRO_SCREEN_LENGTH = 200
 FINISH_SCREEN_LENGTH = 100
 
 RACE_CAPACITY = 16 # TOtal number of racers allowed
+LAP_RESULTS = LapResultLog(tuning_path=sharedData.SMARL_TUNING_DATA) # Shared by every lobby: one lock per track file, laps pooled for the tuning lab
 class RaceManager():
     MAX_LAP_TIME_SENTINEL = 9999999999
-    def __init__(self,config_manager,socketio_server):
+    def __init__(self,config_manager,socketio_server,lobby=None):
         self.TwitchRaceEnabled = True # Whether we are doing twitch or smarl race
         self.config_manager = config_manager
+        self.lobby = lobby or Lobbies.Lobby(Lobbies.DEFAULT_LOBBY_ID, primary=True) # Paths, command channel and namespace of this race
+        self.started = False # Side effects (OBS, music, stats, opening entries) wait for start()
         # Load attributes from config (now using .get() method)
         self.TWITCH_CLIENT_ID = self.config_manager.get("TWITCH_CLIENT_ID")
         self.TWITCH_CLIENT_SECRET = self.config_manager.get("TWITCH_CLIENT_SECRET")
@@ -79,13 +84,15 @@ class RaceManager():
         # Load the critical tokens
         self.TWITCH_ACCESS_TOKEN = self.config_manager.get("TWITCH_ACCESS_TOKEN")
         self.TWITCH_REFRESH_TOKEN = self.config_manager.get("TWITCH_REFRESH_TOKEN")
+        # Async Helix client (own loop + connection pool, started on first use)
+        self.helix = HelixClient(self.TWITCH_CLIENT_ID, self.TWITCH_CLIENT_SECRET,
+                                 self.TWITCH_ACCESS_TOKEN, self.TWITCH_REFRESH_TOKEN, on_tokens=self._store_twitch_tokens)
+        self.predictions = Predictions(self.helix, self.TWITCH_BROADCASTER_ID) # Holds the Twitch prediction/outcome ids
 
         # Prediction State Variables
         self.predictions_enabled = False # on by default (Disabled until channel points eligible)
         self.prediction_active = False
-        self.prediction_id = None
         self.racer_names = []
-        self.outcome_map = {}
         self.enabled = True
         self.timer = 0
         self.lastSeconds = -10
@@ -110,17 +117,27 @@ class RaceManager():
         self.stoppingRace = False # confiurmation flag for race stop
         self.startingRace = False # confirmation flag for race start
         self.usersEntered = []
-        self.settingsFilename = sim_settings
-        self.statsFilename = STATS_FILENAME
+        self.entrant_state_version = 0 # Bumped every time entrants/entry status change (chat bot mirror)
+        self.overlay_lock = threading.Lock()
+        self.overlay_version = 0 # Bumped only when the overlay content actually changes
+        self.overlay_key = None # Inputs the current overlay_data was built from (dirty check)
+        self.overlay_bytes = b"{}" # overlay_data serialized once per version for the REST fallback
+        self.overlay_boot_id = format(int(time.time()), 'x') # Keeps ETags unique across restarts
+        self.lap_history = LapHistoryStore() # Per racer lap times/sectors/positions for the current race
+        self.telemetry = TelemetryRecorder(self.lobby.telemetry_path) # Columnar per race telemetry archive (JsonData/Telemetry)
+        self.race_events = RaceEventDetector(lobby_id=self.lobby.id) # Frame diffs -> overtake/pit/finish/... events (RaceEvents.BUS + 'raceEvents')
+        self.lap_records = LapRecordTracker(self.lobby.track_id(), base_path=self.lobby.records_path) # Session/personal/track bests, updated per lap
+        self.lap_results = LAP_RESULTS # Laps + setup per track for the offline tuning lab (TuningLab.py)
+        self.settingsFilename = self.lobby.settings_path
+        self.settings_store = SettingsStore(self.settingsFilename, defaults={'entries_open': False}) # In-memory settings, atomic coalesced writes
+        self.settings_store.subscribe(self._on_settings_changed)
+        self.statsFilename = self.lobby.stats_path
         self.commandQueue = [] # List of commands to execute on each update
         self.commandFailures = {}
         self.commandRestarts = {}
         self.MAX_QUEUE_FAILURES = 5 # Constant for max retries
         self.MAX_RESTART_RETRIES = 3 # number of restart command retries
-        self.pendingSpawns = {} # list of user_ids that have a spawn command queued/recently issued and their timestamps
-        self.confirmedSpawns = {} # list of confirmed known spawns, 
-        self.respawn_cooldown = 5 # Seconds to wait for the game to respond
-        self.grace_period = 5 # Forgive a car for missing up to 5 seconds
+        self.spawns = SpawnReconciler(grace_period=5, spawn_timeout=5) # Entrants vs cars on the field, rate limited respawns
         
         
         # api Function calls (will get updated and populated by application.py)
@@ -130,8 +147,6 @@ class RaceManager():
         self.api_delete_all_racers = None
 
         # Ticker data structure
-        self.best_lap_time = "N/A"
-        self.best_lap_racer = "N/A"
         self.last_winner = "N/A"
         self.next_race_time = "TBA" # Can be updated with real time if needed (Not using for now)
         self.total_season_racers = 0 # Number of cars entered this season
@@ -139,14 +154,13 @@ class RaceManager():
         self.autoFill = True # whether to do it or not
         self.autoFilling = False # Actively autoFilling
         #Obs websocket control
-        self.obs_enabled = True # Whether to do automated obs actions
+        self.obs_enabled = self.lobby.primary # Whether to do automated obs actions (only the lobby on stream)
         self.obs_url = "localhost"
         self.obs_port = 4455
         self.obs_pass = self.config_manager.get('obs_ws')
-        self.obs_client = self.connect_to_obs()
+        self.obs = ObsController(self.obs_url, self.obs_port, self.obs_pass) # Connects/reconnects on its own thread
         self.obs_all_scenes = ["MAIN","Race Overlay Texts" "Intro Display", "Race Splits", "Race Finish", "Season Standings"]
-        self.obs_cur_scene = "Race Overlay Texts" # Raw just game scene (use index??)
-        self.obs_switch_scene(self.obs_cur_scene)
+        self.obs_switch_scene("Race Overlay Texts") # Raw just game scene (use index??)
         self.obs_intro_timer = -1 # How long to hold the Intro Display after race start
         self.obs_intro_timerRunning = False # if the timer is running
         self.obs_finish_timer = -1 # How long to hold the finish Display after race start
@@ -169,9 +183,26 @@ class RaceManager():
         # self.racer_data = self._load_initial_racer_data() # Logic from getAllRacerData
 
         #Init functions
+        self.lap_records.add_listener(self._on_fastest_lap)
+        self.overlay_data = {}
+        self.refresh_overlay_data()
+        MusicPlayer.add_track_listener(self.refresh_overlay_data) # Song changes happen off the race tick
+
+    def start(self):
+        """
+        Starts everything with side effects outside this object. Kept out of __init__ so the server
+        can build (and import) managers instantly and bring these up once it is already serving.
+        """
+        if self.started:
+            return
+        self.started = True
+        if self.lobby.primary:
+            MusicPlayer.preload_async() # Start the mixer and load playlists off the startup path
+        if self.obs_enabled:
+            self.obs.start()
         self._load_track_record()
-        self.overlay_data = self.build_overlay_data()
         self.openEntries() # Auto opens entries on Start (Small Delay?)
+        self.refresh_overlay_data()
 
 
 
@@ -188,10 +219,58 @@ class RaceManager():
             },
             
             # 3. Add Statistics Ticker Data (see next section)
-            "stats_ticker": self.get_ticker_data() 
+            "stats_ticker": self.get_ticker_data(),
+            # 4. Session fastest lap and track record
+            "lap_records": self.lap_records.snapshot()
         }
         return live_data
 
+    def _overlay_inputs(self):
+        """Everything build_overlay_data depends on. Cheap to compare every tick."""
+        return (self.raceStatus, self.stream_timer_output, self.totalCars, self.entriesOpen, self.raceFinished,
+                MusicPlayer.CURRENT_PLAYING_TITLE, MusicPlayer.CURRENT_PLAYING_ARTIST,
+                self.lap_records.version, self.last_winner, self.next_race_time,
+                self.total_season_racers)
+
+    def refresh_overlay_data(self):
+        """
+        Rebuilds overlay_data only when one of its inputs changed. A change bumps the version,
+        serializes the snapshot once for the REST fallback and pushes it to overlays over Socket.IO.
+        """
+        inputs = self._overlay_inputs()
+        with self.overlay_lock:
+            if inputs == self.overlay_key:
+                return False
+            self.overlay_key = inputs
+            self.overlay_version += 1
+            data = self.build_overlay_data()
+            data['version'] = self.overlay_version
+            self.overlay_data = data
+            self.overlay_bytes = json.dumps(data, separators=(',', ':')).encode()
+        if self.sio:
+            self.sio.emit('overlayData', data)
+        return True
+
+    def get_overlay_snapshot(self):
+        """Returns (etag, serialized bytes) of the current overlay data."""
+        with self.overlay_lock:
+            return f"{self.overlay_boot_id}-{self.overlay_version}", self.overlay_bytes
+
+    def build_entrant_state(self):
+        """Snapshot of entrants and entry status that the chat bot mirrors in memory."""
+        return {
+            "version": self.entrant_state_version,
+            "entries_open": self.entriesOpen,
+            "capacity": RACE_CAPACITY,
+            "entrants": [{"uid": d.get('userid'), "username": d.get('username')} for d in self.usersEntered]
+        }
+
+    def publish_entrant_state(self):
+        """Pushes the entrant snapshot to subscribers (chat bot) over Socket.IO."""
+        self.entrant_state_version += 1
+        if self.sio:
+            self.sio.emit('entrantState', self.build_entrant_state())
+
     # LOG PARSER REPLACEMENT:
     def process_and_broadcast_data(self, raw_data):
         """
@@ -202,13 +281,38 @@ class RaceManager():
             return
 
         parsed_data = self.parse_data(raw_data)
+        rt_list = raw_data.get('rt')
+        if isinstance(rt_list, list):
+            completed_laps = self.lap_history.record_realtime(rt_list) # Records a lap only when a racer's lap number goes up
+            if completed_laps:
+                self._record_completed_laps(completed_laps, parsed_data.get('realtime_data', []), rt_list)
+            self.telemetry.record(rt_list)
+        events = self.race_events.process(parsed_data) # One diff here instead of one per overlay
+        if events and self.sio:
+            self.sio.emit('raceEvents', events)
         # 2. Broadcasting (replaces LogParser.py's outputData)
-        self.sio.emit('raceData', parsed_data)
+        self.sio.emit_encoded('raceData', parsed_data) # JSON or struct-of-arrays per client codec (and the frame bus)
         # Note: self.sio is the server instance from Application.py, making this direct.
         
         # 3. State Update & Result Check (replaces LogParser.py's process_game_update logic)
         self._update_state_and_check_results(parsed_data)
 
+    def _record_completed_laps(self, completed_laps, realtime_data, rt_list):
+        """Feeds laps completed this tick to the record tracker and the lap result log (only runs on ticks where a lap ended)."""
+        names = {racer_key(racer['id']): racer.get('name') for racer in realtime_data if racer.get('id') is not None}
+        owners = {racer_key(racer['id']): racer_key(racer['owner']) for racer in rt_list # League racer id (tuning key)
+                  if racer.get('id') is not None and racer.get('owner') is not None}
+        for racer_id, lap_num, lap_seconds in completed_laps:
+            self.lap_records.record_lap(racer_id, names.get(racer_id, racer_id), laptime.from_seconds(lap_seconds), lap_num,
+                                        owner_id=owners.get(racer_id))
+        self.lap_results.record(self.lap_records.track_id, [(owners.get(racer_id), lap_num, lap_seconds)
+                                                           for racer_id, lap_num, lap_seconds in completed_laps])
+
+    def _on_fastest_lap(self, event):
+        """Lap record listener: pushes the fastest lap event to overlays."""
+        if self.sio:
+            self.sio.emit('fastestLap', event)
+
     # -----------------------------------------------------------------
     # STATE AND UPLOAD LOGIC: Replaces global checks
     # -----------------------------------------------------------------
@@ -332,8 +436,8 @@ class RaceManager():
                 
                 # [UPDATED] Key names matched to Lua
                 'lapNum': int(data.get('lap', 0)),     # Was 'lapNum', now 'lap'
-                'lastLap': helpers.get_time_from_seconds(float(data.get('lastLap', 0.0))),
-                'bestLap': helpers.get_time_from_seconds(float(data.get('bestLap', 0.0))),
+                'lastLapMs': laptime.from_seconds(data.get('lastLap')), # int ms (None until a lap is set)
+                'bestLapMs': laptime.from_seconds(data.get('bestLap')),
                 
                 # [UPDATED] Gaps are now explicitly named
                 'gapToLeader': data.get('gapTime', "0.000"), # Was 'gapToLeader', now 'gapTime'
@@ -357,6 +461,12 @@ class RaceManager():
                 'finished': data.get('finished', False)
             }
             raceData.append(racer_data)
+        # Display strings are only made here, for the whole field at once
+        last_laps = laptime.format_ms_list([r['lastLapMs'] for r in raceData], missing=laptime.ZERO_TIME)
+        best_laps = laptime.format_ms_list([r['bestLapMs'] for r in raceData], missing=laptime.ZERO_TIME)
+        for racer_data, last_lap, best_lap in zip(raceData, last_laps, best_laps):
+            racer_data['lastLap'] = last_lap
+            racer_data['bestLap'] = best_lap
         outputData['realtime_data'] = raceData
         
         # ================== QUALIFYING/FINISH DATA (Consolidated Logic) ==================
@@ -373,7 +483,7 @@ class RaceManager():
                 entry = {
                     **racer_details,
                     'pos': int(data.get(pos_key, 0)),
-                    'bestLap': helpers.get_time_from_seconds(float(data.get('best_lap', 0.0))),
+                    'bestLapMs': laptime.from_seconds(data.get('best_lap')),
                     'split': str(data.get('split', "0.000")), #TODO: rename this to gapToLeader and propogate
                     'finishTime': str(data.get('finishTime', "0.000")),
                 }
@@ -382,6 +492,9 @@ class RaceManager():
                     entry['uid'] = data.get('racer_id', 'unknown') # Using racer_id here as per your original code
                 
                 parsed_list.append(entry)
+            best_laps = laptime.format_ms_list([e['bestLapMs'] for e in parsed_list], missing=laptime.ZERO_TIME)
+            for entry, best_lap in zip(parsed_list, best_laps):
+                entry['bestLap'] = best_lap
             return parsed_list
 
         outputData['qualifying_data'] = _parse_race_list('qd')
@@ -399,8 +512,8 @@ class RaceManager():
         race_id = sharedData._SpecificRaceData['race_id']
         track_id = sharedData._SpecificRaceData['track_id']
         timestamp = datetime.datetime.now().strftime("%m/%d/%Y %H:%M:%S") # What to do with this?
-        fastestLap,fastestRacer = helpers.getFastestLap_racer(finishData)
-        fastRacerName = fastestRacer['name']
+        fastestLap,fastestRacer = self._session_fastest_lap(finishData)
+        fastRacerName = fastestRacer['name'] if fastestRacer else None # None when nobody set a valid lap
         #print("Fastest lap and racer:",fastestLap,fastRacerName)
         status = sharedData.track_record_managment(track_id,fastestLap,fastestRacer)
         results = self.generateResultString(finishData)
@@ -416,8 +529,8 @@ class RaceManager():
         race_id = sharedData._SpecificRaceData['race_id']
         track_id = sharedData._SpecificRaceData['track_id']
         timestamp = datetime.datetime.now().strftime("%m/%d/%Y %H:%M:%S") # What to do with this?
-        fastestLap,fastestRacer = helpers.getFastestLap_racer(finishData)
-        fastRacerName = fastestRacer['name']
+        fastestLap,fastestRacer = self._session_fastest_lap(finishData)
+        fastRacerName = fastestRacer['name'] if fastestRacer else None # None when nobody set a valid lap
         status = sharedData.track_record_managment(track_id,fastestLap,fastestRacer)
         results = self.generateResultString(finishData)
         print("Got Race results,",results,"New Lap Record?",status)
@@ -426,6 +539,21 @@ class RaceManager():
         return result
 
 
+    def _session_fastest_lap(self, finishData):
+        """
+        Returns (time string, racer entry) of the fastest lap for the upload, read from the lap
+        record tracker instead of rescanning. Finish bests are offered first so a lap that was
+        never seen live (server restarted mid race) still counts.
+        """
+        for racer in finishData:
+            self.lap_records.record_lap(racer.get('id'), racer.get('name'), racer.get('bestLapMs'), completed_lap=False,
+                                        owner_id=racer.get('owner'))
+        racer_id, time_ms = self.lap_records.session_fastest()
+        for racer in finishData:
+            if racer_id is not None and racer.get('id') is not None and racer_key(racer['id']) == racer_id:
+                return laptime.format_ms(time_ms), racer
+        return helpers.getFastestLap_racer(finishData) # Session best belongs to a racer missing from these results
+
     # =================================================================
     # PRIVATE HELPER METHODS (Moved from LogParser.py or created for structure)
     # =================================================================
@@ -556,14 +684,18 @@ class RaceManager():
             racer_details = self._get_racer_details(racerID, data)
             if racer_details.get('tag') is None: continue
 
+            last_lap_ms = laptime.from_seconds(data.get('lastLap'))
+            best_lap_ms = laptime.from_seconds(data.get('bestLap'))
             racer_data = {
                  # Identity (from helper)
                 **racer_details, 
-                # Race Data (direct mapping and conversion - uses helper.get_time_from_seconds)
+                # Race Data (direct mapping, lap times converted once to int ms)
                 'pos': int(data.get('place', 0)),
                 'lapNum': int(data.get('lapNum', 0)),
-                'lastLap': helpers.get_time_from_seconds(float(data.get('lastLap', 0.0))),
-                'bestLap': helpers.get_time_from_seconds(float(data.get('bestLap', 0.0)))
+                'lastLapMs': last_lap_ms,
+                'bestLapMs': best_lap_ms,
+                'lastLap': laptime.format_ms(last_lap_ms, laptime.ZERO_TIME),
+                'bestLap': laptime.format_ms(best_lap_ms, laptime.ZERO_TIME)
             }
             raceData.append(racer_data)
         return raceData
@@ -581,7 +713,8 @@ class RaceManager():
             entry = {
                 **racer_details,
                 'pos': int(data.get(pos_key, 0)),
-                'bestLap': helpers.get_time_from_seconds(float(data.get('bestLap', 0.0))),
+                'bestLapMs': laptime.from_seconds(data.get('bestLap')),
+                'bestLap': laptime.format_ms(laptime.from_seconds(data.get('bestLap')), laptime.ZERO_TIME),
                 'timeSplit': data.get('timeSplit', "0.000"),
                 'split': str(data.get('split', "0.000")),
             }
@@ -600,10 +733,10 @@ class RaceManager():
     def get_ticker_data(self):
         """Compiles current race statistics into a list of strings."""
         
-        #print("Getting stats ticker",self.best_lap_time,self.total_season_racers)
+        #print("Getting stats ticker",self.lap_records.track_record_text(),self.total_season_racers)
         ticker_list = [
             f"Use '!join' to join an open race. Details in description below",
-            f"Current Track Record: {self.best_lap_time} by {self.best_lap_racer}",
+            f"Current Track Record: {self.lap_records.track_record_text()}",
             f"Last Race Winner: {self.last_winner}",
             f"Next Race Approximate Start: {self.next_race_time}", # Tis is unecessary and will be unused for now but I like the idea
             f"Total Entrants This Season: {str(self.total_season_racers)}" # Uses total cars with saved stats
@@ -619,7 +752,7 @@ class RaceManager():
     def _approximate_next_race(self, data): 
         """
         Approximates the time of the next race by iterating over realtime car data,
-        Averages the last lap time of all racers (after converting the string to seconds)
+        Averages the last lap time of all racers (lastLapMs, int milliseconds)
         Adds the ammount of seconds it takes to reset the race (Race finish delay)
         Adds a small padding of 5 seconds
         Takes the current time and adds the newly calculated seconds to it
@@ -635,9 +768,10 @@ class RaceManager():
         cutCount = 2
         try:
             for car in data:
-                # IMPORTANT: Accessing car['lastLap'] not data['lastLap']
-                lastLapstr = car['lastLap']
-                timeList.append(helpers.get_seconds_from_time(lastLapstr))
+                # IMPORTANT: Accessing car['lastLapMs'] not data['lastLapMs']
+                lastLapMs = car.get('lastLapMs')
+                if lastLapMs is not None:
+                    timeList.append(lastLapMs / 1000.0)
             # Check if there are enough times to cut
             if len(timeList) <= cutCount:
                 # Handle case where cutting is impossible/meaningless
@@ -653,7 +787,7 @@ class RaceManager():
 
 
         except Exception:
-            # Handle cases where 'lastLap' or helpers.get_seconds_from_time fails
+            # Handle cases where car data is malformed
             return "N/A"
             
         totalTime = avgLapTime + finishDelay + padding # Delay until next race (in seconds)
@@ -714,42 +848,31 @@ class RaceManager():
 
     def _load_track_record(self):
         """
-        Scans all saved user stats to find and set the overall best lap time 
-        and the corresponding racer for the overlay. Called on initialization.
+        Counts season racers and, only when the current track has no saved record yet, migrates
+        the best lap from the saved user stats into the lap record tracker. Called on initialization.
         """
         current_stats = self.grabUserStats()
         self.total_season_racers = len(current_stats)
-        # Initialize with the highest possible time
-        global_best_time_sec = self.MAX_LAP_TIME_SENTINEL 
+        if self.lap_records.has_saved_record():
+            print(f"Loaded Track Record: {self.lap_records.track_record_text()}")
+            return
+        global_best_ms = None
+        global_best_user_id = None
         global_best_racer_name = None
         for user_id, stats in current_stats.items():
-            user_best_lap_str = stats.get('best_lap_time', helpers.get_time_from_seconds(self.MAX_LAP_TIME_SENTINEL)) #redundant...
-            # 2. Convert the stored string time into a comparable numeric seconds value
-            try:
-                # Use your helper to get the float (seconds) from the formatted string
-                user_best_lap_sec = helpers.get_seconds_from_time(user_best_lap_str)
-            except Exception:
-                # Failsafe for "N/A", None, or unparseable initial/legacy values
-                user_best_lap_sec = self.MAX_LAP_TIME_SENTINEL
-
-            # Use 'name' from the stats if available, or fall back to the ID
-            racer_name = stats.get('name', str(user_id)) 
-            if user_best_lap_sec < global_best_time_sec:
-                global_best_time_sec = user_best_lap_sec
-                global_best_racer_name = racer_name
+            # Stored as "MM:SS.mmm" (or the numeric sentinel for no time); parse returns None for anything unusable
+            user_best_ms = laptime.parse(stats.get('best_lap_time'))
+            if user_best_ms is not None and (global_best_ms is None or user_best_ms < global_best_ms):
+                global_best_ms = user_best_ms
+                # Use 'name' from the stats if available, or fall back to the ID
+                global_best_racer_name = stats.get('name', str(user_id))
+                global_best_user_id = user_id
                 
-        # Update instance variables
-        if global_best_time_sec < self.MAX_LAP_TIME_SENTINEL:
-            # Format the time (assuming time is a float/integer representing seconds/ms)
-            self.best_lap_time = helpers.get_time_from_seconds(global_best_time_sec)
-            self.best_lap_racer = global_best_racer_name
-        else:
-            self.best_lap_time = "N/A"
-            self.best_lap_racer = "N/A"
+        self.lap_records.seed_track_record(global_best_user_id, global_best_racer_name, global_best_ms) # Stats know the owner, not a car
             
         # Also load the last winner if you have a reliable way to store it (not currently defined)
         # For simplicity, we'll keep last_winner as N/A until the first race finishes.
-        print(f"Loaded Track Record: {self.best_lap_time} by {self.best_lap_racer}")
+        print(f"Loaded Track Record: {self.lap_records.track_record_text()}")
 
     def respawn_twitch_racer(self,racer): # Directly tells game to spawn racer (does not add to usersEntered, used to rectify failed add)
         racerData = {
@@ -770,7 +893,7 @@ class RaceManager():
         }
         # This is the line that triggers the game to spawn the car.
         #TODO: Possibly quueue this up if we know we havae a large list coming (only autoFill?)
-        results = addToQueue([apiCommand])
+        results = self.lobby.commands.send([apiCommand])
         return results
 
     def onJoin(self,command): # executes on join API request of racer, is the middleman between the stream parser and the game
@@ -780,7 +903,7 @@ class RaceManager():
         if self.entriesOpen == False: # if entries are closed and not a bot is joining
             return False # TODO: check if bot
         
-        if self.obs_cur_scene != "Intro Display": # Switch to entries when people start to join
+        if self.obs.scene != "Intro Display": # Switch to entries when people start to join
             self.obs_switch_scene("Intro Display")
 
         user_id = command.get('userid')
@@ -814,8 +937,9 @@ class RaceManager():
         self.totalCars = len(self.usersEntered)
         # 2. QUEUE SPAWN COMMAND & TRACK AS PENDING
         self.queue_racer_spawn(racerData) 
-        self.pendingSpawns[user_id] = time.time()
+        self.spawns.add(racerData) # Checked for a respawn if it never shows up
         self.racer_names.append(racerData['username'])
+        self.publish_entrant_state()
         if self.totalCars >= RACE_CAPACITY:
             self.closeEntries()
             return True
@@ -829,10 +953,9 @@ class RaceManager():
         self.autoFilling = False
 
         print("--- Opening RACE ENTRIES ---")
-        result = self.updateSettings('entries_open',True)
-        if self.obs_cur_scene not in ["Intro Display", "Season Standings"]: #Only switch when not here
-            self.obs_cur_scene = "Intro Display" # Raw just game scene (use index??)
-            self.obs_switch_scene(self.obs_cur_scene)
+        result = self.updateSettings('entries_open',True) # Subscribers (entrant state) are notified by the store
+        if self.obs.scene not in ["Intro Display", "Season Standings"]: #Only switch when not here
+            self.obs_switch_scene("Intro Display")
         return result
 
     def closeEntries(self):
@@ -1005,6 +1128,8 @@ class RaceManager():
             self.usersEntered = []
             self.racer_names = []
             self.totalCars = 0
+            self.spawns.clear()
+            self.publish_entrant_state()
             
             # Signal success to the executeQueue
             return True
@@ -1031,6 +1156,8 @@ class RaceManager():
             # This is the actual list mutation (reassignment) that updates the instance variable.
             self.usersEntered = newArr
             self.totalCars = len(self.usersEntered)
+            self.spawns.remove(userid)
+            self.publish_entrant_state()
             print(f"Removed user {userid}. Current usersEntered count: {len(self.usersEntered)}")
         else:
             # The API call failed. The user is still in the local list.
@@ -1141,6 +1268,8 @@ class RaceManager():
                 stats['best_lap_time'] = self.MAX_LAP_TIME_SENTINEL
                 reset_count += 1
                 
+        self.lap_records.reset_track_record() # Ticker/overlays read the record from the tracker
+        
         # 3. Save the modified stats
         if reset_count > 0:
             self.saveUserStats(current_stats)
@@ -1157,19 +1286,17 @@ class RaceManager():
         POINTS_STRUCTURE = [15, 12, 10, 8, 7, 6, 5, 4, 3, 2]  # all entered racers get at least 1
         # Check if all known cars have finished
         if len(finish_data) > 2: #if data not switched
-            if self.obs_cur_scene not in  ["Race Finish", "Season Standings"]: # switch scene to race finish
+            if self.obs.scene not in  ["Race Finish", "Season Standings"]: # switch scene to race finish
                 self.obs_switch_scene("Race Finish")
 
         if len(finish_data) == self.totalCars and self.totalCars > 0 and not self.raceFinished: # All racers finished
             print("Finished Race")
             self.obs_finish_timer = FINISH_SCREEN_LENGTH
             self.obs_finish_timerRunning = True
-            if self.obs_cur_scene not in ["Race Finish", "Season Standings"]: # switch scene to race finish
+            if self.obs.scene not in ["Race Finish", "Season Standings"]: # switch scene to race finish
                 self.obs_switch_scene("Race Finish")
 
             current_stats = self.grabUserStats()
-            race_best_lap = self.MAX_LAP_TIME_SENTINEL
-            race_best_racer_name = None
             race_winner_name = None
             
             for racer_result in finish_data:
@@ -1181,7 +1308,7 @@ class RaceManager():
                     'name':racer_result['name'],
                     'wins': 0, 
                     'races_entered': 0, 
-                    'best_lap_time': helpers.get_time_from_seconds(self.MAX_LAP_TIME_SENTINEL),
+                    'best_lap_time': laptime.NO_TIME, # Stats file keeps strings; laptime.parse reads "N/A" as no lap
                     'podiums': 0, # NEW FIELD
                     'points': 0,  # NEW FIELD
                     'saved_bp': None,
@@ -1210,29 +1337,16 @@ class RaceManager():
                 curPoints = int(stats.get('points', 0))
                 stats['points'] = curPoints + points_to_add
 
-                best_lap_str = racer_result.get('bestLap')
-                # Try to convert it to a float for comparison
-                try:
-                    best_lap_seconds = helpers.get_seconds_from_time(best_lap_str)
-                except (TypeError, ValueError):
-                    # Handle cases where it's None, "N/A", or a formatted string
-                    best_lap_seconds = self.MAX_LAP_TIME_SENTINEL 
-                    
-                try: # Convert stat too
-                    best_stat_lap_seconds = helpers.get_seconds_from_time(stats['best_lap_time'])
-                except (TypeError, ValueError):
-                    # Handle cases where it's None, "N/A", or a formatted string
-                    best_stat_lap_seconds = self.MAX_LAP_TIME_SENTINEL 
+                best_lap_ms = racer_result.get('bestLapMs') # int ms or None
+                best_stat_lap_ms = laptime.parse(stats.get('best_lap_time')) # Stats file keeps "MM:SS.mmm"
                 
                 # 4. Update best lap
-                # check if best lap stat is string formatted and convert that too
-                if best_lap_seconds < best_stat_lap_seconds:
-                    stats['best_lap_time'] = helpers.get_time_from_seconds(best_lap_seconds)
+                if best_lap_ms is not None and (best_stat_lap_ms is None or best_lap_ms < best_stat_lap_ms):
+                    stats['best_lap_time'] = laptime.format_ms(best_lap_ms)
                 
                 current_stats[user_id] = stats
-                if best_lap_seconds < race_best_lap: 
-                    race_best_lap = best_lap_seconds 
-                    race_best_racer_name = racer_name
+                # Laps seen live are already in the tracker; this only catches ones that were missed
+                self.lap_records.record_lap(racer_result.get('id'), racer_name, best_lap_ms, completed_lap=False, owner_id=user_id)
 
                 if place == 1:
                     race_winner_name = racer_name
@@ -1241,15 +1355,7 @@ class RaceManager():
             self.total_season_racers = len(current_stats)
 
             # --- Ticker Updates based on Race Results ---
-            
-            # Check for new Global Track Record
-            # self.best_lap_time is a string, so we need to convert it back to a float for comparison
-            current_global_best = helpers.get_seconds_from_time(self.best_lap_time) if self.best_lap_time != "N/A" else self.MAX_LAP_TIME_SENTINEL
-            
-            if race_best_lap < current_global_best:
-                print(f"NEW TRACK RECORD! {race_best_lap:.2f}s by {race_best_racer_name}")
-                self.best_lap_time = helpers.get_time_from_seconds(race_best_lap)
-                self.best_lap_racer = race_best_racer_name
+            # (Track record is kept by self.lap_records as laps complete)
 
             # Update Last Winner
             if race_winner_name:
@@ -1278,7 +1384,14 @@ class RaceManager():
         self.autoStartTimerRunning = False
         self.raceFinished = False
         self.totalCars = 0 # Here to stop autorace from triggering prematurely. Need a better way to do this
-        self.confirmedSpawns = {}  # clear out known spawners
+        self.spawns.clear()  # Racers are about to be deleted; drop entrants and queued respawns
+        self.lap_history.reset()
+        self.race_events.reset()
+        self.lap_records.reset_session() # Track record is kept
+        track_id = self.lobby.track_id()
+        if track_id is not None and str(track_id) != self.lap_records.track_id: # League moved to a new track
+            self.lap_records.set_track(track_id)
+        self.telemetry.close_session() # Next tick with racers starts a new session
         self.obs_intro_timer = -1
         self.obs_intro_timerRunning = False
         self.obs_finish_timer = -1
@@ -1308,7 +1421,7 @@ class RaceManager():
         self.autoStarted = False # TODO: Creaqte a confirmrace reset that essentially only resets timer and such after deletion is confirmed
 
         # 7. Switch obs scene to intro again (Keep at season until next joiner)
-        #if self.obs_cur_scene != "Intro Display":
+        #if self.obs.scene != "Intro Display":
         #    self.obs_switch_scene("Intro Display")
 
     def _reset_deletingRacers_state(self):
@@ -1445,7 +1558,7 @@ class RaceManager():
         self.commandQueue.append(self.confirmRaceStart)
         
         # --- 4. Final State Lock and Audio/Visuals ---
-        play_dynamic_music("START") 
+        self.play_music("START") 
         self.autoStarted = True
         self.obs_intro_timerRunning = True
         self.obs_intro_timer = INTRO_SCREEN_LENGTH
@@ -1455,54 +1568,18 @@ class RaceManager():
         return True
 
     def checkDiscrepancy(self, data):
-        if self.deletingRacers: #immediately no
-            return
         """
-        Checks for a mismatch between the number of expected racers (usersEntered)
-        and the actual cars currently loaded in the simulation (carData).
-        Also looks for two of the same username
+        Checks for a mismatch between the expected racers (usersEntered) and the cars
+        currently loaded in the simulation (carData). The spawn reconciler only acts when
+        a car arrives or drops off, and hands back at most one rate limited respawn per
+        call for racers still missing after their grace period/backoff.
         """
-        carData = data
-        #numCarsOnField = len(carData)
-        #numCarsEntered = len(self.usersEntered)
-
-        spawned_ownerids = {str(car.get('owner')) for car in carData if car.get('owner') is not None} # For some reason  
-        #duped = [str(car.get('owner')) for car in carData if car.get('owner') is not None]
-        #dupeSpawn = [str(car.get('userid')) for car in self.usersEntered if car.get('userid') is not None]
-        
-        #print()
-        #print("Known:",len(spawned_ownerids),numCarsOnField)
-        #print("Spawned:",len(duped),numCarsOnField)
-        #print("confirmed:",len(self.confirmedSpawns),numCarsOnField)
-        #print("entered:",len(dupeSpawn),numCarsEntered)
-        #print()
-        #print()
-        
-        # check if more than one is spawned and why
-        for racer in self.usersEntered:
-            user_id = racer.get('userid')
-            str_user_id = str(user_id)
-            if str_user_id not in spawned_ownerids:
-                last_seen_time = self.confirmedSpawns.get(str_user_id)
-                # 1. Is the car a KNOWN ENTITY that was just lost for a moment?
-                if last_seen_time is not None and (time.time() - last_seen_time) < self.grace_period:
-                    # Car was confirmed present very recently. Ignore the missing tick.
-                    #print("Missing but grace:",str_user_id,duped)
-                    continue
-                last_spawn_time = self.pendingSpawns.get(str_user_id)
-                if last_spawn_time is not None and (time.time() - last_spawn_time) < self.respawn_cooldown:
-                    # A spawn was previously sent. Check the time elapsed.
-                    # Still within the grace period for the game to load the car
-                    #print(f"Ignoring missing car {user_id}: Waiting for spawn confirmation.")
-                    continue
-                else:
-                    #print(f"TIMEOUT: Spawn for {str_user_id} failed to spawn in game. Re-sending spawn command.") # Comment this out
-                    pass
-                print(f"Fixing Discrepancy: Respawning racer {racer.get('username')}",racer.get('userid'))
-                self.respawn_twitch_racer(racer)
-                    # The car is still missing after the cooldown! It failed to spawn.
-
-    
+        if self.deletingRacers: #immediately no
+            return
+        self.spawns.observe(str(car.get('owner')) for car in data if car.get('owner') is not None)
+        for racer in self.spawns.due_respawns():
+            print(f"Fixing Discrepancy: Respawning racer {racer.get('username')}",racer.get('userid'))
+            self.respawn_twitch_racer(racer)
 
     def onUpdate(self,data):
         """
@@ -1534,15 +1611,15 @@ class RaceManager():
         # 1. Check for the most urgent states first (e.g., race end, final lap)
         if self.raceFinished or self.stoppingRace:
             # Race is over, playing the cooldown/reset music
-            play_dynamic_music("RESET")
+            self.play_music("RESET")
             
         elif self.raceStatus == "Green Flag" and not self.stoppingRace:
             # Race is actively running
             if self.lapsLeft <= 0: # Need check for if bogus data (crashfix)
-                play_dynamic_music("FINAL")
+                self.play_music("FINAL")
             else:
                 # Standard Race Music
-                play_dynamic_music("RACE")
+                self.play_music("RACE")
                 
             # Logic for manually started race remains here
             if self.autoStarted == False:
@@ -1555,12 +1632,13 @@ class RaceManager():
             
         elif self.entriesOpen:
             # Entries are open, playing the prep/lobby music
-            play_dynamic_music("PREP")
+            self.play_music("PREP")
             
         elif self.raceStatus in ["Formation"]:
-            play_dynamic_music("START")
+            self.play_music("START")
         
-        check_music_finished_and_loop()
+        if self.lobby.primary:
+            check_music_finished_and_loop()
         # -----------------------------
 
 
@@ -1568,7 +1646,7 @@ class RaceManager():
         if self.obs_intro_timerRunning: # Runs Intro display until ? ammount of seconds after race "starts" (is in formation)
             self.obs_intro_timer -= 1
             if self.obs_intro_timer < 0 and self.obs_intro_timerRunning:
-                if self.obs_cur_scene != "Race Splits":
+                if self.obs.scene != "Race Splits":
                     self.obs_switch_scene("Race Splits")
                     self.obs_intro_timerRunning = False
                     obs_intro_timer = RACE_START_DELAY
@@ -1580,23 +1658,13 @@ class RaceManager():
                     #self.commandQueue.append(self.deleteRacers) Delete here??
                     self.commandQueue.append(self.confirmRaceStop) # auto starts even to
 
-                if self.obs_cur_scene != "Season Standings":
+                if self.obs.scene != "Season Standings":
                     self.obs_switch_scene("Season Standings")
                     self.obs_finish_timerRunning = False
                     self.obs_finish_timer = RACE_FINISH_DELAY
 
-        if self.pendingSpawns:
-            # Create a set of user IDs that are currently on the field
-            current_field_ids = {str(car.get('owner')) for car in carData if car.get('owner') is not None} 
-            for user_id in current_field_ids:
-                self.confirmedSpawns[user_id] = time.time()
-                foundCar = self.pendingSpawns.pop(user_id, None)
-                #if foundCar: # Debug
-                    #print(f"Pending spawn {user_id} now on field.",len(self.pendingSpawns))
-        
-    
         self.checkDiscrepancy(carData)
-        self.overlay_data = self.build_overlay_data()
+        self.refresh_overlay_data()
         if self.raceFinishCountdown == 0 and self.raceFinished: # Reset race
             self.resetRace()
 
@@ -1720,29 +1788,21 @@ class RaceManager():
         
 
 
-    def getSimSettings(self,filename):
-        try:
-            with open(filename, 'r') as infile: 
-                simSettings = json.load(infile)
-                return simSettings
-        except (FileNotFoundError, json.JSONDecodeError):
-             print(f"Warning: Could not read {filename}. Using empty settings.")
-             simSettings = {}
-             return simSettings
+    def getSimSettings(self,filename=None):
+        """Returns a copy of the current settings from the in-memory store (no file read)."""
+        version, settings = self.settings_store.snapshot()
+        return settings
 
-        
     def updateSettings(self,key,value):
-        settingsObject = self.getSimSettings(self.settingsFilename)
-        if settingsObject.get(key) != None:
-            settingsObject[key] = value
-        try:
-            with open(self.settingsFilename, 'w') as outfile: 
-                json.dump(settingsObject, outfile) # Write default settings
-        except (FileNotFoundError, json.JSONDecodeError):
-             print(f"Warning: Could not open {self.settingsFilename}. Retry?")
-             return False
+        """Updates a setting in the store. Persisting to settings.json happens on the store's writer thread."""
+        self.settings_store.set(key, value)
         return True
 
+    def _on_settings_changed(self, version, changes):
+        """Settings store subscriber: re-publishes entrant state when entry status changes."""
+        if 'entries_open' in changes:
+            self.publish_entrant_state()
+
 
     def update_text_overlay_files(self):
         """
@@ -1789,7 +1849,7 @@ class RaceManager():
             # Chat reply: Entries are already open!
             return f"@{chatter_name}, entries are already open!"
         self.openEntries()
-        play_dynamic_music("PREP") # Transition music to Prep/Anticipation
+        self.play_music("PREP") # Transition music to Prep/Anticipation
         return f"@{chatter_name} manually OPENED entries. Join now with !join!"
 
     def manual_close_entries(self, chatter_name="Admin"):
@@ -1859,56 +1919,23 @@ class RaceManager():
 
     #------------ Twitch interactions---------
 
-    def _make_twitch_api_call(self, method, url, payload):
-        """Handles API calls and token refreshing."""
-        # 1. Attempt the call
-        response = method(url, headers=self._get_twitch_headers(), json=payload)
-
-        # 2. Check for UNAUTHORIZED (Token Expired)
-        if response.status_code == 401:
-            print("Token expired (401). Attempting refresh...")
-            # 3. Refresh the token
-            if not self.refresh_twitch_token():
-                # If refresh fails, we can't continue
-                return response # Will still be the 401 response
-
-            # 4. Retry the original call with the NEW token
-            print("Token refreshed. Retrying API call...")
-            response = method(url, headers=self._get_twitch_headers(), json=payload)
-
-        return response
+    def _store_twitch_tokens(self, access_token, refresh_token):
+        """Called by the Helix client after a refresh (on its loop thread) to persist the new tokens."""
+        self.TWITCH_ACCESS_TOKEN = access_token
+        self.TWITCH_REFRESH_TOKEN = refresh_token
+        self.config_manager.set("TWITCH_ACCESS_TOKEN", access_token)
+        self.config_manager.set("TWITCH_REFRESH_TOKEN", refresh_token)
+        self.config_manager.save()
 
     def refresh_twitch_token(self):
-        """Uses the refresh token to get a new access token."""
-        url = "https://id.twitch.tv/oauth2/token"
-        payload = {
-            "client_id": self.TWITCH_CLIENT_ID,
-            "client_secret": self.TWITCH_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": self.TWITCH_REFRESH_TOKEN # Use the stored token
-        }
-
+        """Uses the refresh token to get a new access token (blocks until done; race code never needs this)."""
+        future = self.helix.submit(self.helix.refresh(self.helix.access_token))
         try:
-            response = requests.post(url, data=payload)
-            response.raise_for_status()
-            data = response.json()
-            # The new, fresh access token
-            new_access_token = data["access_token"]
-            self.TWITCH_ACCESS_TOKEN = new_access_token
-            self.config_manager.set("TWITCH_ACCESS_TOKEN", new_access_token)            
-            # You must update your storage with this new refresh token if it exists!
-            if 'refresh_token' in data:
-                new_refresh_token = data["refresh_token"]
-                self.TWITCH_REFRESH_TOKEN = new_refresh_token
-                self.config_manager.set("TWITCH_REFRESH_TOKEN", new_refresh_token)
-            self.config_manager.save()
-
-            print("Twitch Access Token refreshed successfully.")
-            return True
-
+            return future.result(timeout=15)
         except Exception as e:
             print(f"Token refresh failed: {e}")
             return False
+
     def toggle_predictions(self): # enables/disables predictions
         self.predictions_enabled = not self.predictions_enabled
         print('Set predictions to',self.predictions_enabled)
@@ -1925,15 +1952,6 @@ class RaceManager():
         return result
 
 
-    def _get_twitch_headers(self):
-        """Returns the standard headers required for Twitch Helix API calls."""
-        return {
-            "Client-ID": self.TWITCH_CLIENT_ID,
-            "Authorization": f"Bearer {self.TWITCH_ACCESS_TOKEN}",
-            "Content-Type": "application/json"
-        }
-
-
     def start_twitch_prediction(self):
         if self.predictions_enabled == False:
             return 
@@ -1970,8 +1988,8 @@ class RaceManager():
         if field_racers:
             outcomes.append({"title": FIELD_RACER_TITLE})
 
-        # Store the final mapping for resolution later
-        self.prediction_racer_map = {name: name for name in individual_racers}
+        # Store the final mapping for resolution later (racer name -> outcome title)
+        self.prediction_racer_map = {name: name[:MAX_NAME_LENGTH] for name in individual_racers}
         if field_racers:
             self.prediction_racer_map[FIELD_RACER_TITLE] = field_racers # Map the field name to a list of names
 
@@ -1983,44 +2001,14 @@ class RaceManager():
         title = "Who will win the next race?"
         prediction_window = 180 # 3 minutes for viewers to bet
 
-        url = "https://api.twitch.tv/helix/predictions"
-        
-        payload = {
-            "broadcaster_id": self.TWITCH_BROADCASTER_ID,
-            "title": title,
-            "outcomes": outcomes,
-            "prediction_window": prediction_window 
-        }
-        print(payload)
-        print(len(outcomes))
-        try:
-            #response = requests.post(url, headers=headers, json=payload)
-            response = self._make_twitch_api_call(requests.post, url, payload) # <--- NEW
-            response.raise_for_status()
-            
-            twitch_data = response.json().get('data', [{}])[0]
-            self.prediction_id = twitch_data.get('id')
-            self.prediction_active = True
-            
-            # Store the mapping for resolution later
-            self.outcome_map = {}
-            for outcome in twitch_data.get('outcomes', []):
-                self.outcome_map[outcome.get('title')] = outcome.get('id')
+        # Queued on the Helix client; the race tick does not wait for Twitch
+        self.prediction_active = True
+        started = self.predictions.start(title, [outcome["title"] for outcome in outcomes], prediction_window)
+        started.add_done_callback(self._on_prediction_started)
 
-            print(f"Twitch Prediction STARTED successfully. ID: {self.prediction_id}")
-            
-        except Exception as e:
-            status_code = response.status_code if 'response' in locals() else 'N/A'
-            
-            # Check if the response exists and has an error body
-            if status_code == 400 and 'response' in locals():
-                error_details = response.text 
-                print(f"Error starting Twitch Prediction (Status: 400): {e}")
-                print(f"Twitch Error Details: {error_details}") # <--- THIS IS THE KEY
-            else:
-                error_details = response.text 
-                print(f"Error starting Twitch Prediction: {e}")
-                print(f"Twitch Error Details: {error_details}") # <--- THIS IS THE KEY
+    def _on_prediction_started(self, future):
+        if future.exception() is not None or not future.result():
+            self.prediction_active = False # Start failed (already logged); nothing to resolve later
 
 
     def resolve_twitch_prediction(self, winning_racer_name):
@@ -2028,110 +2016,35 @@ class RaceManager():
         Resolves the active Twitch Prediction, declaring the winner and distributing points.
         Should be called immediately upon determining the race winner.
         """
-        if not self.prediction_active or not self.prediction_id:
+        if not self.prediction_active:
             print("No active prediction to resolve.")
             return
 
-        # 1. Get the Twitch Outcome ID for the winner
-        winning_outcome_id = self.outcome_map.get(winning_racer_name)
-        winning_outcome_name = None
-
         # 1. Check if the winner was an individually named outcome
-        if winning_racer_name in self.outcome_map:
-            winning_outcome_name = winning_racer_name
-            winning_outcome_id = self.outcome_map[winning_racer_name]
-            
+        winning_outcome = self.prediction_racer_map.get(winning_racer_name)
         # 2. Check if the winner was part of "The Field"
-        else:
+        if not isinstance(winning_outcome, str):
             field_racers = self.prediction_racer_map.get(FIELD_RACER_TITLE, [])
-            if winning_racer_name in field_racers:
-                winning_outcome_name = FIELD_RACER_TITLE
-                # The field outcome was created using FIELD_RACER_TITLE
-                winning_outcome_id = self.outcome_map.get(FIELD_RACER_TITLE) 
+            winning_outcome = FIELD_RACER_TITLE if winning_racer_name in field_racers else None
 
-        if not winning_outcome_id:
-            print(f"Error: Winner ({winning_racer_name}) was not found in prediction outcomes (Refund is necessary).")
-            self.cancel_twitch_prediction()
-            return
-
-        # 2. Patch the prediction status to RESOLVED
-        url = f"https://api.twitch.tv/helix/predictions"
-        headers = self._get_twitch_headers()
-        
-        # Status RESOLVED ends the prediction and pays out the channel points
-        payload = {
-            "broadcaster_id": self.TWITCH_BROADCASTER_ID,
-            "id": self.prediction_id,
-            "status": "RESOLVED",
-            "winning_outcome_id": winning_outcome_id 
-        }
-
-        try:
-            response = self._make_twitch_api_call(requests.patch, url, payload) # <--- NEW
-            response.raise_for_status()
-            
-            print(f"Twitch Prediction RESOLVED. Winner: {winning_racer_name}. Points distributed!")
-            
-        except Exception as e:
-            status_code = response.status_code if 'response' in locals() else 'N/A'
-            
-            # Check if the response exists and has an error body
-            if status_code == 400 and 'response' in locals():
-                error_details = response.text 
-                print(f"Error resolving  Twitch Prediction (Status: 400): {e}")
-                print(f"Twitch Error Details: {error_details}") # <--- THIS IS THE KEY
-            else:
-                error_details = response.text 
-                print(f"Error resolving Twitch Prediction: {e}")
-                print(f"Twitch Error Details: {error_details}") # <--- THIS IS THE KEY
-            
-        finally:
-            # Reset prediction state regardless of success/failure
-            self.prediction_active = False
-            self.prediction_id = None
-            self.outcome_map = {}
+        # Status RESOLVED ends the prediction and pays out the channel points; an unknown winner is refunded.
+        # Queued behind the start call, so it resolves against the prediction id Twitch returned.
+        print(f"Resolving Twitch Prediction. Winner: {winning_racer_name} ({winning_outcome})")
+        self.predictions.resolve(winning_outcome)
+        self.prediction_active = False
 
 
     def cancel_twitch_prediction(self):
         """
         Cancels the active Twitch Prediction, refunding all Channel Points to bettors.
         """
-        if not self.prediction_active or not self.prediction_id:
+        if not self.prediction_active:
             print("No active prediction to cancel.")
             return
 
-        url = "https://api.twitch.tv/helix/predictions"
-        headers = self._get_twitch_headers()
-        
         # Status CANCELED refunds all points and ends the prediction
-        payload = {
-            "broadcaster_id": self.TWITCH_BROADCASTER_ID,
-            "id": self.prediction_id,
-            "status": "CANCELED" 
-        }
-
-        try:
-            response = self._make_twitch_api_call(requests.patch, url, payload) # <--- NEW
-            response.raise_for_status()
-            
-            print(f"Twitch Prediction CANCELED. All points have been refunded.")
-            
-        except Exception as e:
-            status_code = response.status_code if 'response' in locals() else 'N/A'
-            
-            # Check if the response exists and has an error body
-            if status_code == 400 and 'response' in locals():
-                error_details = response.text 
-                print(f"Error Canceling  Twitch Prediction (Status: 400): {e}")
-                print(f"Twitch Error Details: {error_details}") # <--- THIS IS THE KEY
-            else:
-                print(f"Error Canceling Twitch Prediction (Status: {status_code}): {e}")
-            
-        finally:
-            # Reset prediction state variables
-            self.prediction_active = False
-            self.prediction_id = None
-            self.outcome_map = {}
+        self.predictions.cancel()
+        self.prediction_active = False
         
 
     #Bot Filling
@@ -2195,26 +2108,13 @@ class RaceManager():
 
 
 
-    # OBS Stuff:
-    def connect_to_obs(self):
-        """Establishes connection to OBS and returns the client object."""
-        try:
-            ws = obsws(self.obs_url, self.obs_port, self.obs_pass)
-            ws.connect()
-            print("Successfully connected to OBS-WebSocket.")
-            return ws
-        except Exception as e:
-            print(f"Failed to connect to OBS: {e}")
-            return None
+    def play_music(self, state):
+        """Dynamic music follows the lobby on stream only; other lobbies race silently."""
+        if self.lobby.primary:
+            play_dynamic_music(state)
 
+    # OBS Stuff:
     def obs_switch_scene(self, scene_name):
-        """Sends a request to OBS to switch to a specific scene."""
-        ws = self.obs_client
-        if ws:
-            try:
-                # The 'SetCurrentProgramScene' request changes the active scene
-                ws.call(obs_requests.SetCurrentProgramScene(sceneName=scene_name))
-                print(f"OBS scene switched to: {scene_name}")
-                self.obs_cur_scene = scene_name
-            except Exception as e:
-                print(f"Error switching scene: {e}")
\ No newline at end of file
+        """Asks OBS for scene_name. Returns at once; the OBS controller thread does the switch (no-op if already there)."""
+        if self.obs_enabled:
+            self.obs.switch_scene(scene_name)
@@ -0,0 +1,128 @@
+import os, json, time
+import threading
+import helpers
+
+# In-memory settings store backed by an atomically written JSON file.
+# RaceManager used to re-read settings.json, change one key and rewrite the whole file on
+# every openEntries/closeEntries while the chat bot polled the same file, so readers could
+# catch it half written. The store is now the source of truth: changes bump a version,
+# notify subscribers, and a single writer thread persists the latest snapshot with a
+# temp file + rename, coalescing bursts of changes into one write.
+
+DEFAULT_WRITE_DELAY = 0.25 # Seconds to gather further changes before persisting
+RETRY_DELAY = 1.0 # First wait before retrying a failed write, doubled up to MAX_RETRY_DELAY
+MAX_RETRY_DELAY = 30.0
+
+
+class SettingsStore:
+    """Versioned key/value settings with change subscribers and coalesced atomic persistence."""
+
+    def __init__(self, file_path, defaults=None, write_delay=DEFAULT_WRITE_DELAY):
+        self.file_path = file_path
+        self.write_delay = write_delay
+        self.lock = threading.Lock()
+        self.settings = dict(defaults or {})
+        self.settings.update(self._load())
+        self.version = 0
+        self.persisted_version = 0
+        self.subscribers = []
+        self.dirty = threading.Event()
+        self.running = True
+        self.writer = threading.Thread(target=self._writer_loop, name="SettingsWriter", daemon=True)
+        self.writer.start()
+
+    def _load(self):
+        """Reads the persisted settings once at startup."""
+        if not os.path.exists(self.file_path):
+            return {}
+        try:
+            with open(self.file_path, 'r') as infile:
+                data = json.load(infile)
+                return data if isinstance(data, dict) else {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not read {self.file_path} ({e}). Starting with default settings.")
+            return {}
+
+    # --- Reads (never touch the disk) ---
+    def get(self, key, default=None):
+        with self.lock:
+            return self.settings.get(key, default)
+
+    def snapshot(self):
+        """Returns (version, copy of all settings)."""
+        with self.lock:
+            return self.version, dict(self.settings)
+
+    # --- Writes ---
+    def set(self, key, value):
+        """Sets one key. Returns the new version (unchanged if the value was already set)."""
+        return self.update({key: value})
+
+    def update(self, changes):
+        """Applies several keys at once, notifies subscribers and schedules a write."""
+        with self.lock:
+            changed = {k: v for k, v in changes.items() if self.settings.get(k) != v or k not in self.settings}
+            if not changed:
+                return self.version
+            self.settings.update(changed)
+            self.version += 1
+            version = self.version
+            subscribers = list(self.subscribers)
+        self.dirty.set()
+        for callback in subscribers:
+            try:
+                callback(version, changed)
+            except Exception as e:
+                print(f"Settings subscriber error: {type(e).__name__}: {e}")
+        return version
+
+    def subscribe(self, callback):
+        """callback(version, changed_dict) is called after every change."""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    # --- Persistence ---
+    def _writer_loop(self):
+        retry_delay = RETRY_DELAY
+        while self.running:
+            self.dirty.wait()
+            if not self.running:
+                break
+            time.sleep(self.write_delay) # Let a burst of changes land before writing once
+            self.dirty.clear()
+            if self._persist():
+                retry_delay = RETRY_DELAY
+                continue
+            # File locked or disk full: keep the snapshot pending and try again later
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+            self.dirty.set()
+
+    def _persist(self):
+        with self.lock:
+            if self.persisted_version == self.version:
+                return True
+            version = self.version
+            data = dict(self.settings)
+        try:
+            helpers.atomic_write_json(self.file_path, data)
+        except (OSError, TypeError, ValueError) as e: # TypeError/ValueError: a value that isn't JSON serializable
+            print(f"Warning: Could not write {self.file_path}: {type(e).__name__}: {e}")
+            return False
+        with self.lock:
+            self.persisted_version = max(self.persisted_version, version)
+        return True
+
+    def flush(self):
+        """Writes any pending changes immediately (used on shutdown)."""
+        return self._persist()
+
+    def close(self):
+        self.running = False
+        self.dirty.set()
+        self.flush()
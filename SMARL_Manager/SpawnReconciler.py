@@ -0,0 +1,131 @@
+import time
+import heapq
+import threading
+from collections import deque
+
+# Entrant spawn reconciler.
+# checkDiscrepancy used to rebuild the set of owners on the field, walk every entrant and could
+# send a blocking genCAR respawn for each missing car on every tick. When the game lagged and
+# cars dropped out of a few ticks, that turned into a respawn storm that stalled the pipeline,
+# and the pending/confirmed spawn dicts were never cleared between races.
+#
+# The reconciler keeps the desired entrant set and the last observed field set and only does
+# work when one of them changes: a car leaving the field (or a fresh spawn) schedules a check
+# after its grace period. Checks that come due with the car still missing go into a deduplicated
+# respawn queue that is drained at most one racer per min_interval, and each retry for the same
+# racer backs off exponentially until the car shows up again.
+
+GRACE_PERIOD = 5.0 # Seconds a known car may be missing before it counts as lost
+SPAWN_TIMEOUT = 5.0 # Seconds the game gets to load a newly spawned car
+MIN_RESPAWN_INTERVAL = 1.0 # Seconds between respawn commands (all racers)
+MAX_BACKOFF = 60.0 # Cap on the per racer retry delay
+
+
+class SpawnReconciler:
+    """Desired entrants vs observed cars. Joins/leaves come from request threads, observe from the race tick."""
+
+    def __init__(self, grace_period=GRACE_PERIOD, spawn_timeout=SPAWN_TIMEOUT,
+                 min_interval=MIN_RESPAWN_INTERVAL, max_backoff=MAX_BACKOFF, clock=time.monotonic):
+        self.grace_period = grace_period
+        self.spawn_timeout = spawn_timeout
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entrants = {} # user_id -> racer data (desired)
+        self.observed = frozenset() # Owner ids on the field last tick
+        self.attempts = {} # user_id -> respawns sent since the car was last seen
+        self.checks = [] # Heap of (due time, user_id)
+        self.due = {} # user_id -> due time of its live check (older heap entries are stale)
+        self.queue = deque() # user_ids waiting for a respawn
+        self.queued = set()
+        self.last_respawn = float('-inf')
+
+    def _schedule(self, user_id, due):
+        self.due[user_id] = due
+        heapq.heappush(self.checks, (due, user_id))
+
+    # --- Desired set (entry/exit) ---
+    def add(self, racer):
+        """New entrant whose spawn was just sent. Checked once the game had time to load it."""
+        user_id = str(racer.get('userid'))
+        with self.lock:
+            self.entrants[user_id] = racer
+            if user_id not in self.observed:
+                self._schedule(user_id, self.clock() + self.spawn_timeout)
+
+    def remove(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            self.entrants.pop(user_id, None)
+            self.attempts.pop(user_id, None)
+            self.due.pop(user_id, None) # Heap and queue entries are skipped lazily
+
+    def clear(self):
+        """Forgets every entrant and pending respawn (race reset / racers deleted)."""
+        with self.lock:
+            self.entrants.clear()
+            self.attempts.clear()
+            self.checks.clear()
+            self.due.clear()
+            self.queue.clear()
+            self.queued.clear()
+            self.observed = frozenset()
+
+    # --- Observed set ---
+    def observe(self, owner_ids):
+        """Feeds the owner ids on the field this tick. Only arrivals/departures do any work."""
+        observed = frozenset(owner_ids)
+        if observed == self.observed:
+            return
+        now = self.clock()
+        with self.lock:
+            for user_id in observed - self.observed: # Arrived (spawned or came back)
+                self.attempts.pop(user_id, None)
+                self.due.pop(user_id, None)
+            for user_id in self.observed - observed: # Dropped off; may just be a lagging tick
+                if user_id in self.entrants:
+                    self._schedule(user_id, now + self.grace_period)
+            self.observed = observed
+
+    # --- Respawns ---
+    def _backoff(self, attempts):
+        return min(self.spawn_timeout * (2 ** (attempts - 1)), self.max_backoff)
+
+    def due_respawns(self):
+        """
+        Returns the racers to respawn now: at most one per min_interval. Each returned racer is
+        checked again after its backoff, so a car that never appears is retried less and less often.
+        """
+        now = self.clock()
+        with self.lock:
+            return self._due_respawns_locked(now)
+
+    def _due_respawns_locked(self, now):
+        while self.checks and self.checks[0][0] <= now:
+            due, user_id = heapq.heappop(self.checks)
+            if self.due.get(user_id) != due:
+                continue # Superseded or cancelled
+            del self.due[user_id]
+            if user_id in self.entrants and user_id not in self.observed and user_id not in self.queued:
+                self.queue.append(user_id)
+                self.queued.add(user_id)
+
+        if now - self.last_respawn < self.min_interval:
+            return []
+        while self.queue:
+            user_id = self.queue.popleft()
+            self.queued.discard(user_id)
+            racer = self.entrants.get(user_id)
+            if racer is None or user_id in self.observed:
+                continue # Left the race or turned up while queued
+            attempts = self.attempts[user_id] = self.attempts.get(user_id, 0) + 1
+            self._schedule(user_id, now + self._backoff(attempts))
+            self.last_respawn = now
+            return [racer]
+        return []
+
+    def missing(self):
+        """Entrants not on the field right now (for debugging/status)."""
+        with self.lock:
+            return [user_id for user_id in self.entrants if user_id not in self.observed]
@@ -0,0 +1,256 @@
+import os, json, time, shutil
+import threading
+import numpy as np
+import helpers
+
+# Columnar telemetry archive for a race session.
+# Every raceData tick carries position/speed/fuel/tire data for each car that used to be thrown
+# away after the broadcast. The recorder appends each tick into one memory-mapped NumPy file per
+# column (one row per car per tick) plus a small per-tick index, so a session can be replayed or
+# sliced after the race without re-running the game. The reader maps the files read-only and only
+# touches the rows that are asked for. Starting a session prunes the oldest ones so the archive
+# stays bounded (MAX_SESSIONS / MAX_SESSION_AGE_DAYS).
+#
+# Layout of a session directory:
+#   meta.json        column dtypes, row/tick counts, session start time
+#   <column>.bin     raw little-endian array, one value per row
+#   tick_time.bin    seconds since session start for each tick   (per tick)
+#   tick_row.bin     first row of each tick                       (per tick)
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+TELEMETRY_PATH = os.path.join(dir_path, "JsonData/Telemetry")
+
+# Column name -> (dtype, key in the raw 'rt' racer data)
+COLUMNS = {
+    'tick': ('<u4', None), # Filled by the recorder
+    'racer': ('<i4', 'id'),
+    'locX': ('<f4', 'locX'),
+    'locY': ('<f4', 'locY'),
+    'speed': ('<f4', 'speed'),
+    'prog': ('<f4', 'prog'),
+    'dist': ('<f4', 'dist'),
+    'fl': ('<f4', 'fl'),
+    'th': ('<f4', 'th'),
+    'ps': ('<i1', 'pitState'),
+}
+TICK_COLUMNS = {'tick_time': '<f8', 'tick_row': '<u8'}
+INITIAL_ROWS = 1 << 14 # ~16k rows (1000 ticks of 16 cars) before the first resize
+META_EVERY_TICKS = 40 # How often meta.json is refreshed so readers can follow a live session
+MAX_SESSIONS = 50 # Oldest sessions beyond this are deleted when a new one starts
+MAX_SESSION_AGE_DAYS = 30 # Sessions not written to for this long are deleted when a new one starts
+
+
+class _GrowableColumn:
+    """A memory-mapped 1D array that doubles its file size when it runs out of room."""
+
+    def __init__(self, path, dtype, capacity):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.array = np.memmap(path, dtype=self.dtype, mode='w+', shape=(capacity,))
+
+    def ensure(self, size):
+        if size <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < size:
+            new_capacity *= 2
+        self.array.flush()
+        del self.array
+        with open(self.path, 'r+b') as f:
+            f.truncate(new_capacity * self.dtype.itemsize)
+        self.capacity = new_capacity
+        self.array = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(new_capacity,))
+
+    def close(self, size):
+        """Flushes and trims the file to the rows actually written."""
+        self.array.flush()
+        del self.array
+        with open(self.path, 'r+b') as f:
+            f.truncate(size * self.dtype.itemsize)
+
+
+class TelemetryRecorder:
+    """Appends raw realtime ticks into a columnar session archive. One session per race."""
+
+    def __init__(self, base_path=TELEMETRY_PATH, initial_rows=INITIAL_ROWS,
+                 max_sessions=MAX_SESSIONS, max_age_days=MAX_SESSION_AGE_DAYS):
+        self.base_path = base_path
+        self.initial_rows = initial_rows
+        self.max_sessions = max_sessions
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+        self.session_dir = None
+        self.columns = {}
+        self.tick_columns = {}
+        self.rows = 0
+        self.ticks = 0
+        self.start_time = None
+        self.enabled = True
+
+    # --- Session lifecycle ---
+    def start_session(self, session_id=None):
+        with self.lock:
+            self._close_locked()
+            session_id = session_id or time.strftime("%Y%m%d_%H%M%S")
+            self.session_dir = os.path.join(self.base_path, session_id)
+            os.makedirs(self.session_dir, exist_ok=True)
+            self.columns = {name: _GrowableColumn(os.path.join(self.session_dir, f"{name}.bin"), dtype, self.initial_rows)
+                            for name, (dtype, _) in COLUMNS.items()}
+            tick_capacity = max(64, self.initial_rows // 16)
+            self.tick_columns = {name: _GrowableColumn(os.path.join(self.session_dir, f"{name}.bin"), dtype, tick_capacity)
+                                 for name, dtype in TICK_COLUMNS.items()}
+            self.rows = 0
+            self.ticks = 0
+            self.start_time = time.time()
+            self._write_meta(final=False)
+            print(f"Telemetry: recording session {session_id}")
+            self._prune_locked()
+        return self.session_dir
+
+    def close_session(self):
+        """Trims the column files and writes the final index. Called on race reset."""
+        with self.lock:
+            self._close_locked()
+
+    def _close_locked(self):
+        if self.session_dir is None:
+            return
+        for column in self.columns.values():
+            column.close(self.rows)
+        for column in self.tick_columns.values():
+            column.close(self.ticks)
+        self._write_meta(final=True)
+        print(f"Telemetry: closed session {os.path.basename(self.session_dir)} ({self.ticks} ticks, {self.rows} rows)")
+        self.session_dir = None
+        self.columns = {}
+        self.tick_columns = {}
+
+    def _prune_locked(self):
+        """Deletes sessions beyond max_sessions and any older than max_age_days. Never the live one."""
+        current = os.path.basename(self.session_dir)
+        sessions = [name for name in list_sessions(self.base_path) if name != current]
+        keep = max(0, self.max_sessions - 1) if self.max_sessions else len(sessions)
+        cutoff = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        for index, name in enumerate(sessions):
+            path = os.path.join(self.base_path, name)
+            if index < keep and (cutoff is None or _last_written(path) >= cutoff):
+                continue
+            try:
+                shutil.rmtree(path)
+                print(f"Telemetry: pruned old session {name}")
+            except OSError as e:
+                print(f"Telemetry: could not prune session {name}: {e}")
+
+    def _write_meta(self, final):
+        helpers.atomic_write_json(os.path.join(self.session_dir, "meta.json"), {
+            'columns': {name: dtype for name, (dtype, _) in COLUMNS.items()},
+            'tick_columns': dict(TICK_COLUMNS),
+            'rows': self.rows,
+            'ticks': self.ticks,
+            'start_time': self.start_time,
+            'final': final
+        })
+
+    # --- Recording ---
+    def record(self, rt_list):
+        """Appends one tick of raw realtime racer data. Starts a session on the first non-empty tick."""
+        if not self.enabled or not rt_list:
+            return
+        if self.session_dir is None:
+            self.start_session()
+        count = len(rt_list)
+        with self.lock:
+            if self.session_dir is None:
+                return
+            start, end = self.rows, self.rows + count
+            for name, (_, key) in COLUMNS.items():
+                column = self.columns[name]
+                column.ensure(end)
+                if key is None:
+                    column.array[start:end] = self.ticks
+                else:
+                    column.array[start:end] = [_number(data.get(key)) for data in rt_list]
+            for name, value in (('tick_time', time.time() - self.start_time), ('tick_row', start)):
+                column = self.tick_columns[name]
+                column.ensure(self.ticks + 1)
+                column.array[self.ticks] = value
+            self.rows = end
+            self.ticks += 1
+            if self.ticks % META_EVERY_TICKS == 0:
+                self._write_meta(final=False)
+
+
+def _last_written(session_dir):
+    """meta.json is rewritten while recording and on close, so its mtime is the session's last activity."""
+    try:
+        return os.path.getmtime(os.path.join(session_dir, "meta.json"))
+    except OSError:
+        return 0.0
+
+
+def _number(value):
+    """Raw values can be missing, strings or booleans; anything unusable is stored as 0."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TelemetryReader:
+    """Read-only view of a recorded session. Only the requested rows are paged in from disk."""
+
+    def __init__(self, session_dir):
+        self.session_dir = session_dir
+        with open(os.path.join(session_dir, "meta.json"), 'r') as infile:
+            self.meta = json.load(infile)
+        self.rows = self.meta['rows']
+        self.ticks = self.meta['ticks']
+        self.columns = {name: self._map(name, dtype, self.rows) for name, dtype in self.meta['columns'].items()}
+        self.tick_time = self._map('tick_time', self.meta['tick_columns']['tick_time'], self.ticks)
+        self.tick_row = self._map('tick_row', self.meta['tick_columns']['tick_row'], self.ticks)
+
+    def _map(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.session_dir, f"{name}.bin"), dtype=dtype, mode='r', shape=(length,))
+
+    def _row_range(self, t_start=None, t_end=None):
+        """Row span covering every tick with t_start <= time < t_end (seconds since session start)."""
+        first_tick = 0 if t_start is None else int(np.searchsorted(self.tick_time, t_start, side='left'))
+        last_tick = self.ticks if t_end is None else int(np.searchsorted(self.tick_time, t_end, side='left'))
+        if first_tick >= last_tick:
+            return 0, 0
+        row_start = int(self.tick_row[first_tick])
+        row_end = int(self.tick_row[last_tick]) if last_tick < self.ticks else self.rows
+        return row_start, row_end
+
+    def time_range(self, t_start=None, t_end=None, columns=None):
+        """Returns {column: array} for every car between t_start and t_end. Arrays are memmap views."""
+        row_start, row_end = self._row_range(t_start, t_end)
+        names = columns or list(self.columns)
+        result = {name: self.columns[name][row_start:row_end] for name in names}
+        result['time'] = self.tick_time[self.columns['tick'][row_start:row_end]]
+        return result
+
+    def racer(self, racer_id, t_start=None, t_end=None, columns=None):
+        """Same as time_range but only the rows of one racer."""
+        row_start, row_end = self._row_range(t_start, t_end)
+        mask = self.columns['racer'][row_start:row_end] == int(racer_id)
+        names = columns or list(self.columns)
+        result = {name: np.asarray(self.columns[name][row_start:row_end][mask]) for name in names}
+        result['time'] = self.tick_time[np.asarray(self.columns['tick'][row_start:row_end][mask])]
+        return result
+
+    def racer_ids(self):
+        return np.unique(self.columns['racer']).tolist()
+
+    def duration(self):
+        return float(self.tick_time[-1]) if self.ticks else 0.0
+
+
+def list_sessions(base_path=TELEMETRY_PATH):
+    """Session directory names, newest first."""
+    if not os.path.isdir(base_path):
+        return []
+    return sorted((d for d in os.listdir(base_path) if os.path.exists(os.path.join(base_path, d, "meta.json"))), reverse=True)
@@ -0,0 +1,271 @@
+import os, json, time
+import glob
+import mmap
+import math
+import struct
+import argparse
+import threading
+import numpy as np
+import helpers
+
+# Compact binary track files (.smtk).
+# Track spines (TrackData/<id>_<name>.json, static/data) and the game's current_map.json are
+# pretty printed JSON arrays of per node dicts with full float repr: about 150 bytes per node
+# for a spine and 350 for current_map, all parsed into dicts by the map overlay and again by
+# the browser. An .smtk file stores the same nodes column wise:
+#
+#   header   '<4sHHIif4fHH' (40 bytes): magic b"SMTK", version, flags, node count, track id
+#            (-1 if unknown), lap length, min x, min y, max x, max y, name length, reserved
+#   name     utf-8, zero padded to a multiple of 4 bytes
+#   columns  node count little endian float32 each, in COLUMNS order: id, midX, midY, midZ,
+#            width, dist (cumulative distance along the spine, 0 at the first node), then
+#            raceX/raceY/raceZ, perpX/perpY and sid when the flags say they are present
+#
+# Every column starts 4 byte aligned, so TrackFile (Python) maps the file and hands out numpy
+# views without parsing, and static/src/track_binary.js wraps the fetched buffer in Float32Arrays.
+# A 1000 node scan (TrackScanner SCAN_LIMIT) is 24 KB as a spine instead of ~150 KB of JSON.
+#
+#   python TrackBinary.py "JsonData/TrackData/1_Test Oval.json"        (writes 1_Test Oval.smtk)
+#   python TrackBinary.py "JsonData/TrackData/1_Test Oval.smtk" --json (back to JSON)
+#   python TrackBinary.py --all                                        (every track JSON in the repo)
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+TRACK_DATA_PATH = os.path.join(dir_path, "JsonData/TrackData")
+STATIC_DATA_PATH = os.path.join(dir_path, "static/data")
+EXTENSION = ".smtk"
+MAGIC = b"SMTK"
+VERSION = 1
+HEADER = struct.Struct('<4sHHIif4fHH')
+
+FLAG_RACE = 1 # raceX/raceY/raceZ (current_map.json)
+FLAG_PERP = 2 # perpX/perpY
+FLAG_SECTOR = 4 # sid
+COLUMNS = (
+    ('id', 0), ('midX', 0), ('midY', 0), ('midZ', 0), ('width', 0), ('dist', 0),
+    ('raceX', FLAG_RACE), ('raceY', FLAG_RACE), ('raceZ', FLAG_RACE),
+    ('perpX', FLAG_PERP), ('perpY', FLAG_PERP),
+    ('sid', FLAG_SECTOR),
+)
+JSON_FIELDS = [name for name, _ in COLUMNS if name != 'dist'] # dist is derived, not part of the JSON nodes
+
+
+def _track_id_and_name(path):
+    """(track id, name) from '<id>_<name>.json', (-1, stem) for anything else."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    track_id, _, name = stem.partition('_')
+    if track_id.isdigit() and name:
+        return int(track_id), name
+    return -1, stem
+
+
+def _flags_for(nodes):
+    flags = 0
+    for flag, field in ((FLAG_RACE, 'raceX'), (FLAG_PERP, 'perpX'), (FLAG_SECTOR, 'sid')):
+        if all(field in node for node in nodes):
+            flags |= flag
+    return flags
+
+
+def _cumulative_distance(x, y, z):
+    """Distance from the first node along the spine, and the closed lap length."""
+    steps = np.sqrt(np.diff(x) ** 2 + np.diff(y) ** 2 + np.diff(z) ** 2)
+    dist = np.concatenate([[0.0], np.cumsum(steps)])
+    closing = math.sqrt((x[0] - x[-1]) ** 2 + (y[0] - y[-1]) ** 2 + (z[0] - z[-1]) ** 2) if len(x) else 0.0
+    return dist, float(dist[-1] + closing) if len(x) else 0.0
+
+
+# --- Encoding ---
+def encode(nodes, track_id=-1, name=""):
+    """bytes of an .smtk file for a list of node dicts (the TrackData / current_map.json layout)."""
+    count = len(nodes)
+    flags = _flags_for(nodes) if count else 0
+    columns = {}
+    for field, flag in COLUMNS:
+        if field == 'dist' or (flag and not flags & flag):
+            continue
+        default = 20.0 if field == 'width' else 0.0
+        columns[field] = np.array([node.get(field, default) for node in nodes], dtype=np.float64)
+    if count:
+        dist, length = _cumulative_distance(columns['midX'], columns['midY'], columns['midZ'])
+        bounds = (columns['midX'].min(), columns['midY'].min(), columns['midX'].max(), columns['midY'].max())
+    else:
+        dist, length, bounds = np.zeros(0), 0.0, (0.0, 0.0, 0.0, 0.0)
+    columns['dist'] = dist
+    name_bytes = name.encode('utf-8')
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, count, int(track_id), length, *bounds, len(name_bytes), 0),
+        name_bytes + b"\0" * (-len(name_bytes) % 4),
+    ]
+    for field, flag in COLUMNS:
+        if not flag or flags & flag:
+            parts.append(columns[field].astype('<f4').tobytes())
+    return b"".join(parts)
+
+
+def json_to_binary(json_path, bin_path=None, track_id=None, name=None):
+    """Converts a track JSON file, returns the .smtk path. Id and name default to '<id>_<name>.json'."""
+    with open(json_path, 'r') as infile:
+        nodes = json.load(infile)
+    file_id, file_name = _track_id_and_name(json_path)
+    bin_path = bin_path or os.path.splitext(json_path)[0] + EXTENSION
+    helpers.atomic_write_bytes(bin_path, encode(nodes, file_id if track_id is None else track_id,
+                                                file_name if name is None else name))
+    return bin_path
+
+
+def binary_to_json(bin_path, json_path=None):
+    """Writes the nodes of an .smtk file back as a JSON array, returns the JSON path."""
+    json_path = json_path or os.path.splitext(bin_path)[0] + ".json"
+    with TrackFile(bin_path) as track:
+        helpers.atomic_write_json(json_path, track.nodes(), indent=1)
+    return json_path
+
+
+# --- Loading ---
+class TrackFile:
+    """Memory mapped .smtk file. columns[field] are read only float32 views into the mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as infile:
+            self._map = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except Exception:
+            self._map.close()
+            raise
+
+    def _parse(self):
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path}: too short for an .smtk header")
+        (magic, version, self.flags, self.count, self.track_id, self.length,
+         min_x, min_y, max_x, max_y, name_length, _) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version > VERSION:
+            raise ValueError(f"{self.path}: not an .smtk file (or a newer version: {version})")
+        self.bounds = (min_x, min_y, max_x, max_y)
+        self.name = bytes(self._map[HEADER.size:HEADER.size + name_length]).decode('utf-8')
+        offset = HEADER.size + name_length + (-name_length % 4)
+        self.columns = {}
+        for field, flag in COLUMNS:
+            if flag and not self.flags & flag:
+                continue
+            self.columns[field] = np.frombuffer(self._map, dtype='<f4', count=self.count, offset=offset)
+            offset += 4 * self.count
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Column views keep the mapping exported; if a caller still holds one, it closes with the last view
+        self.columns = {}
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    @property
+    def mid(self):
+        """(n, 3) midline points (a copy)."""
+        return np.column_stack([self.columns['midX'], self.columns['midY'], self.columns['midZ']])
+
+    @property
+    def width(self):
+        return self.columns['width']
+
+    @property
+    def dist(self):
+        return self.columns['dist']
+
+    def nodes(self):
+        """The nodes as dicts in the JSON layout (ids as the float the game writes)."""
+        fields = [field for field in JSON_FIELDS if field in self.columns]
+        values = [self.columns[field].tolist() for field in fields]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+# --- Serving ---
+_served = {} # json path -> (json mtime, .smtk bytes)
+_served_lock = threading.Lock()
+
+def cached_binary(json_path):
+    """
+    .smtk bytes for a track JSON, encoded again only when the JSON changed (the game rewrites
+    current_map.json on every map export). Kept in memory, nothing is written next to the JSON.
+    None if the JSON does not exist.
+    """
+    if json_path is None or not os.path.exists(json_path):
+        return None
+    mtime = os.path.getmtime(json_path)
+    with _served_lock:
+        cached = _served.get(json_path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(json_path, 'r') as infile:
+            data = encode(json.load(infile), *_track_id_and_name(json_path))
+        _served[json_path] = (mtime, data)
+        return data
+
+
+def find_track_json(track_id, base_path=TRACK_DATA_PATH):
+    """TrackData/<id>_<name>.json for a track id (RaceLine output excluded), None if there is none."""
+    for path in sorted(glob.glob(os.path.join(base_path, f"{track_id}_*.json"))):
+        if not os.path.splitext(path)[0].endswith("_raceline"):
+            return path
+    return None
+
+
+def _track_jsons():
+    paths = []
+    for folder in (TRACK_DATA_PATH, STATIC_DATA_PATH):
+        for path in sorted(glob.glob(os.path.join(folder, "*.json"))):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            if stem == "current_map" or (_track_id_and_name(path)[0] >= 0 and not stem.endswith("_raceline")):
+                paths.append(path)
+    return paths
+
+
+def _compare(json_path, bin_path):
+    """Prints size and load time of both forms."""
+    started = time.perf_counter()
+    with open(json_path, 'r') as infile:
+        nodes = json.load(infile)
+    json_time = time.perf_counter() - started
+    started = time.perf_counter()
+    with TrackFile(bin_path) as track:
+        track.width.sum() # Touch the data, not just the header
+        bin_time = time.perf_counter() - started
+        length = track.length
+    json_size, bin_size = os.path.getsize(json_path), os.path.getsize(bin_path)
+    print(f"{os.path.basename(json_path)}: {len(nodes)} nodes, {length:.0f} m | json {json_size / 1024:.1f} KB "
+          f"load {json_time * 1000:.2f} ms | smtk {bin_size / 1024:.1f} KB ({bin_size / json_size:.0%}) "
+          f"load {bin_time * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert track JSON to the compact .smtk format and back")
+    parser.add_argument('paths', nargs='*', help="Track .json (converted to .smtk) or .smtk (with --json)")
+    parser.add_argument('--json', action='store_true', help="Convert .smtk files back to JSON")
+    parser.add_argument('--all', action='store_true', help="Convert every track JSON in TrackData and static/data")
+    parser.add_argument('--output', help="Output file (single input only)")
+    args = parser.parse_args()
+    paths = list(args.paths) + (_track_jsons() if args.all else [])
+    if not paths:
+        parser.error("give track files or --all")
+    if args.output and len(paths) > 1:
+        parser.error("--output needs a single input")
+    for path in paths:
+        if args.json:
+            print(f"{path} -> {binary_to_json(path, args.output)}")
+        else:
+            bin_path = json_to_binary(path, args.output)
+            _compare(path, bin_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import os, sys, json, time
+import argparse
+import threading
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import helpers
+
+# Offline tuning lab.
+# Setups (tire_type, fuel_level, gear_length, aero_angle per racer in tuningData.json) were
+# only ever explored in game, one live lap at a time. The lab works from laps already driven:
+#
+#   LapResultLog   RaceManager appends every completed lap (track, racer, lap time) together
+#                  with the setup the racer had in tuningData.json at that moment, as fixed size
+#                  records in JsonData/LapResults/<track_id>.bin (np.fromfile reads it back).
+#   SurrogateModel ridge regression of lap time on a quadratic expansion of the setup, with a
+#                  per racer offset and per racer linear slopes (shrunk toward the league wide
+#                  response), so different cars can want different setups.
+#   sweep()        evaluates a dense grid of setups per racer with one matrix product per chunk,
+#                  racers spread over a process pool, bounded to the setups actually observed
+#                  (the model does not extrapolate).
+#
+# Results go to JsonData/TuningLab/<track_id>/tuningData.json in the tuningData.json format
+# (the racer's current row with the recommended setup and the predicted lap times), ready to
+# be reviewed and pushed to the league API.
+#
+#   python TuningLab.py --list
+#   python TuningLab.py --track 12 --resolution 25
+#   python TuningLab.py --selfcheck      (synthetic laps with a known optimum)
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+LAP_RESULTS_PATH = os.path.join(dir_path, "JsonData/LapResults")
+LAB_OUTPUT_PATH = os.path.join(dir_path, "JsonData/TuningLab")
+TUNING_DATA_PATH = "JsonData/tuningData.json" # sharedData.SMARL_TUNING_DATA
+
+PARAMS = ('tire_type', 'fuel_level', 'gear_length', 'aero_angle')
+CONTINUOUS = PARAMS[1:] # tire_type is categorical
+LAP_DTYPE = np.dtype([('time', '<f8'), ('racer', '<i8'), ('lap', '<u2'), ('lap_ms', '<u4')] + [(name, '<f4') for name in PARAMS])
+
+MIN_LAP = 2 # Lap 1 includes the standing start
+OUTLIER_FACTOR = 1.3 # Laps slower than this times the racer's median (pits, cautions, crashes) are dropped
+MIN_RACER_LAPS = 5 # Racers with fewer clean laps only get the league wide response
+GLOBAL_PENALTY = 1e-3
+RACER_SLOPE_PENALTY = 0.02 # Larger: per racer slopes stay closer to the league wide response
+SWEEP_CHUNK = 1 << 15 # Setups evaluated per matrix product
+
+
+# --- Lap result log ---
+class LapResultLog:
+    """Appends completed laps with the racer's setup at that time. One file per track."""
+
+    def __init__(self, base_path=LAP_RESULTS_PATH, tuning_path=TUNING_DATA_PATH):
+        self.base_path = base_path
+        self.tuning_path = tuning_path
+        self.lock = threading.Lock()
+        self.tuning = {} # racer_id (str) -> setup tuple
+        self.tuning_mtime = None
+
+    def _setups(self):
+        """tuningData.json by racer id, re-read only when the file changed."""
+        try:
+            mtime = os.path.getmtime(self.tuning_path)
+        except OSError:
+            return self.tuning
+        if mtime != self.tuning_mtime:
+            try:
+                with open(self.tuning_path, 'r') as infile:
+                    rows = json.load(infile)
+                self.tuning = {str(row.get('racer_id')): tuple(float(row[name]) for name in PARAMS)
+                               for row in rows if all(_is_number(row.get(name)) for name in PARAMS)}
+                self.tuning_mtime = mtime
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                print(f"LapResultLog: could not read {self.tuning_path}: {e}")
+        return self.tuning
+
+    def record(self, track_id, laps):
+        """laps: [(league racer id, lap_num, lap_seconds)]. Laps of racers without a setup (twitch cars) are skipped."""
+        with self.lock:
+            setups = self._setups()
+            records = [(time.time(), int(racer_id), lap_num, int(round(lap_seconds * 1000))) + setups[str(racer_id)]
+                       for racer_id, lap_num, lap_seconds in laps
+                       if str(racer_id) in setups and str(racer_id).lstrip('-').isdigit() and lap_seconds and lap_seconds > 0]
+            if not records:
+                return 0
+            os.makedirs(self.base_path, exist_ok=True)
+            with open(self._path(track_id), 'ab') as outfile:
+                outfile.write(np.array(records, dtype=LAP_DTYPE).tobytes())
+            return len(records)
+
+    def _path(self, track_id):
+        return os.path.join(self.base_path, f"{track_id}.bin")
+
+    def load(self, track_id):
+        path = self._path(track_id)
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=LAP_DTYPE)
+        size = os.path.getsize(path) // LAP_DTYPE.itemsize # Ignore a record still being appended
+        return np.fromfile(path, dtype=LAP_DTYPE, count=size)
+
+    def tracks(self):
+        if not os.path.isdir(self.base_path):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.base_path) if name.endswith('.bin'))
+
+
+def _is_number(value):
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def clean_laps(laps):
+    """Drops standing starts and per racer outliers."""
+    laps = laps[(laps['lap'] >= MIN_LAP) & (laps['lap_ms'] > 0)]
+    keep = np.zeros(len(laps), dtype=bool)
+    for racer in np.unique(laps['racer']):
+        mask = laps['racer'] == racer
+        median = np.median(laps['lap_ms'][mask])
+        keep |= mask & (laps['lap_ms'] <= median * OUTLIER_FACTOR)
+    return laps[keep]
+
+
+# --- Surrogate model ---
+class SurrogateModel:
+    """
+    lap_ms ~ quadratic(setup) + racer offset + racer slopes . continuous setup.
+    Continuous parameters are scaled to [0, 1] over the observed range.
+    """
+
+    def __init__(self, laps):
+        self.tires = np.unique(laps['tire_type']).astype(np.float32)
+        self.low = np.array([laps[name].min() for name in CONTINUOUS], dtype=np.float64)
+        self.high = np.array([laps[name].max() for name in CONTINUOUS], dtype=np.float64)
+        counts = {int(racer): int(count) for racer, count in zip(*np.unique(laps['racer'], return_counts=True))}
+        self.racers = sorted(racer for racer, count in counts.items() if count >= MIN_RACER_LAPS)
+        self.racer_index = {racer: i for i, racer in enumerate(self.racers)}
+        self.samples = len(laps)
+        self.rmse_ms = None
+        self._fit(laps)
+
+    def _scaled(self, continuous):
+        span = np.where(self.high > self.low, self.high - self.low, 1.0)
+        return (continuous - self.low) / span
+
+    def _global_features(self, tire, continuous):
+        """Design matrix of the league wide response: intercept, tire one-hot, quadratic terms, tire x linear."""
+        x = self._scaled(continuous)
+        n = len(x)
+        columns = [np.ones(n)]
+        tire_onehot = [(tire == value).astype(np.float64) for value in self.tires[1:]] # First tire is the baseline
+        columns += tire_onehot
+        columns += [x[:, i] for i in range(x.shape[1])]
+        columns += [x[:, i] * x[:, j] for i in range(x.shape[1]) for j in range(i, x.shape[1])]
+        columns += [onehot * x[:, i] for onehot in tire_onehot for i in range(x.shape[1])]
+        return np.column_stack(columns)
+
+    def _racer_features(self, racer_rows, continuous):
+        """Per racer offset + slopes, placed in that racer's block of columns."""
+        x = self._scaled(continuous)
+        width = 1 + x.shape[1]
+        block = np.zeros((len(x), len(self.racers) * width))
+        valid = racer_rows >= 0
+        rows = np.nonzero(valid)[0]
+        base = racer_rows[valid] * width
+        block[rows, base] = 1.0
+        for i in range(x.shape[1]):
+            block[rows, base + 1 + i] = x[valid, i]
+        return block
+
+    def _split(self, laps):
+        tire = laps['tire_type'].astype(np.float32)
+        continuous = np.column_stack([laps[name].astype(np.float64) for name in CONTINUOUS])
+        racer_rows = np.array([self.racer_index.get(int(racer), -1) for racer in laps['racer']])
+        return tire, continuous, racer_rows
+
+    def _fit(self, laps):
+        tire, continuous, racer_rows = self._split(laps)
+        global_part = self._global_features(tire, continuous)
+        racer_part = self._racer_features(racer_rows, continuous)
+        design = np.hstack([global_part, racer_part])
+        target = laps['lap_ms'].astype(np.float64)
+        racer_penalty = np.full((len(self.racers), 1 + len(CONTINUOUS)), RACER_SLOPE_PENALTY)
+        racer_penalty[:, 0] = GLOBAL_PENALTY # Offsets (car/driver pace) are free to differ, slopes are shrunk
+        penalty = np.concatenate([np.full(global_part.shape[1], GLOBAL_PENALTY), racer_penalty.ravel()])
+        penalty[0] = 0.0 # Intercept
+        # Ridge normal equations; scaled by the sample count so the penalties don't depend on archive size
+        gram = design.T @ design / len(design) + np.diag(penalty)
+        weights = np.linalg.solve(gram, design.T @ target / len(design))
+        self.global_weights = weights[:global_part.shape[1]]
+        self.racer_weights = weights[global_part.shape[1]:].reshape(len(self.racers), -1) if self.racers else np.zeros((0, 1 + len(CONTINUOUS)))
+        self.rmse_ms = float(np.sqrt(np.mean((design @ weights - target) ** 2)))
+
+    def predict(self, racer, tire, continuous):
+        """Vectorized lap time (ms) of one racer for arrays of setups (tire: (n,), continuous: (n, 3))."""
+        prediction = self._global_features(tire, continuous) @ self.global_weights
+        index = self.racer_index.get(int(racer))
+        if index is not None:
+            weights = self.racer_weights[index]
+            prediction += weights[0] + self._scaled(continuous) @ weights[1:]
+        return prediction
+
+
+# --- Sweep ---
+def _grid(model, resolution):
+    axes = [np.linspace(low, high, resolution if high > low else 1) for low, high in zip(model.low, model.high)]
+    mesh = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, len(CONTINUOUS))
+    return mesh
+
+
+def _sweep_racer(args):
+    """Best setup for one racer. Runs in a pool worker; the model arrives pickled."""
+    model, racer, resolution = args
+    grid = _grid(model, resolution)
+    best = (None, None, np.inf)
+    for tire in model.tires:
+        for start in range(0, len(grid), SWEEP_CHUNK):
+            chunk = grid[start:start + SWEEP_CHUNK]
+            predicted = model.predict(racer, np.full(len(chunk), tire, dtype=np.float32), chunk)
+            i = int(np.argmin(predicted))
+            if predicted[i] < best[2]:
+                best = (float(tire), chunk[i].copy(), float(predicted[i]))
+    return racer, best[0], best[1].tolist(), best[2], len(grid) * len(model.tires)
+
+
+def sweep(model, racers, resolution=21, workers=None):
+    """{racer: (tire, [fuel, gear, aero], predicted_ms)} over a resolution^3 grid per tire, racers in parallel."""
+    jobs = [(model, racer, resolution) for racer in racers]
+    results = {}
+    evaluated = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for racer, tire, continuous, predicted, count in pool.map(_sweep_racer, jobs, chunksize=max(1, len(jobs) // (4 * (workers or os.cpu_count() or 1)))):
+            results[racer] = (tire, continuous, predicted)
+            evaluated += count
+    return results, evaluated
+
+
+# --- Export ---
+def recommend(track_id, log=None, tuning_path=TUNING_DATA_PATH, output_path=LAB_OUTPUT_PATH, resolution=21, workers=None):
+    """Fits the track's model, sweeps every racer with a setup and writes the recommendations. Returns the output file."""
+    log = log or LapResultLog(tuning_path=tuning_path)
+    laps = clean_laps(log.load(track_id))
+    if len(laps) < 20:
+        print(f"Track {track_id}: only {len(laps)} clean laps recorded, not enough to fit a model")
+        return None
+    started = time.perf_counter()
+    model = SurrogateModel(laps)
+    print(f"Track {track_id}: fitted on {model.samples} laps, {len(model.racers)} racers, RMSE {model.rmse_ms:.0f} ms "
+          f"({time.perf_counter() - started:.2f}s)")
+    with open(tuning_path, 'r') as infile:
+        current_rows = {str(row.get('racer_id')): row for row in json.load(infile)}
+    racers = [racer for racer in model.racers if str(racer) in current_rows] or model.racers
+    started = time.perf_counter()
+    results, evaluated = sweep(model, racers, resolution, workers)
+    elapsed = time.perf_counter() - started
+    print(f"Swept {evaluated:,} setups for {len(racers)} racers in {elapsed:.2f}s ({evaluated / max(elapsed, 1e-9):,.0f} setups/s)")
+
+    recommendations = []
+    for racer in racers:
+        tire, continuous, predicted = results[racer]
+        row = dict(current_rows.get(str(racer), {'racer_id': racer}))
+        current = [float(row[name]) for name in PARAMS] if all(_is_number(row.get(name)) for name in PARAMS) else None
+        row.update({'tire_type': int(tire), **{name: round(value, 4) for name, value in zip(CONTINUOUS, continuous)}})
+        row['predicted_lap_ms'] = int(round(predicted))
+        if current is not None:
+            row['current_predicted_lap_ms'] = int(round(model.predict(racer, np.array([current[0]], dtype=np.float32), np.array([current[1:]]))[0]))
+        recommendations.append(row)
+    recommendations.sort(key=lambda row: str(row.get('racer_id')))
+    track_dir = os.path.join(output_path, str(track_id))
+    os.makedirs(track_dir, exist_ok=True)
+    output = os.path.join(track_dir, "tuningData.json")
+    helpers.atomic_write_json(output, recommendations, indent=2)
+    print(f"Wrote {len(recommendations)} setups to {output}")
+    return output
+
+
+# --- Self check ---
+def _selfcheck(workers):
+    """Synthetic laps where every racer's best setup is known; checks the sweep finds it."""
+    rng = np.random.default_rng(7)
+    optimum = {'fuel_level': 0.4, 'gear_length': 0.65, 'aero_angle': 0.3} # Same for every racer; tire 1 is fastest
+    racers = list(range(1, 13))
+    with tempfile.TemporaryDirectory() as workdir:
+        tuning_path = os.path.join(workdir, "tuningData.json")
+        rows = [{'racer_id': racer, 'name': f"Racer {racer}", **{name: float(rng.uniform(0, 1)) for name in CONTINUOUS}, 'tire_type': int(rng.integers(1, 4))}
+                for racer in racers]
+        helpers.atomic_write_json(tuning_path, rows)
+        log = LapResultLog(base_path=os.path.join(workdir, "LapResults"), tuning_path=tuning_path)
+        for session in range(60): # Setups change between sessions, like in game trial runs
+            for row in rows:
+                for name in CONTINUOUS:
+                    row[name] = float(rng.uniform(0, 1))
+                row['tire_type'] = int(rng.integers(1, 4))
+            helpers.atomic_write_json(tuning_path, rows)
+            os.utime(tuning_path, (session, session)) # mtime must change for the log to re-read it
+            laps = []
+            for row in rows:
+                base = 80000 + 300 * row['racer_id']
+                penalty = sum(9000 * (row[name] - optimum[name]) ** 2 for name in CONTINUOUS) + 700 * (row['tire_type'] - 1)
+                for lap in range(2, 6):
+                    laps.append((row['racer_id'], lap, (base + penalty + rng.normal(0, 150)) / 1000))
+            log.record("selfcheck", laps)
+        output = recommend("selfcheck", log=log, tuning_path=tuning_path, output_path=os.path.join(workdir, "TuningLab"), resolution=21, workers=workers)
+        with open(output, 'r') as infile:
+            recommendations = json.load(infile)
+    worst = max(abs(row[name] - optimum[name]) for row in recommendations for name in CONTINUOUS)
+    tires_ok = all(row['tire_type'] == 1 for row in recommendations)
+    print(f"Self check: worst setup error {worst:.3f}, fastest tire {'found' if tires_ok else 'MISSED'}")
+    return worst < 0.1 and tires_ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit lap time models from recorded laps and sweep setups")
+    parser.add_argument('--track', action='append', help="Track id (repeatable). Default: every recorded track")
+    parser.add_argument('--list', action='store_true', help="List recorded tracks and lap counts")
+    parser.add_argument('--resolution', type=int, default=21, help="Grid points per continuous parameter")
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: all cores)")
+    parser.add_argument('--tuning', default=TUNING_DATA_PATH, help="Current tuningData.json")
+    parser.add_argument('--selfcheck', action='store_true', help="Run on synthetic laps with a known optimum")
+    args = parser.parse_args()
+
+    if args.selfcheck:
+        sys.exit(0 if _selfcheck(args.workers) else 1)
+    log = LapResultLog(tuning_path=args.tuning)
+    if args.list:
+        for track_id in log.tracks():
+            laps = log.load(track_id)
+            print(f"{track_id}: {len(laps)} laps, {len(clean_laps(laps))} clean, {len(np.unique(laps['racer']))} racers")
+        return
+    for track_id in args.track or log.tracks():
+        recommend(track_id, log=log, tuning_path=args.tuning, resolution=args.resolution, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+import os, json, time
+import datetime
+import hashlib
+import threading
+import requests
+import helpers
+
+# Diff based tuning sync between the league API and the game.
+# update_tuning_data used to download every racer's tuning from /get_racer_tuning and rewrite
+# all of tuningData.json on each call; cars only pick the file up when their engine loads, so
+# applying a change meant reloading every car of a full league (visible hitches in game).
+#
+# TuningSync keeps the last known row per racer (JsonData/tuningCache.json) and asks the API
+# only for what changed: If-None-Match with the last ETag (304 -> nothing to do) and
+# updated_since with the newest updated_at seen. Servers that ignore both still work, the rows
+# are diffed against the cache by content hash. Only racers whose tuning fields changed are
+# sent to the game, as one "tunCAR" command ({racer_id: {tuning fields}}) that DriverGen8
+# applies to just those cars. tuningData.json is still kept complete (cars loading later read
+# it), but is only rewritten when something changed.
+
+TUNING_PATH = "JsonData/tuningData.json" # Same place sharedData.SMARL_TUNING_DATA always used
+CACHE_PATH = "JsonData/tuningCache.json"
+TUNING_FIELDS = ('tire_type', 'fuel_level', 'gear_length', 'aero_angle') # What DriverGen8.sv_apply_tuning reads
+TUNING_COMMAND = "tunCAR"
+REQUEST_TIMEOUT = 10
+
+
+def _row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def _tuning_of(row):
+    return {field: row.get(field) for field in TUNING_FIELDS}
+
+
+def _timestamp(value):
+    """
+    updated_at as epoch seconds, or None if it can't be read. Accepts epoch numbers (seconds or ms)
+    and ISO 8601 / SQL datetimes ("2024-05-01T12:00:00Z", "2024-05-01 12:00:00.5+02:00").
+    Naive datetimes are taken as UTC; the server is the only source of these, so both sides agree.
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value) # Milliseconds from JS style APIs
+    text = str(value).strip()
+    try:
+        return _timestamp(float(text))
+    except ValueError:
+        pass
+    if text.endswith(('Z', 'z')):
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+class TuningSync:
+    """Per racer tuning cache with conditional fetches. sync() returns the delta it applied."""
+
+    def __init__(self, base_url, tuning_path=TUNING_PATH, cache_path=CACHE_PATH):
+        self.base_url = base_url # Callable returning the API base url (sharedData.get_smarl_url)
+        self.tuning_path = tuning_path
+        self.cache_path = cache_path
+        self.lock = threading.Lock() # One sync at a time
+        self.session = requests.Session() # Keep-alive between syncs
+        self.etag = None
+        self.updated_since = None
+        self.racers = {} # racer_id (str) -> {'row': row, 'hash': content hash}
+        self._load_cache()
+
+    # --- Cache ---
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as infile:
+                cache = json.load(infile)
+            self.etag = cache.get('etag')
+            self.updated_since = cache.get('updated_since')
+            self.racers = {racer_id: {'row': row, 'hash': _row_hash(row)} for racer_id, row in cache.get('racers', {}).items()}
+        except (OSError, json.JSONDecodeError, AttributeError) as e:
+            print(f"Tuning cache unreadable ({e}), starting with a full sync")
+            self.etag, self.updated_since, self.racers = None, None, {}
+
+    def _save_cache(self):
+        helpers.atomic_write_json(self.cache_path, {
+            'etag': self.etag,
+            'updated_since': self.updated_since,
+            'racers': {racer_id: entry['row'] for racer_id, entry in self.racers.items()}
+        })
+
+    # --- Sync ---
+    def _fetch(self, full):
+        """Returns (rows or None when unchanged, etag, partial)."""
+        headers = {}
+        params = {}
+        if not full:
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.updated_since:
+                params['updated_since'] = self.updated_since
+        response = self.session.get(self.base_url() + "/get_racer_tuning", headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304:
+            return None, self.etag, True
+        response.raise_for_status()
+        # A server that honoured updated_since only returns changed rows, so missing racers are not removals
+        partial = bool(params) and response.headers.get('X-Tuning-Partial', '1') != '0'
+        return response.json(), response.headers.get('ETag'), partial
+
+    def sync(self, full=False):
+        """
+        Pulls changed tuning rows. full=True ignores the ETag/updated_since and also drops racers
+        the league no longer returns. Returns {'changed': {racer_id: tuning}, 'removed': [ids], 'rows': n}
+        or None when the API could not be reached.
+        """
+        with self.lock:
+            started = time.perf_counter()
+            try:
+                rows, etag, partial = self._fetch(full or not self.racers)
+            except (requests.RequestException, ValueError) as e:
+                print(f"Tuning sync failed: {e}")
+                return None
+            delta = {'changed': {}, 'removed': [], 'rows': 0}
+            if rows is None:
+                print("Tuning sync: no changes (304)")
+                return delta
+            delta['rows'] = len(rows)
+            file_changed = False
+            since = _timestamp(self.updated_since)
+            seen = set()
+            for row in rows:
+                racer_id = str(row.get('racer_id'))
+                seen.add(racer_id)
+                row_hash = _row_hash(row)
+                cached = self.racers.get(racer_id)
+                if cached is not None and cached['hash'] == row_hash:
+                    continue
+                file_changed = True
+                if cached is None or _tuning_of(cached['row']) != _tuning_of(row):
+                    delta['changed'][racer_id] = _tuning_of(row)
+                self.racers[racer_id] = {'row': row, 'hash': row_hash}
+                updated_at = _timestamp(row.get('updated_at'))
+                if updated_at is not None and (since is None or updated_at > since):
+                    since = updated_at
+                    self.updated_since = str(row.get('updated_at')) # Sent back in the server's own format
+            if not partial:
+                delta['removed'] = [racer_id for racer_id in self.racers if racer_id not in seen]
+                for racer_id in delta['removed']:
+                    del self.racers[racer_id]
+                file_changed = file_changed or bool(delta['removed'])
+            self.etag = etag
+            if file_changed:
+                self._write_tuning_file()
+            self._save_cache()
+            print(f"Tuning sync: {len(rows)} rows, {len(delta['changed'])} tuning changes, "
+                  f"{len(delta['removed'])} removed in {(time.perf_counter() - started) * 1000:.0f} ms")
+            return delta
+
+    def _write_tuning_file(self):
+        rows = sorted((entry['row'] for entry in self.racers.values()), key=lambda row: str(row.get('racer_id')))
+        helpers.atomic_write_json(self.tuning_path, rows)
+
+    def command_for(self, delta):
+        """The game command applying delta, or None when no car needs new tuning."""
+        if not delta or not delta['changed']:
+            return None
+        return {"cmd": TUNING_COMMAND, "val": delta['changed']}
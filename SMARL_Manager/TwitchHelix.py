@@ -0,0 +1,260 @@
+import time
+import asyncio
+import threading
+import httpx
+import helpers
+
+# Async Twitch Helix client used for channel point predictions.
+# Predictions used to go through blocking requests calls made straight from onUpdate, autoStart
+# and onFinish, so every start/resolve added a full HTTPS round trip (plus a new TLS handshake)
+# to the race tick, and when the token expired every call site refreshed it on its own.
+#
+# The client runs its own asyncio loop on a native thread with one keep-alive httpx pool.
+# Race code submits coroutines and returns immediately. A 401 triggers a single-flight refresh:
+# the first caller refreshes while the others wait on the same lock and then reuse the new
+# token. Twitch's Ratelimit-Remaining/Ratelimit-Reset headers are tracked so requests pause
+# until the bucket resets instead of burning retries on 429s.
+#
+# helix_mock_server.py runs a local fake of the endpoints used here to exercise all of this.
+
+HELIX_URL = "https://api.twitch.tv/helix"
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+MAX_CONNECTIONS = 4 # Predictions are low volume; a few warm connections are plenty
+REQUEST_TIMEOUT = 10.0
+MAX_RETRIES = 3 # Per request, for 401 (after refresh), 429, 5xx and connection errors
+RETRY_BACKOFF = 0.5 # Seconds, doubled per attempt for 5xx/connection errors
+MAX_RATELIMIT_WAIT = 30.0 # Never sleep longer than this for a rate limit reset
+
+
+class HelixError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Helix request failed ({status}): {message}")
+        self.status = status
+        self.message = message
+
+
+class HelixClient:
+    """Pooled async Helix client. Thread-safe entry point: submit()."""
+
+    def __init__(self, client_id, client_secret, access_token, refresh_token, on_tokens=None,
+                 base_url=HELIX_URL, token_url=TOKEN_URL):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.on_tokens = on_tokens # on_tokens(access_token, refresh_token) after a refresh, to persist them
+        self.base_url = base_url.rstrip('/')
+        self.token_url = token_url
+        self.lock = threading.Lock()
+        self.loop = None
+        self.http = None
+        self.refresh_lock = None # asyncio.Lock, created on the loop
+        self.serial_locks = {} # key -> asyncio.Lock for calls that must run in order
+        self.ratelimit_remaining = None
+        self.ratelimit_reset = 0.0 # Epoch seconds
+        self.refresh_count = 0
+
+    # --- Loop lifecycle ---
+    def start(self):
+        """Starts the loop thread once. Called lazily by submit()."""
+        with self.lock:
+            if self.loop is not None:
+                return
+            ready = threading.Event()
+            loop = asyncio.new_event_loop()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.run_until_complete(self._open())
+                ready.set()
+                loop.run_forever()
+
+            helpers.start_native_thread(run)
+            ready.wait(timeout=5)
+            self.loop = loop
+
+    async def _open(self):
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS, keepalive_expiry=120)
+        self.http = httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits)
+        self.refresh_lock = asyncio.Lock()
+
+    def stop(self):
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.http.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+    def submit(self, coro, serial=None):
+        """
+        Schedules coro on the client loop and returns a concurrent.futures.Future right away.
+        Coroutines submitted with the same serial key run one after another in submit order.
+        """
+        self.start()
+        if serial is not None:
+            coro = self._serialized(serial, coro)
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def _serialized(self, key, coro):
+        lock = self.serial_locks.get(key)
+        if lock is None:
+            lock = self.serial_locks[key] = asyncio.Lock()
+        async with lock:
+            return await coro
+
+    # --- Requests ---
+    def _headers(self, token):
+        return {
+            "Client-ID": self.client_id,
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+
+    def _note_ratelimit(self, headers):
+        try:
+            self.ratelimit_remaining = int(headers['Ratelimit-Remaining'])
+            self.ratelimit_reset = float(headers['Ratelimit-Reset'])
+        except (KeyError, ValueError):
+            pass
+
+    def _ratelimit_delay(self):
+        return min(max(0.0, self.ratelimit_reset - time.time()), MAX_RATELIMIT_WAIT)
+
+    async def request(self, method, path, json=None, params=None):
+        """Helix call with token refresh and retries. Returns the decoded JSON body ({} when empty)."""
+        for attempt in range(MAX_RETRIES + 1):
+            if self.ratelimit_remaining is not None:
+                if self.ratelimit_remaining <= 0: # Bucket drained by earlier calls: wait for the reset
+                    await asyncio.sleep(self._ratelimit_delay())
+                    self.ratelimit_remaining = None
+                else:
+                    self.ratelimit_remaining -= 1 # Reserve a point so concurrent calls don't all run into 429s
+            token = self.access_token
+            last_attempt = attempt == MAX_RETRIES
+            try:
+                response = await self.http.request(method, self.base_url + path, headers=self._headers(token),
+                                                   json=json, params=params)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise HelixError(0, str(e))
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+                continue
+            self._note_ratelimit(response.headers)
+
+            if response.status_code == 401 and not last_attempt:
+                if not await self.refresh(token):
+                    raise HelixError(401, "token refresh failed")
+                continue
+            if response.status_code == 429 and not last_attempt:
+                print(f"Helix rate limited, retrying in {self._ratelimit_delay():.1f}s")
+                await asyncio.sleep(self._ratelimit_delay())
+                continue
+            if response.status_code >= 500 and not last_attempt:
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+                continue
+            if response.status_code >= 400:
+                raise HelixError(response.status_code, response.text)
+            return response.json() if response.content else {}
+
+    async def refresh(self, stale_token):
+        """
+        Single-flight token refresh. stale_token is the token that got the 401; if another caller
+        already replaced it while we waited for the lock, its new token is reused.
+        """
+        async with self.refresh_lock:
+            if self.access_token != stale_token:
+                return True
+            payload = {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "refresh_token",
+                "refresh_token": self.refresh_token
+            }
+            try:
+                response = await self.http.post(self.token_url, data=payload)
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Token refresh failed: {e}")
+                return False
+            self.access_token = data["access_token"]
+            self.refresh_token = data.get("refresh_token", self.refresh_token)
+            self.refresh_count += 1
+            print("Twitch Access Token refreshed successfully.")
+            if self.on_tokens:
+                try:
+                    self.on_tokens(self.access_token, self.refresh_token)
+                except Exception as e:
+                    print(f"Could not store refreshed Twitch tokens: {e}")
+            return True
+
+
+class Predictions:
+    """
+    Channel point prediction lifecycle on top of HelixClient. Every call returns a Future at once;
+    calls run in submit order, so a resolve queued right after a start waits for its prediction id.
+    """
+
+    SERIAL_KEY = 'predictions'
+
+    def __init__(self, helix, broadcaster_id):
+        self.helix = helix
+        self.broadcaster_id = broadcaster_id
+        self.prediction_id = None
+        self.outcome_ids = {} # outcome title -> Twitch outcome id
+
+    def start(self, title, outcome_titles, window_seconds):
+        return self.helix.submit(self._start(title, outcome_titles, window_seconds), serial=self.SERIAL_KEY)
+
+    def resolve(self, outcome_title):
+        """Pays out outcome_title. Cancels (refunds) when the title is not one of the outcomes."""
+        return self.helix.submit(self._resolve(outcome_title), serial=self.SERIAL_KEY)
+
+    def cancel(self):
+        return self.helix.submit(self._end("CANCELED"), serial=self.SERIAL_KEY)
+
+    async def _start(self, title, outcome_titles, window_seconds):
+        payload = {
+            "broadcaster_id": self.broadcaster_id,
+            "title": title,
+            "outcomes": [{"title": outcome} for outcome in outcome_titles],
+            "prediction_window": window_seconds
+        }
+        try:
+            data = await self.helix.request('POST', '/predictions', json=payload)
+        except HelixError as e:
+            print(f"Error starting Twitch Prediction: {e}")
+            return False
+        prediction = (data.get('data') or [{}])[0]
+        self.prediction_id = prediction.get('id')
+        self.outcome_ids = {outcome.get('title'): outcome.get('id') for outcome in prediction.get('outcomes', [])}
+        print(f"Twitch Prediction STARTED successfully. ID: {self.prediction_id}")
+        return self.prediction_id is not None
+
+    async def _resolve(self, outcome_title):
+        if self.prediction_id is None:
+            print("No active prediction to resolve.")
+            return False
+        outcome_id = self.outcome_ids.get(outcome_title)
+        if outcome_id is None:
+            print(f"Error: Winner outcome ({outcome_title}) was not found in prediction outcomes (Refund is necessary).")
+            return await self._end("CANCELED")
+        return await self._end("RESOLVED", winning_outcome_id=outcome_id)
+
+    async def _end(self, status, **fields):
+        if self.prediction_id is None:
+            print(f"No active prediction to end ({status}).")
+            return False
+        payload = {"broadcaster_id": self.broadcaster_id, "id": self.prediction_id, "status": status, **fields}
+        try:
+            await self.helix.request('PATCH', '/predictions', json=payload)
+            print(f"Twitch Prediction {status}.")
+            return True
+        except HelixError as e:
+            print(f"Error ending Twitch Prediction ({status}): {e}")
+            return False
+        finally:
+            # Reset prediction state regardless of success/failure
+            self.prediction_id = None
+            self.outcome_ids = {}
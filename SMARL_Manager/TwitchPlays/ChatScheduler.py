@@ -0,0 +1,179 @@
+import time
+import heapq
+import threading
+from typing import Dict, List, Any, Tuple
+
+# Outbound chat scheduler for the Twitch bot.
+# Replaces the plain Queue that send_twitch_response used to push into. Messages are
+# rate limited with a token bucket sized to Twitch's chat limits, similar messages
+# (e.g. join confirmations) are merged inside a short window, and admin responses
+# are always sent ahead of regular confirmations.
+
+# --- Twitch chat limits (messages per 30 second window) ---
+TWITCH_WINDOW_SECONDS = 30.0
+TWITCH_LIMIT_NORMAL = 20 # Bot is a regular chatter in the channel
+TWITCH_LIMIT_MODERATOR = 100 # Bot is a moderator/broadcaster in the channel
+SAFETY_MARGIN = 0.9 # Stay a little under the hard limit so we never get dropped
+
+# --- Message priorities (lower is sent first) ---
+PRIORITY_ADMIN = 0 # !open/!close/!start/!reset/!refund responses
+PRIORITY_ERROR = 1 # Denials and failures the user is waiting on
+PRIORITY_CONFIRM = 2 # Join/leave/save confirmations
+
+COALESCE_WINDOW_SECONDS = 2.0 # How long to gather similar messages before sending one merged line
+MAX_MESSAGE_LENGTH = 500 # Twitch hard limit per chat message
+MAX_NAMES_LISTED = 3 # Names shown before collapsing the rest into "and N others"
+
+
+class TokenBucket:
+    """Simple token bucket. Refills continuously at rate tokens/second up to capacity."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.last_refill = now
+
+    def try_consume(self, now: float = None) -> bool:
+        """Takes one token if available. Returns False when the bucket is empty."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def time_until_token(self, now: float = None) -> float:
+        """Seconds until the next token becomes available (0 if one is ready)."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+def bucket_for_role(is_moderator: bool) -> TokenBucket:
+    """Builds a token bucket matching the channel limits for the bot's role."""
+    limit = TWITCH_LIMIT_MODERATOR if is_moderator else TWITCH_LIMIT_NORMAL
+    capacity = max(1.0, limit * SAFETY_MARGIN)
+    return TokenBucket(capacity, capacity / TWITCH_WINDOW_SECONDS)
+
+
+def format_name_list(names: List[str]) -> str:
+    """Formats ['a','b','c','d','e'] as '@a, @b, @c and 2 others'."""
+    tagged = [f"@{name}" for name in names]
+    if len(tagged) == 1:
+        return tagged[0]
+    if len(tagged) <= MAX_NAMES_LISTED:
+        return ", ".join(tagged[:-1]) + " and " + tagged[-1]
+    shown = ", ".join(tagged[:MAX_NAMES_LISTED])
+    others = len(tagged) - MAX_NAMES_LISTED
+    return f"{shown} and {others} other{'s' if others != 1 else ''}"
+
+
+class ChatResponseScheduler:
+    """
+    Thread-safe outbound message scheduler.
+    The chat processor thread calls put()/put_grouped(), the bot's asyncio loop calls
+    pop_ready() and sleeps for next_delay() when nothing can be sent yet.
+    Still exposes put()/get_nowait() so it can stand in for the old Queue.
+    """
+
+    def __init__(self, is_moderator: bool = False, coalesce_window: float = COALESCE_WINDOW_SECONDS):
+        self.lock = threading.Lock()
+        self.bucket = bucket_for_role(is_moderator)
+        self.coalesce_window = coalesce_window
+        self.heap: List[Tuple[int, int, str]] = [] # (priority, sequence, message)
+        self.groups: Dict[str, Dict[str, Any]] = {} # coalesce_key -> pending merged message
+        self.sequence = 0
+        self.sent_count = 0
+        self.merged_count = 0 # Number of messages saved by coalescing
+
+    def set_moderator(self, is_moderator: bool):
+        """Swaps the rate limit once the bot's role in the channel is known."""
+        with self.lock:
+            self.bucket = bucket_for_role(is_moderator)
+
+    # --- Producers ---
+    def put(self, message: str, priority: int = PRIORITY_CONFIRM):
+        """Queues a single message as-is."""
+        with self.lock:
+            self._push(priority, message)
+
+    def put_grouped(self, key: str, name: str, template: str, priority: int = PRIORITY_CONFIRM):
+        """
+        Queues a message that can be merged with others sharing the same key.
+        template must contain '{names}', e.g. "{names} joined the race!".
+        """
+        now = time.monotonic()
+        with self.lock:
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = {'names': [name], 'template': template, 'priority': priority, 'first_seen': now}
+                return
+            if name not in group['names']:
+                group['names'].append(name)
+                self.merged_count += 1
+            group['priority'] = min(group['priority'], priority)
+
+    def _push(self, priority: int, message: str):
+        heapq.heappush(self.heap, (priority, self.sequence, message[:MAX_MESSAGE_LENGTH]))
+        self.sequence += 1
+
+    def _flush_groups(self, now: float, force: bool = False):
+        """Moves every group whose window has elapsed onto the send heap."""
+        for key in list(self.groups):
+            group = self.groups[key]
+            if force or (now - group['first_seen']) >= self.coalesce_window:
+                message = group['template'].format(names=format_name_list(group['names']))
+                self._push(group['priority'], message)
+                del self.groups[key]
+
+    # --- Consumer ---
+    def pop_ready(self) -> str | None:
+        """Returns the highest priority message if the rate limit allows sending now."""
+        now = time.monotonic()
+        with self.lock:
+            self._flush_groups(now)
+            if not self.heap:
+                return None
+            if not self.bucket.try_consume(now):
+                return None
+            self.sent_count += 1
+            return heapq.heappop(self.heap)[2]
+
+    def get_nowait(self) -> str:
+        """Queue compatible accessor. Raises IndexError when nothing is ready to send."""
+        message = self.pop_ready()
+        if message is None:
+            raise IndexError("No chat message ready to send")
+        return message
+
+    def next_delay(self, idle_delay: float = 0.5) -> float:
+        """How long the consumer should sleep before calling pop_ready() again."""
+        now = time.monotonic()
+        with self.lock:
+            if self.heap:
+                return max(0.05, self.bucket.time_until_token(now))
+            if self.groups:
+                oldest = min(group['first_seen'] for group in self.groups.values())
+                return max(0.05, min(idle_delay, self.coalesce_window - (now - oldest)))
+            return idle_delay
+
+    def flush(self):
+        """Forces all pending groups out (used on shutdown)."""
+        with self.lock:
+            self._flush_groups(time.monotonic(), force=True)
+
+    def pending(self) -> int:
+        with self.lock:
+            return len(self.heap) + len(self.groups)
+
+    def empty(self) -> bool:
+        return self.pending() == 0
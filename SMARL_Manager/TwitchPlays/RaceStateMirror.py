@@ -0,0 +1,103 @@
+import time
+import threading
+from typing import List, Dict, Any
+
+import socketio # python-socketio client (already a RaceManager dependency)
+
+# In-memory mirror of the RaceManager's entrant list and entry status.
+# The manager pushes an 'entrantState' snapshot over its Socket.IO server every time
+# entrants join/leave or entries open/close. The chat bot reads from this mirror instead
+# of re-parsing raceData.json and settings.json on every loop iteration.
+
+MANAGER_URL = "http://localhost:5056"
+MANAGER_NAMESPACE = "/" # Primary lobby; other lobbies are on /lobby/<id> (SMARL_Manager/Lobbies.py)
+RECONNECT_DELAY_SECONDS = 2.0 # Wait between connection attempts while the manager is down
+
+
+class RaceStateMirror:
+    """Subscribes to the manager's entrant state and keeps a thread-safe local copy."""
+
+    def __init__(self, url: str = MANAGER_URL, namespace: str = MANAGER_NAMESPACE):
+        self.url = url
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.version = -1 # -1 until the first snapshot arrives
+        self.entries_open = False
+        self.entrants: List[Dict[str, Any]] = []
+        self.connected = False
+        self.running = False
+        self.thread = None
+        self.race_event_listeners = [] # callback(event) for the manager's 'raceEvents' (overtakes, finishes, ...)
+        self.client = socketio.Client(reconnection=True, reconnection_delay=RECONNECT_DELAY_SECONDS)
+        self.client.on('connect', self._on_connect, namespace=namespace)
+        self.client.on('disconnect', self._on_disconnect, namespace=namespace)
+        self.client.on('entrantState', self._on_entrant_state, namespace=namespace)
+        self.client.on('raceEvents', self._on_race_events, namespace=namespace)
+
+    # --- Socket.IO handlers ---
+    def _on_connect(self):
+        print(f"[RaceStateMirror] Connected to RaceManager at {self.url} ({self.namespace})")
+        self.connected = True
+        with self.lock:
+            self.version = -1 # Manager may have restarted and reset its version counter
+        self.client.emit('getEntrantState', {}, namespace=self.namespace)
+
+    def _on_disconnect(self):
+        print("[RaceStateMirror] Disconnected from RaceManager. Falling back to file state until reconnect.")
+        self.connected = False
+
+    def _on_entrant_state(self, state: Dict[str, Any]):
+        if not isinstance(state, dict):
+            return
+        version = state.get('version', 0)
+        with self.lock:
+            if version < self.version:
+                return # Stale snapshot (broadcasts can arrive out of order around reconnects)
+            self.version = version
+            self.entries_open = bool(state.get('entries_open', False))
+            self.entrants = list(state.get('entrants') or [])
+
+    def _on_race_events(self, events: List[Dict[str, Any]]):
+        for event in events or []:
+            for listener in list(self.race_event_listeners):
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"[RaceStateMirror] Race event listener error: {type(e).__name__}: {e}")
+
+    def add_race_event_listener(self, callback):
+        """Registers callback(event) for race events pushed by the manager (runs on the Socket.IO thread)."""
+        if callback not in self.race_event_listeners:
+            self.race_event_listeners.append(callback)
+
+    # --- Lifecycle ---
+    def start(self):
+        """Connects in the background so the bot can start even if the manager is not up yet."""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._connect_loop, daemon=True)
+        self.thread.start()
+
+    def _connect_loop(self):
+        while self.running and not self.client.connected:
+            try:
+                self.client.connect(self.url, namespaces=[self.namespace], wait_timeout=5)
+            except Exception as e:
+                print(f"[RaceStateMirror] Could not reach RaceManager ({e}). Retrying in {RECONNECT_DELAY_SECONDS}s.")
+                time.sleep(RECONNECT_DELAY_SECONDS)
+
+    def stop(self):
+        self.running = False
+        if self.client.connected:
+            self.client.disconnect()
+
+    # --- Readers ---
+    def is_synced(self) -> bool:
+        """True when connected and at least one snapshot has been received."""
+        return self.connected and self.version >= 0
+
+    def snapshot(self) -> tuple:
+        """Returns (version, entries_open, entrants) as a consistent copy."""
+        with self.lock:
+            return self.version, self.entries_open, list(self.entrants)
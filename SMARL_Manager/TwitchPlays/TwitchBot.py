@@ -11,6 +11,7 @@ if TYPE_CHECKING:
     import sqlite3
 
 import shlex
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple
 import threading
 import asyncio
@@ -24,6 +25,8 @@ from twitchio import eventsub
 from twitchio.ext import commands
 import pytchat
 from queue import Queue # For thread-safe communication back to the bot
+from ChatScheduler import ChatResponseScheduler, PRIORITY_ADMIN, PRIORITY_ERROR, PRIORITY_CONFIRM
+from RaceStateMirror import RaceStateMirror
 from bot_secrets import my_secrets #Todo: use configmanager.py 
 
 debug = False
@@ -72,14 +75,16 @@ ALL_COLORS = [
 
 CSS4_COLORS = mcolors.CSS4_COLORS
 XKCD_COLORS = {k.split(':')[-1]: v for k, v in mcolors.XKCD_COLORS.items()}
+BODY_TYPES = frozenset(ALL_BPS) # O(1) body type lookups for parse_join_params
+HEX_COLOR_PATTERN = re.compile(r'^#[0-9a-fA-F]{6}$') # Compiled once instead of per message
+QUOTE_CHARS = ('"', "'")
 
 
 def isHexColor(color_string: str) -> bool:
     """
     Checks if a string is a 6-digit hex code (e.g., #RRGGBB) or a known color name.
     """
-    hex_pattern = r'^#[0-9a-fA-F]{6}$'
-    if re.fullmatch(hex_pattern, color_string):
+    if HEX_COLOR_PATTERN.fullmatch(color_string):
         return True
     return False
 
@@ -100,6 +105,16 @@ def getHexColor(color_string:str) -> str | None:
     # 3. No Match
     return None
 
+@lru_cache(maxsize=2048)
+def resolve_color(color_string: str) -> str | None:
+    """
+    Returns the hex code for a hex string or a named color, or None if it is neither.
+    Cached so repeat colors (most chatters use the same handful) skip validation entirely.
+    """
+    if isHexColor(color_string):
+        return color_string
+    return getHexColor(color_string)
+
 def getRandomColor(): # Gets random color from all colors
     """Gets a random color from the predefined ALL_COLORS list."""
     return random.choice(ALL_COLORS)
@@ -139,6 +154,8 @@ SETTINGS = {
     'entries_open' : False,
     'Binterval': 0.2, # Sleep interval between batches of chats
     'Cinterval': 0.2, # Sleep interval between Each Chat
+    'bot_is_moderator': False, # Whether the bot account is a mod in the channel (raises chat rate limit 20 -> 100 per 30s)
+    'command_cooldown': 3.0, # Seconds a (non moderator) user must wait between commands
 }
 
 
@@ -202,9 +219,11 @@ def validatePayment(command: str, price: int, message: Dict[str, Any]) -> bool:
             return False
     return False
 
-def checkEntered(joinedChatters: List[Dict[str, Any]], key: str, value: str) -> bool:
+def checkEntered(joinedChatters: List[Dict[str, Any]] | set, key: str, value: str) -> bool:
     if SETTINGS['debug']:
         return False
+    if isinstance(joinedChatters, (set, frozenset)): # Entrant index of ids, O(1)
+        return value in joinedChatters
     for racer in joinedChatters:
         if racer.get(key,False) == value:
             return True
@@ -277,6 +296,9 @@ def smart_split(command_line: str) -> List[str]:
     Splits a command line string into a list of arguments, respecting quotes.
     e.g., 'join "vomit green" #FF0000' -> ['join', 'vomit green', '#FF0000']
     """
+    if not any(q in command_line for q in QUOTE_CHARS):
+        # Fast path: nothing quoted, a plain whitespace split gives the same result as shlex
+        return command_line.split()
     try:
         # shlex.split is the most reliable way to handle quoted parameters
         return shlex.split(command_line)
@@ -299,21 +321,15 @@ def parse_join_params(params: List[str]) -> Tuple[str, str, str, str]:
         
         # 1. Check for Body Type
         if param_lower.startswith("type"):
-            if param_lower in ALL_BPS:
+            if param_lower in BODY_TYPES:
                 body_type = param_lower
             else:
                 # If invalid type, it falls back to the default "typea"
                 pass 
                 
-        # 2. Check for Color
+        # 2. Check for Color (hex or named, cached)
         else:
-            hex_color = None
-            # Check if it's a valid hex color
-            if isHexColor(param):
-                hex_color = param
-            # Check if it's a valid named color
-            else:
-                hex_color = getHexColor(param) 
+            hex_color = resolve_color(param)
             if hex_color:
                 if body_type == "saved":
                     body_type = "typea" # TODO: select a random choice from ALL_BPs # This might nott be necessary since this is done in RaceManager Server Side
@@ -347,29 +363,91 @@ def parse_join_params(params: List[str]) -> Tuple[str, str, str, str]:
 MAX_LOAD_RETRIES = 5
 RETRY_DELAY_SECONDS = 0.05
 class ChatCommandProcessor:
-    def __init__(self, settings: Dict[str, Any], test_mode: bool = False,response_queue: Queue = None):
+    def __init__(self, settings: Dict[str, Any], test_mode: bool = False,response_queue: Queue = None, state_mirror: RaceStateMirror = None):
         # Initial State (will be dynamically updated in readChat/process_message)
         self.SETTINGS = settings
         self.is_test_mode = test_mode
+        self.state_mirror = state_mirror # Live entrant state pushed by RaceManager (None = file polling only)
+        self.mirror_version = -1 # Last mirror snapshot applied
         self.cID = 0
         self.joinedChatters: List[Dict[str, Any]] = [] # list of userIDs of chatters currently spawned
+        self.entrant_ids: set = set() # Index of joinedChatters uids for O(1) entered checks
         self.simSettings: Dict[str, Any] = {} # settings loaded from sim_settings.json
         self.response_queue = response_queue
+        self.prefixes = frozenset(self.SETTINGS.get('prefixes', ['!'])) # Single character command prefixes
+        self.last_command_time: Dict[str, float] = {} # userid -> time of last accepted command
+        # Dispatch table: command type -> handler
+        self.command_handlers = {
+            'join': self.send_join_request,
+            'save': self.send_save_request,
+            'leave': self.send_leave_request,
+            'open': self.send_open_request,
+            'close': self.send_close_request,
+            'start': self.send_start_request,
+            'reset': self.send_reset_request,
+            'resetlaps': self.send_reset_laps_request,
+            'resetseason': self.send_reset_season_request,
+            'refund': self.send_refund_request,
+        }
         self.reset_state()
         
     def reset_state(self):
         """Resets the transient state for a new test run or loop iteration."""
         self.cID = 0
-        self.joinedChatters = []
+        self._set_joined_chatters([])
+        self.last_command_time = {}
         # Load initial settings from file or use default for tests
         if not self.is_test_mode:
             self._load_current_state()
         else:
             self.simSettings = {"entries_open": self.SETTINGS.get('entries_open', True)}
 
+    def _set_joined_chatters(self, chatters: List[Dict[str, Any]]):
+        """Replaces joinedChatters and rebuilds the uid index used by validateCommand."""
+        self.joinedChatters = chatters
+        self.entrant_ids = {racer.get('uid') for racer in chatters if racer.get('uid') is not None}
+
+    def _check_cooldown(self, userid: str, is_moderator: bool, now: float) -> bool:
+        """Returns True if the user may run a command now. Moderators are never throttled."""
+        if is_moderator:
+            return True
+        cooldown = self.SETTINGS.get('command_cooldown', 0)
+        last = self.last_command_time.get(userid)
+        if last is not None and (now - last) < cooldown:
+            return False
+        self.last_command_time[userid] = now
+        if len(self.last_command_time) > 1000: # Evict users whose cooldown expired long ago
+            self.last_command_time = {uid: t for uid, t in self.last_command_time.items() if now - t < cooldown}
+        return True
+
+
+    def _apply_entry_status(self, sim_entries_open: bool):
+        """Syncs the local entries_open flag with the manager's."""
+        self.simSettings['entries_open'] = sim_entries_open
+        if sim_entries_open != self.SETTINGS['entries_open']:
+            print(f"[{'Opening' if sim_entries_open else 'Closing'} Entries]")
+            self.SETTINGS['entries_open'] = sim_entries_open
+            change_entry_status(sim_entries_open)
+
+    def _load_mirror_state(self) -> bool:
+        """
+        Applies the in-memory entrant snapshot from the RaceManager if we are subscribed.
+        Returns False when the mirror is unavailable so the caller can fall back to the files.
+        """
+        if self.state_mirror is None or not self.state_mirror.is_synced():
+            return False
+        version, entries_open, entrants = self.state_mirror.snapshot()
+        if version != self.mirror_version: # Only rebuild the index when something changed
+            self.mirror_version = version
+            self._set_joined_chatters(entrants)
+            self._apply_entry_status(entries_open)
+        return True
 
     def _load_current_state(self):
-        """Loads joinedChatters and simSettings from JSON files (used in production loop)."""
+        """Loads joinedChatters and simSettings from the manager mirror, or the JSON files as a fallback."""
+        if self._load_mirror_state():
+            return
+        self.mirror_version = -1 # Force a full re-apply once the mirror comes back
         # --- Load realtime_path (joinedChatters and main state) ---
         # Initialize data to a default empty dict
         data = {} 
@@ -381,13 +459,13 @@ class ChatCommandProcessor:
                 # 2. Check for empty content
                 if not raw_content.strip():
                     # If empty, use default data and exit the retry loop
-                    self.joinedChatters = []
+                    self._set_joined_chatters([])
                     data = {} 
                     break 
                 # 3. Attempt to decode the JSON
                 data = json.loads(raw_content) 
                 # If decoding is successful, exit the retry loop
-                self.joinedChatters = data.get('rt', []) or []
+                self._set_joined_chatters(data.get('rt', []) or [])
                 break 
             except json.JSONDecodeError as e:
                 # This is the expected error when the file is partially written
@@ -399,12 +477,12 @@ class ChatCommandProcessor:
                     # After all retries fail, log the error and use defaults
                     print(f"FATAL JSON ERROR: Failed to parse {realtime_path} after {MAX_LOAD_RETRIES} attempts.")
                     print(f"Error: {e}. Raw content preview: {raw_content[:100]}...")
-                    self.joinedChatters = []
+                    self._set_joined_chatters([])
                     data = {} # Ensure data is reset before moving on
                     # We will NOT raise the error here, as that would crash the thread.
             except FileNotFoundError:
                 print(f"Warning: File not found {realtime_path}. Using empty list.")
-                self.joinedChatters = []
+                self._set_joined_chatters([])
                 data = {}
                 break # Exit loop if file doesn't exist
         # --- Load sim_settings (simSettings) ---
@@ -413,22 +491,32 @@ class ChatCommandProcessor:
         try:
             with open(sim_settings, 'r') as sinFile: 
                 self.simSettings = json.load(sinFile)
-                sim_entries_open = self.simSettings.get('entries_open', True)
-
-                if sim_entries_open != self.SETTINGS['entries_open']:
-                    print(f"[{'Opening' if sim_entries_open else 'Closing'} Entries]")
-                    self.SETTINGS['entries_open'] = sim_entries_open
-                    change_entry_status(sim_entries_open)
+                self._apply_entry_status(self.simSettings.get('entries_open', True))
 
         except (FileNotFoundError, json.JSONDecodeError):
             print(f"Warning: Could not read {sim_settings}. Using last settings.")
             #self.simSettings = {}
 
 
-    def send_twitch_response(self, message: str):
+    def send_twitch_response(self, message: str, priority: int = PRIORITY_CONFIRM):
         """Puts a message into the outgoing queue if Twitch is active."""
         if self.SETTINGS['STREAM_PLATFORM'].lower() == 'twitch' and self.response_queue:
-            self.response_queue.put(message)
+            if isinstance(self.response_queue, ChatResponseScheduler):
+                self.response_queue.put(message, priority)
+            else:
+                self.response_queue.put(message)
+
+    def send_grouped_response(self, key: str, username: str, template: str, priority: int = PRIORITY_CONFIRM):
+        """
+        Queues a confirmation that can be merged with similar ones (e.g. several joins in a burst
+        become "@a, @b and 5 others joined"). template must contain '{names}'.
+        """
+        if self.SETTINGS['STREAM_PLATFORM'].lower() != 'twitch' or not self.response_queue:
+            return
+        if isinstance(self.response_queue, ChatResponseScheduler):
+            self.response_queue.put_grouped(key, username, template, priority)
+        else:
+            self.response_queue.put(template.format(names=f"@{username}"))
 
     # --- API Request Methods (Remain largely the same, but now methods) ---
     def send_join_request(self, command: Dict[str, Any]) -> bool:
@@ -455,12 +543,11 @@ class ChatCommandProcessor:
             response = requests.post(url, json=payload, timeout=3)
             if response.status_code == 200:
                 # This is a simplification for testing; in production, this is usually loaded from file.
-                self.send_twitch_response(
-                    f"@{command['username']}, you have successfully joined the race!"
-                )
+                self.send_grouped_response('join', command['username'], "{names} joined the race!")
                 if self.is_test_mode:
                      # Add a mock entry to mimic the file-read logic Can still run/test even if not, just will try to ping SM)
                      self.joinedChatters.append({'uid': command['userid'], 'username': command['username']}) 
+                     self.entrant_ids.add(command['userid'])
                      
                 print(f" Join SUCCESS for {command['username']}.")
                 return True
@@ -471,7 +558,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     reason = data.get('message', 'Entries closed by server.')
                     self.send_twitch_response(
-                        f"@{command['username']}, your join request was denied: {reason}"
+                        f"@{command['username']}, your join request was denied: {reason}",
+                        PRIORITY_ERROR
                     )
                     print(f" Join DENIED for {command['username']}. Reason: {reason}")
                 except json.JSONDecodeError:
@@ -510,9 +598,7 @@ class ChatCommandProcessor:
             response = requests.post(url, json=payload, timeout=3)
             
             if response.status_code == 200:
-                self.send_twitch_response(
-                    f"@{command['username']}, your car settings have been saved!"
-                )
+                self.send_grouped_response('save', command['username'], "Car settings saved for {names}!")
                 print(f"Save SUCCESS for {command['username']}.")
                 return True
             else:
@@ -521,7 +607,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, failed to save: {error_msg}"
+                        f"@{command['username']}, failed to save: {error_msg}",
+                        PRIORITY_ERROR
                     )
                     print(f"Save FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -546,16 +633,14 @@ class ChatCommandProcessor:
             response = requests.post(url, json=payload, timeout=3)
             
             if response.status_code == 200:
-                self.send_twitch_response(
-                    f"@{command['username']}, you have successfully left the race."
-                )
+                self.send_grouped_response('leave', command['username'], "{names} left the race.")
                 print(f" Leave SUCCESS for {command['username']}.")
                 
                 if self.is_test_mode or True: # Force update for simplicity
-                    self.joinedChatters = [
+                    self._set_joined_chatters([
                         racer for racer in self.joinedChatters 
                         if racer['uid'] != command['userid']
-                    ]
+                    ])
                 return True
             else:
                 # Handle errors (400, 500)
@@ -563,7 +648,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to leave: {error_msg}"
+                        f"@{command['username']}, unable to leave: {error_msg}",
+                        PRIORITY_ERROR
                     )
                     print(f" Leave FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -589,7 +675,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Opening Race Entries."
+                    f"@{command['username']}, Opening Race Entries.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin Opened Race {command['username']}.")
                 
@@ -599,7 +686,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to Open: {error_msg}"
+                        f"@{command['username']}, unable to Open: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Open FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -624,7 +712,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Closing Race Entries."
+                    f"@{command['username']}, Closing Race Entries.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin Closed Race {command['username']}.")
                 
@@ -634,7 +723,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to Close: {error_msg}"
+                        f"@{command['username']}, unable to Close: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Close FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -654,7 +744,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Startin Race!"
+                    f"@{command['username']}, Startin Race!",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin Started Race {command['username']}.")
                 
@@ -664,7 +755,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to Start: {error_msg}"
+                        f"@{command['username']}, unable to Start: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Start FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -689,7 +781,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Resetting Race."
+                    f"@{command['username']}, Resetting Race.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin reset Race {command['username']}.")
                 
@@ -699,7 +792,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to reset: {error_msg}"
+                        f"@{command['username']}, unable to reset: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Reset FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -724,7 +818,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Resetting Best Lap times."
+                    f"@{command['username']}, Resetting Best Lap times.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin reset best laps {command['username']}.")
                 
@@ -734,7 +829,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to reset laps: {error_msg}"
+                        f"@{command['username']}, unable to reset laps: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Reset Laps FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -759,7 +855,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Resetting Twitch Season."
+                    f"@{command['username']}, Resetting Twitch Season.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin reset twitch season {command['username']}.")
                 
@@ -769,7 +866,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to reset season: {error_msg}"
+                        f"@{command['username']}, unable to reset season: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Reset Season FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -789,7 +887,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Refund Twitch Prediction."
+                    f"@{command['username']}, Refund Twitch Prediction.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin Refund Twitch Prediction {command['username']}.")
                 
@@ -799,7 +898,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to Refund: {error_msg}"
+                        f"@{command['username']}, unable to Refund: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Refund FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -824,7 +924,8 @@ class ChatCommandProcessor:
             
             if response.status_code == 200:
                 self.send_twitch_response(
-                    f"@{command['username']}, Refund Twitch Prediction."
+                    f"@{command['username']}, Refund Twitch Prediction.",
+                    PRIORITY_ADMIN
                 )
                 print(f" Admin Refund Twitch Prediction {command['username']}.")
                 
@@ -834,7 +935,8 @@ class ChatCommandProcessor:
                     data = response.json()
                     error_msg = data.get('message', response.text)
                     self.send_twitch_response(
-                        f"@{command['username']}, unable to Refund: {error_msg}"
+                        f"@{command['username']}, unable to Refund: {error_msg}",
+                        PRIORITY_ADMIN
                     )
                     print(f" Refund FAILED for {command['username']} (Status {response.status_code}). Message: {error_msg}")
                 except json.JSONDecodeError:
@@ -848,27 +950,10 @@ class ChatCommandProcessor:
 
     # --- Command Handling (Now methods of the class) ---
     def handleCommand(self, command: Dict[str, Any]):
-        """Delegates the command based on type."""
-        if command['type'] == "join":
-            self.send_join_request(command)
-        elif command['type'] == "save":
-            self.send_save_request(command)
-        elif command['type'] == "leave":
-            self.send_leave_request(command)
-        elif command['type'] == "open":
-            self.send_open_request(command)
-        elif command['type'] == "close":
-            self.send_close_request(command)
-        elif command['type'] == "start":
-            self.send_start_request(command)
-        elif command['type'] == "reset":
-            self.send_reset_request(command)
-        elif command['type'] == "resetlaps":
-            self.send_reset_laps_request(command)
-        elif command['type'] == "resetseason":
-            self.send_reset_season_request(command)
-        elif command['type'] == "refund":
-            self.send_refund_request(command)
+        """Delegates the command based on type (dispatch table lookup)."""
+        handler = self.command_handlers.get(command['type'])
+        if handler is not None:
+            handler(command)
 
     def generateCommand(self, command: str, parameters: List[str], cmdData: Dict[str, Any]) -> Dict[str, Any]:
         """Generates the command dictionary (same as original function)."""
@@ -880,8 +965,14 @@ class ChatCommandProcessor:
         Parses an incoming chat message for a command and its parameters.
         This is the new *target function* for injection.
         """
+        # 0. Fast path: reject non-command chat on its first character before any other work
+        raw_message = chat_item.get('message') or ''
+        stripped = raw_message.lstrip()
+        if not stripped or stripped[0] not in self.prefixes:
+            return None
+
         # 1. Initial Parsing and Cleanup 
-        message_text = chat_item['message'].lower().strip() # Adapt from pytchat to dict
+        message_text = stripped.lower().rstrip() # Adapt from pytchat to dict
         author_data = chat_item.get('author',{}) # User/channel specific data such as userid and status
         # Create the initial message dictionary (Adapted for generic dict input)
         parsed = {
@@ -895,14 +986,8 @@ class ChatCommandProcessor:
             'timestamp': chat_item.get('timestamp', time.time())
         }
 
-        # 2. Command Check (same as original)
-        allowed_prefixes = self.SETTINGS.get('prefixes', ['!']) 
-        is_command = any(message_text.startswith(p) for p in allowed_prefixes)
-        if not message_text or not is_command:
-            return None 
-
-        used_prefix = next(p for p in allowed_prefixes if message_text.startswith(p))
-        raw_command_text = message_text.lstrip(used_prefix).strip()
+        # 2. Command Check (prefix already verified by the fast path)
+        raw_command_text = message_text[1:].strip()
         if not raw_command_text:
             return None
 
@@ -913,9 +998,15 @@ class ChatCommandProcessor:
             
         command_name = split_tokens[0]
         params_list = split_tokens[1:]
+        if command_name not in self.command_handlers:
+            return None # Unknown command, skip validation entirely
+
+        # 3.5 Per-user cooldown (stops command spam from one chatter flooding the API)
+        if not self._check_cooldown(parsed['userid'], parsed['moderator'], time.time()):
+            return None
 
-        # 4. Command Validation (using instance attributes)
-        comType, price = validateCommand(command_name, params_list, parsed, self.joinedChatters)
+        # 4. Command Validation (using instance attributes, entered check uses the uid index)
+        comType, price = validateCommand(command_name, params_list, parsed, self.entrant_ids)
         
         if comType is False:
             print(f"Received Error for '{raw_command_text}': {price}") 
@@ -1157,14 +1248,18 @@ class TwitchReaderBot(commands.AutoBot):
             return
 
         while self.is_running:
+            # The scheduler only hands out a message when the chat rate limit allows it
+            message = self.response_queue.pop_ready()
+            if message is None:
+                # Nothing ready (empty, still coalescing, or rate limited), sleep until it might be
+                await asyncio.sleep(self.response_queue.next_delay())
+                continue
             try:
-                # Use get_nowait() to check the queue without blocking the loop
-                message = self.response_queue.get_nowait()
                 # Use the channel object to send the message
                 await channel.send(message)
                 print(f"Twitch Response Sent: {message}")
-            except Exception:
-                # Queue is empty, just wait a moment before checking again
+            except Exception as e:
+                print(f"Failed to send Twitch response: {e}")
                 await asyncio.sleep(0.5)
 
     async def event_message(self, payload):
@@ -1329,7 +1424,7 @@ class TwitchChatWrapper:
     """Wraps the asynchronous Twitch bot to look like a synchronous pytchat reader."""
     def __init__(self, channel_name: str,):
         self.message_queue = deque() # Incoming chat messages
-        self.response_queue = Queue() # New: Outgoing responses for the bot
+        self.response_queue = ChatResponseScheduler(is_moderator=SETTINGS.get('bot_is_moderator', False)) # Outgoing responses for the bot (rate limited + coalesced)
         self.loop = asyncio.new_event_loop()
         self.token_database = sqlite.connect("tokens.db")
         tokens, subs = setup_database(self.token_database)
@@ -1465,7 +1560,9 @@ if __name__ == '__main__':
 
     # 4.5. Initialize the ChatCommandProcessor
     # Pass SETTINGS and potentially set debug=False for production
-    processor = ChatCommandProcessor(SETTINGS, test_mode=False, response_queue=response_queue)
+    state_mirror = RaceStateMirror() # Subscribes to RaceManager entrant/entry updates over Socket.IO
+    state_mirror.start()
+    processor = ChatCommandProcessor(SETTINGS, test_mode=False, response_queue=response_queue, state_mirror=state_mirror)
 
     # 5. Main Loop
     print("Stream Reader initialized")
@@ -0,0 +1,160 @@
+import json, time
+import threading
+
+# Compact wire format for the high rate Socket.IO emits (raceData).
+# The JSON payload is a dict of lists of per-racer dicts, so every tick repeats long keys like
+# 'primary_color'/'gapToLeader' once per racer per client. Browser sources that load
+# smarl_utils.js ask for the 'soa' codec on connect and then receive each list as a
+# struct-of-arrays keyed by short field ids (one column per field). Clients that never ask
+# (old templates, the chat bot) stay on plain JSON. Each payload is only encoded when at least
+# one client of that codec is connected.
+#
+# Field ids must match SMARL_FIELD_NAMES in static/src/smarl_utils.js.
+
+CODEC_JSON = 'json'
+CODEC_SOA = 'soa'
+CODECS = (CODEC_JSON, CODEC_SOA)
+SOA_VERSION = 1
+
+# Long key -> short id. Unknown keys are sent with their full name so new fields never break clients.
+FIELD_IDS = {
+    'id': 'i', 'owner': 'o', 'name': 'n', 'tag': 't', 'uid': 'u', 'racer_id': 'r',
+    'primary_color': 'c1', 'secondary_color': 'c2', 'tertiary_color': 'c3',
+    'pos': 'p', 'lapNum': 'l', 'lastLap': 'll', 'bestLap': 'bl',
+    'lastLapMs': 'lm', 'bestLapMs': 'bm',
+    'gapToLeader': 'gl', 'gapToNext': 'gn', 'locX': 'x', 'locY': 'y', 'speed': 's',
+    'prog': 'pr', 'dist': 'd', 'isFocused': 'f', 'st': 'st', 'fl': 'fl', 'th': 'th',
+    'ps': 'ps', 'finished': 'fi', 'split': 'sp', 'finishTime': 'ft',
+}
+SECTION_IDS = {
+    'meta_data': 'md', 'qualifying_data': 'qd', 'finish_data': 'fd', 'realtime_data': 'rt',
+}
+FIELD_NAMES = {v: k for k, v in FIELD_IDS.items()}
+SECTION_NAMES = {v: k for k, v in SECTION_IDS.items()}
+
+
+def room_for(codec):
+    return f"codec_{codec}"
+
+
+def encode_rows(rows):
+    """[{key: value}, ...] -> {'n': count, 'c': {field_id: [values...]}}"""
+    columns = {}
+    for index, row in enumerate(rows):
+        for key, value in row.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * len(rows) # Fields missing from some rows stay None
+            column[index] = value
+    return {'n': len(rows), 'c': {FIELD_IDS.get(key, key): values for key, values in columns.items()}}
+
+
+def decode_rows(packed):
+    count = packed['n']
+    rows = [{} for _ in range(count)]
+    for field_id, values in packed['c'].items():
+        key = FIELD_NAMES.get(field_id, field_id)
+        for row, value in zip(rows, values):
+            row[key] = value
+    return rows
+
+
+def encode_soa(payload):
+    """Encodes a raceData dict. Lists of dicts become columns, everything else is passed through."""
+    if not isinstance(payload, dict):
+        return payload
+    packed = {}
+    for key, value in payload.items():
+        section_id = SECTION_IDS.get(key, key)
+        if isinstance(value, list) and all(isinstance(row, dict) for row in value):
+            packed[section_id] = encode_rows(value)
+        else:
+            packed[section_id] = value
+    return {'_soa': SOA_VERSION, 'd': packed}
+
+
+def decode_soa(packed):
+    """Inverse of encode_soa (the browser does the same in smarl_utils.js)."""
+    if not isinstance(packed, dict) or '_soa' not in packed:
+        return packed
+    payload = {}
+    for section_id, value in packed['d'].items():
+        key = SECTION_NAMES.get(section_id, section_id)
+        payload[key] = decode_rows(value) if isinstance(value, dict) and 'c' in value and 'n' in value else value
+    return payload
+
+
+class CodecRegistry:
+    """Tracks which codec each connected Socket.IO client negotiated."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients = {} # sid -> codec
+        self.counts = {codec: 0 for codec in CODECS}
+
+    def set(self, sid, codec):
+        """Records the client's codec. Returns the previous codec (None for a new client)."""
+        if codec not in CODECS:
+            codec = CODEC_JSON
+        with self.lock:
+            previous = self.clients.get(sid)
+            if previous is not None:
+                self.counts[previous] -= 1
+            self.clients[sid] = codec
+            self.counts[codec] += 1
+            return previous
+
+    def remove(self, sid):
+        with self.lock:
+            codec = self.clients.pop(sid, None)
+            if codec is not None:
+                self.counts[codec] -= 1
+
+    def total(self):
+        with self.lock:
+            return len(self.clients)
+
+    def active_codecs(self):
+        with self.lock:
+            return [codec for codec in CODECS if self.counts[codec] > 0]
+
+
+CLIENTS = CodecRegistry()
+
+
+def emit_encoded(sio, event, payload, registry=CLIENTS):
+    """Emits payload once per codec room, encoding only for codecs that have connected clients."""
+    for codec in registry.active_codecs():
+        data = encode_soa(payload) if codec == CODEC_SOA else payload
+        sio.emit(event, data, to=room_for(codec))
+
+
+def measure(payload, iterations=200):
+    """Bytes and encode time per tick for JSON vs struct-of-arrays (both serialized as JSON text)."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        json_bytes = len(json.dumps(payload, separators=(',', ':')).encode())
+    json_time = (time.perf_counter() - start) / iterations
+    start = time.perf_counter()
+    for _ in range(iterations):
+        soa_bytes = len(json.dumps(encode_soa(payload), separators=(',', ':')).encode())
+    soa_time = (time.perf_counter() - start) / iterations
+    return {'json_bytes': json_bytes, 'soa_bytes': soa_bytes, 'json_ms': json_time * 1000, 'soa_ms': soa_time * 1000}
+
+
+if __name__ == '__main__': # python WireCodec.py -> size/CPU comparison on a synthetic full grid
+    racers = [{
+        'id': float(i), 'owner': f"user{i}", 'name': f"Racer Number {i}", 'tag': f"RN{i:02d}", 'uid': str(i), 'racer_id': str(i),
+        'primary_color': '#2926eb', 'secondary_color': '#FFFFFF', 'tertiary_color': '#222222',
+        'pos': i + 1, 'lapNum': 4, 'lastLap': '01:02.345', 'bestLap': '01:01.987',
+        'gapToLeader': 1.234 * i, 'gapToNext': 0.412, 'locX': 12.5 * i, 'locY': -40.25, 'speed': 31.4,
+        'prog': 0.53, 'dist': 1520.7, 'isFocused': i == 0, 'st': [20.1, 21.3, 20.9], 'fl': 0.82, 'th': 0.91,
+        'ps': 0, 'finished': False
+    } for i in range(16)]
+    sample = {'meta_data': {'id': 1, 'status': 'Green Flag', 'lapsLeft': 6, 'qualifying': False},
+              'qualifying_data': [], 'finish_data': [], 'realtime_data': racers}
+    assert decode_soa(encode_soa(sample)) == sample
+    result = measure(sample)
+    print(f"JSON: {result['json_bytes']} bytes, {result['json_ms']:.3f} ms/tick")
+    print(f"SOA:  {result['soa_bytes']} bytes, {result['soa_ms']:.3f} ms/tick "
+          f"({100 * (1 - result['soa_bytes'] / result['json_bytes']):.0f}% smaller)")
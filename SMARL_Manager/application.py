@@ -1,15 +1,56 @@
-import os, math
-import requests
-from flask import Flask, render_template, jsonify, url_for, request, g
+import os, sys, time
+STARTUP_STARTED = time.perf_counter() # Launch time for the startup timings printed by main()
+# --- Server mode ---
+# dev (default): Werkzeug threaded server, debug on (same as before).
+# production (SMARL_SERVER_MODE=production or --production): eventlet (falls back to gevent) with
+# debug off. Monkey patching must happen before anything else imports socket/threading/time, so
+# this block stays at the very top of the file.
+# Concurrency limits (production):
+#   - Overlay sockets are capped at MAX_SOCKET_CLIENTS (default 200, env SMARL_MAX_CLIENTS).
+#     Each raceData tick is encoded once per codec and then written to every socket, so the
+#     per tick cost grows linearly with connected overlays.
+#   - Blocking handlers (addToQueue handshakes, requests calls, file retries) only sleep/do IO,
+#     which is cooperative once patched. Native blocking calls (mp3 decode) go through
+#     helpers.run_blocking, which uses the hub's OS thread pool.
+#   - raceData.json is watched with watchdog's polling observer (50 ms) instead of the native
+#     OS observer, whose blocking reads would stall the event loop.
+SERVER_MODE = 'production' if '--production' in sys.argv else os.environ.get('SMARL_SERVER_MODE', 'dev').lower()
+ASYNC_MODE = 'threading'
+if SERVER_MODE == 'production':
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+        ASYNC_MODE = 'eventlet'
+    except ImportError:
+        try:
+            from gevent import monkey
+            monkey.patch_all()
+            ASYNC_MODE = 'gevent'
+        except ImportError:
+            print("Production mode requested but neither eventlet nor gevent is installed. Using threading.")
+MAX_SOCKET_CLIENTS = int(os.environ.get('SMARL_MAX_CLIENTS', 200))
+# Horizontal fan-out (SMARL_FANOUT=local://127.0.0.1:5070 or redis://...): broadcasts are also
+# published once to a frame bus and socket_edge.py workers serve overlays from their own processes
+# (see FrameBus.py). Overlays pick an edge with ?edge=host:port. Unset: this process serves everyone.
+FANOUT_URL = os.environ.get('SMARL_FANOUT')
+
+import math
+import atexit
+import functools
 import requests
+from flask import Flask, render_template, jsonify, url_for, request, g, Response, has_request_context
 import json
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 import sharedData
 import logging
 import helpers # Import from sharedData?
 from RaceManager import RaceManager
 from ConfigManager import ConfigManager
-from FileWatcher import RaceDataPoller
+from FileWatcher import LobbyDataPoller
+from Lobbies import LobbyRegistry, LobbyEmitter
+import WireCodec
+from FrameBus import FramePublisher
+import TrackBinary
 
 ALLOWED_EXTENSIONS = set(['txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'])
 app = Flask(__name__)
@@ -18,7 +59,7 @@ app.config['SECRET_KEY'] = 'NEWKEYhappydays_placeholder'
 app = Flask(__name__)
 
 # --- 1. Define the endpoint(s) you want to silence ---
-SILENT_ENDPOINTS = ['/api/overlay_data','/socket.io','/static']
+SILENT_ENDPOINTS = ['/api/overlay_data','/api/lap_history','/api/lap_records','/socket.io','/static']
 #logging.getLogger('werkzeug').disabled = True or this
 class SilentWerkzeugFilter(logging.Filter):
     """A filter to silence specific endpoint access logs in Werkzeug."""
@@ -50,11 +91,62 @@ setup_silent_logger()
 
 
 
-socketio = SocketIO(app)
+socketio = SocketIO(app, async_mode=ASYNC_MODE)
+if ASYNC_MODE == 'eventlet':
+    from eventlet import tpool, patcher
+    helpers.BLOCKING_RUNNER = tpool.execute
+    helpers.NATIVE_THREAD_STARTER = lambda func: patcher.original('threading').Thread(target=func, daemon=True).start()
+elif ASYNC_MODE == 'gevent':
+    import gevent
+    helpers.BLOCKING_RUNNER = lambda func, *args: gevent.get_hub().threadpool.apply(func, args)
+    helpers.NATIVE_THREAD_STARTER = lambda func: gevent.get_hub().threadpool.spawn(func)
 #sio = socketio.AsyncClient()
 #smarl_starting_data = [] # Racer Data that gets updated after the game says so
 _Racer_Data = []
 
+# --- Lobbies ---
+# Every lobby (see Lobbies.py) has its own RaceManager, command channel and Socket.IO namespace.
+# Socket handlers are registered on every lobby namespace and find their lobby from the
+# namespace; HTTP routes pick one with ?lobby=<id> (or an X-SMARL-Lobby header) and default to
+# the primary lobby, so single lobby clients work unchanged.
+LOBBIES = LobbyRegistry.load()
+
+def current_lobby():
+    if has_request_context():
+        namespace = getattr(request, 'namespace', None) # Set by Flask-SocketIO for socket events
+        if namespace:
+            return LOBBIES.for_namespace(namespace)
+        return g.get('lobby') or LOBBIES.default
+    return LOBBIES.default
+
+def current_manager():
+    return current_lobby().manager
+
+def lobby_commands(lobby=None):
+    """Command channel of lobby, or of the lobby the current request is for."""
+    return (lobby or current_lobby()).commands
+
+def emit_to_lobby(event, *args, **kwargs):
+    """socketio.emit into the namespace of the lobby the current socket event came from."""
+    kwargs.setdefault('namespace', current_lobby().namespace)
+    socketio.emit(event, *args, **kwargs)
+
+def on_lobby_event(event):
+    """Like @socketio.on(event), but registered on the namespace of every lobby."""
+    def register(handler):
+        for namespace in LOBBIES.namespaces():
+            socketio.on_event(event, handler, namespace=namespace)
+        return handler
+    return register
+
+@app.before_request
+def select_lobby():
+    lobby_id = request.args.get('lobby') or request.headers.get('X-SMARL-Lobby')
+    lobby = LOBBIES.get(lobby_id)
+    if lobby is None:
+        return jsonify({"error": f"Unknown lobby {lobby_id}"}), 404
+    g.lobby = lobby
+
 # Filepaths 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 main_path = dir_path
@@ -91,118 +183,141 @@ def get_car_data(racerID): # gets the individual data vars, just separated out b
 def index():
      
     return render_template('smarl_overlay_dashboard.html')
-#TODO: FIGURE OUT GLOBAL STORAGE FOR FLASK TO BPUT THESE VARIABLES IN
-_raceStatus = [] # Various Data that contains race status and laps left
-_qualifyingData = [] # Collection of qualifying Data stored while server is up
-_raceData = [] # All Race Data formatted as realtime_data, qualifying_data, finish_data, meta_data
-_splitData={} #singular split
-_finishData=[] # Contains information appended after a racer finishes
-
-
-@socketio.on('getJson')
+# Last relayed packet per lobby (lobby.packets):
+#   'status'  Various Data that contains race status and laps left
+#   'qual'    Collection of qualifying Data stored while server is up
+#   'race'    All Race Data formatted as realtime_data, qualifying_data, finish_data, meta_data
+#   'split'   singular split
+#   'finish'  Contains information appended after a racer finishes
+def last_packet(kind, default=None):
+    return current_lobby().packets.get(kind, [] if default is None else default)
+
+
+@on_lobby_event('connect')
+def handle_connect(auth=None): # Every client starts on plain JSON until it negotiates a codec
+    if WireCodec.CLIENTS.total() >= MAX_SOCKET_CLIENTS:
+        print(f"Rejecting socket client, already at MAX_SOCKET_CLIENTS ({MAX_SOCKET_CLIENTS})")
+        return False
+    WireCodec.CLIENTS.set(request.sid, WireCodec.CODEC_JSON)
+    join_room(WireCodec.room_for(WireCodec.CODEC_JSON))
+
+@on_lobby_event('disconnect')
+def handle_disconnect():
+    WireCodec.CLIENTS.remove(request.sid)
+
+@on_lobby_event('setCodec') # smarl_utils.js asks for the compact struct-of-arrays raceData
+def handle_set_codec(jsonData):
+    codec = (jsonData or {}).get('codec', WireCodec.CODEC_JSON)
+    if codec not in WireCodec.CODECS:
+        codec = WireCodec.CODEC_JSON
+    previous = WireCodec.CLIENTS.set(request.sid, codec)
+    if previous and previous != codec:
+        leave_room(WireCodec.room_for(previous))
+    join_room(WireCodec.room_for(codec))
+    emit_to_lobby('codecAck', {'codec': codec}, to=request.sid)
+
+@on_lobby_event('getOverlayData') # Overlays ask once on connect, then get 'overlayData' pushes on change
+def handle_get_overlay_data(jsonData=None):
+    emit_to_lobby('overlayData', current_manager().get_overlay_data(), to=request.sid)
+
+@on_lobby_event('getJson')
 def handle_get_json(jsonData):
    print("getJson?")
 
 
-@socketio.on('getQual')
+@on_lobby_event('getQual')
 def handle_get_qual(jsonData): # Grabs Qualification data (Post Qualification)
-    global _qualifyingData
     #print("returning qualification Data")
-    socketio.emit('qualData', _qualifyingData)
+    emit_to_lobby('qualData', last_packet('qual'))
 
-@socketio.on('getRace')
+@on_lobby_event('getRace')
 def handle_get_race(jsonData):
-    global _raceData
     #print("Returning Race Data",_raceData)
-    socketio.emit('raceData', _raceData)
+    emit_to_lobby('raceData', last_packet('race'))
 
-@socketio.on('getTwitchStats')
+@on_lobby_event('getTwitchStats')
 def handle_get_stats(jsonData):
-    stats = Race_Manager.grabUserStats()
+    stats = current_manager().grabUserStats()
     statsjson = json.dumps(stats)
     #print('handle get stats',stats,statsjson)
     #print("Returning Race Data",_raceData)
-    socketio.emit('twitchStats', statsjson)
+    emit_to_lobby('twitchStats', statsjson)
 
-@socketio.on('getCurrentRaceData')
+@on_lobby_event('getEntrantState') # Chat bot asks for a full entrant snapshot on (re)connect
+def handle_get_entrant_state(jsonData=None):
+    emit_to_lobby('entrantState', current_manager().build_entrant_state(), to=request.sid) # Only the asking client; changes are broadcast by RaceManager
+
+@on_lobby_event('getCurrentRaceData')
 def handle_get_race_current_data(jsonData):
     print("Returning Race Data",sharedData._SpecificRaceData)
-    socketio.emit('raceData',sharedData._SpecificRaceData)
+    emit_to_lobby('raceData',sharedData._SpecificRaceData)
 
 
-@socketio.on('getFinish')
+@on_lobby_event('getFinish')
 def handle_get_finish(jsonData):
-    global _finishData
     #print("Returning Finish Data")
-    Race_Manager.onFinish(jsonData)
-    socketio.emit('finishData',_finishData)
+    current_manager().onFinish(jsonData)
+    emit_to_lobby('finishData',last_packet('finish'))
 
-@socketio.on('getStatus')
+@on_lobby_event('getStatus')
 def handle_get_status(jsonData):
-    global _raceStatus
     #print("Returning Status Data")
     #print()
     #print("STATUS!!!",_raceStatus)
-    socketio.emit('statusData',_raceStatus)
+    emit_to_lobby('statusData',last_packet('status'))
 
-@socketio.on('getSeason')
+@on_lobby_event('getSeason')
 def handle_get_season(jsonData):
     print("Returning Season Data",sharedData._RacerData)
-    socketio.emit('seasonData',sharedData._RacerData)
+    emit_to_lobby('seasonData',sharedData._RacerData)
 
-@socketio.on('statusPacket')
+@on_lobby_event('statusPacket')
 def handle_incoming_status(jsonData):
     print("Got status Packet")
-    global _raceStatus
-    _raceStatus = jsonData
-    socketio.emit('statusData', jsonData)
+    current_lobby().packets['status'] = jsonData
+    emit_to_lobby('statusData', jsonData)
     #print('')
 
-@socketio.on('racePacket')
+@on_lobby_event('racePacket')
 def handle_incoming_race(jsonData):
-    global _raceData
-    _raceData = jsonData
+    current_lobby().packets['race'] = jsonData
     print("emit raceData",jsonData)
-    socketio.emit('raceData', jsonData)
+    emit_to_lobby('raceData', jsonData)
     #print('')
 
-@socketio.on('qualPacket')
+@on_lobby_event('qualPacket')
 def handle_incoming_qual(jsonData):
-    global _qualifyingData
     print("Got Qual Packet")
-    _qualifyingData = jsonData
-    socketio.emit('qualData', jsonData)
+    current_lobby().packets['qual'] = jsonData
+    emit_to_lobby('qualData', jsonData)
     #print('')
 
-@socketio.on('splitPacket')
+@on_lobby_event('splitPacket')
 def handle_incoming_split(jsonData):
-    global _splitData
     print("Got split Packet")
-    _splitData = jsonData
-    socketio.emit('splitData', jsonData)
+    current_lobby().packets['split'] = jsonData
+    emit_to_lobby('splitData', jsonData)
     #print('')
 
-@socketio.on('finishPacket')
+@on_lobby_event('finishPacket')
 def handle_incoming_finish(jsonData):
-    global _finishData
     #print("Got Finish Packet")
-    _finishData = jsonData
-    socketio.emit('finishData')
+    current_lobby().packets['finish'] = jsonData
+    emit_to_lobby('finishData')
     #print('')
 
 
-@socketio.on('dataPacket') # handles all universal data
+@on_lobby_event('dataPacket') # handles all universal data
 def handle_incoming_data(jsonData):
-    global _raceData
     #print("Got data Packet",jsonData)
-    Race_Manager.onUpdate(jsonData)
-    _raceData = jsonData
-    socketio.emit('raceData', jsonData)
+    current_manager().onUpdate(jsonData)
+    current_lobby().packets['race'] = jsonData
+    emit_to_lobby('raceData', jsonData)
     #print('')
 
 
 
-@socketio.on('gotRacerData') # just to check if its there
+@on_lobby_event('gotRacerData') # just to check if its there
 def handle_incoming_racerData(jsonData):
     print("Retrieving racerData") 
     jsonDataFile = open("racerData.json","r")
@@ -210,9 +325,8 @@ def handle_incoming_racerData(jsonData):
     jsonLine = json.load(jsonDataFile)
     #print(jsonLine)
     sharedData._RacerData = jsonLine
-    global _Racer_Data
     _Racer_Data = jsonLine
-    socketio.emit('seasonData', _Racer_Data)
+    emit_to_lobby('seasonData', _Racer_Data)
 
 
 # _________________________SMARL REALTIME Control API CODE _______________________________
@@ -274,7 +388,7 @@ def api_spawn_racer(racer_id):
         'cmd': 'impCAR',
         'val': str(racer_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 # Required fields for a valid join command
@@ -300,7 +414,7 @@ def join_twitch_race():
         return jsonify({"error": f"Failed to process request data: {e}"}), 400
 
     # Business Logic: Call the RaceManager method
-    result = Race_Manager.onJoin(command)
+    result = current_manager().onJoin(command)
 
     if result is False:
         # Race_Manager returned False (e.g., entries closed or full capacity)
@@ -337,7 +451,7 @@ def leave_twitch_race(): #TODO: Fix and finish later
         return jsonify({"error": f"Failed to process request data: {e}"}), 400
 
     # Business Logic: Call the RaceManager method
-    result = Race_Manager.onLeave(command)
+    result = current_manager().onLeave(command)
 
     if result is False:
         # Race_Manager returned False (e.g., Race Entries closed or user not in race)
@@ -356,7 +470,7 @@ def leave_twitch_race(): #TODO: Fix and finish later
 def set_predictions_enabled(): # Toggles predictions ability
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.set_predictions_enabled() # TODO: get the value that it was toggled to
+        result = current_manager().set_predictions_enabled() # TODO: get the value that it was toggled to
         
         if result is False:
              # If Race_Manager were to return False on a specific failure
@@ -383,7 +497,7 @@ def set_predictions_enabled(): # Toggles predictions ability
 def reset_twitch_laps():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.resetBestLaps() 
+        result = current_manager().resetBestLaps() 
         
         # Race_Manager.resetBestLaps is designed to return True on completion/success
         if result is False:
@@ -410,7 +524,7 @@ def reset_twitch_laps():
 def open_twitch_entries():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.manual_open_entries() 
+        result = current_manager().manual_open_entries() 
         
         if result is False:
              # If Race_Manager were to return False on a specific failure
@@ -436,7 +550,7 @@ def open_twitch_entries():
 def close_twitch_entries():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.manual_close_entries() 
+        result = current_manager().manual_close_entries() 
         
         if result is False:
              # If Race_Manager were to return False on a specific failure
@@ -462,7 +576,7 @@ def close_twitch_entries():
 def start_twitch_race():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.manual_start_race() 
+        result = current_manager().manual_start_race() 
         
         if result is False:
              # If Race_Manager were to return False on a specific failure
@@ -491,7 +605,7 @@ def start_twitch_race():
 def reset_twitch_race():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.manual_reset_race() 
+        result = current_manager().manual_reset_race() 
         
         # Race_Manager.resetBestLaps is designed to return True on completion/success
         if result is False:
@@ -519,7 +633,7 @@ def reset_twitch_race():
 def refund_twitch_prediction():
     try:
         # Business Logic: Call the RaceManager method
-        result = Race_Manager.manual_refund_prediction() 
+        result = current_manager().manual_refund_prediction() 
         
         # Race_Manager.resetBestLaps is designed to return True on completion/success
         if result is False:
@@ -567,7 +681,7 @@ def save_twitch_car():
         return jsonify({"error": f"Failed to process request data: {e}"}), 400
     
     try:
-        result = Race_Manager.onSave(command) 
+        result = current_manager().onSave(command) 
     
     except Exception as e:
         # Catch internal runtime exceptions during the saving process
@@ -597,7 +711,7 @@ def api_import_league(league_id):
         'cmd': 'impLEG',
         'val': str(league_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -609,7 +723,7 @@ def api_edit_session(session_type):
         'cmd': 'edtSES',
         'val': str(session_type)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 @app.route('/api/set_session/<status>', methods=['GET'])
@@ -619,16 +733,16 @@ def api_set_session(status):
         'cmd': 'setSES',
         'val': str(status)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 @app.route('/api/set_race/<status>', methods=['GET'])
-def api_set_race(status):
+def api_set_race(status, lobby=None):
     command ={
         'cmd': 'setRAC',
         'val': str(status)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands(lobby).send([command]) # lobby is bound when RaceManager calls this from its tick
     return "Done"
 
 
@@ -639,7 +753,7 @@ def api_reset_racer(racer_id):
         'cmd': 'resCAR',
         'val': str(racer_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -650,7 +764,7 @@ def api_set_session_laps(laps):
         'cmd': 'sesLAP',
         'val': str(laps)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -661,7 +775,7 @@ def api_set_race_laps(laps):
         'cmd': 'raceLAP',
         'val': str(laps)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -672,7 +786,7 @@ def api_edit_race_draft(value):
         'cmd': 'racDRA',
         'val': str(value)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -683,7 +797,7 @@ def api_edit_race_handicap(value):
         'cmd': 'racHAN',
         'val': str(value)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -694,7 +808,7 @@ def api_set_tire_wear(enabled):
         'cmd': 'setTIR',
         'val': str(enabled)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 @app.route('/api/edit_tire_wear/<value>', methods=['GET'])
@@ -704,7 +818,7 @@ def api_edit_tire_wear(value):
         'cmd': 'setTIR',
         'val': str(value)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -715,7 +829,7 @@ def api_set_fuel_usage(enabled):
         'cmd': 'setFUE',
         'val': str(enabled)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 @app.route('/api/edit_fuel_usage/<value>', methods=['GET'])
@@ -725,19 +839,19 @@ def api_edit_fuel_usage(value):
         'cmd': 'edtFUE',
         'val': str(value)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
 
 @app.route('/api/reset_race', methods=['GET'])
-def api_reset_race(): # For cars without metadat
+def api_reset_race(lobby=None): # For cars without metadat
     print("Received request to reset race")
     command ={
         'cmd': 'resRAC',
         'val': 'all'
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands(lobby).send([command])
     return "Done"
 
 
@@ -750,25 +864,30 @@ def api_pit_racer(pit_data): #manually pits racer witch whatever data its curren
         "val": pit_data #json stringify?
     } 
     print("sending",command)
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
 
 @app.route('/api/update_tuning_data',methods=['GET'])
 def api_update_tuning():
     print("Received request to Update Tuning Data")
-    #results = sharedData.addToQueue([command]) if we want to do live tune changes
-    sharedData.update_tuning_data()
-    return "Done"
+    delta = sharedData.update_tuning_data(full=request.args.get('full') == '1')
+    if delta is None:
+        return jsonify({"error": "Tuning sync failed"}), 502
+    command = sharedData.TUNING_SYNC.command_for(delta)
+    if command: # Only the changed cars re-tune; every lobby's game shares the league tuning
+        for lobby in LOBBIES:
+            lobby.commands.send([command])
+    return jsonify({"changed": list(delta['changed']), "removed": delta['removed'], "rows": delta['rows']})
 
 
 
 @app.route('/api/remove_racer/<racer_id>', methods=['GET'])
-def api_remove_racer(racer_id):
+def api_remove_racer(racer_id, lobby=None):
     print("Received request to Remove racer",racer_id)
     command ={
         'cmd': 'delMID',
         'val': str(racer_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands(lobby).send([command])
     return "Done"
 
 
@@ -779,7 +898,7 @@ def api_remove_car(car_id): # For cars without metadat
         'cmd': 'delBID',
         'val': str(car_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 
@@ -790,16 +909,16 @@ def api_delete_racer(car_id): # For cars without metadat
         'cmd': 'delBID',
         'val': str(car_id)
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands().send([command])
     return "Done"
 
 @app.route('/api/remove_all',methods=['GET'])
-def api_delete_all_racers( ): # For cars without metadat
+def api_delete_all_racers(lobby=None): # For cars without metadat
     command ={
         'cmd': 'delALL',
         'val': 'all'
     } 
-    results = sharedData.addToQueue([command])
+    results = lobby_commands(lobby).send([command])
     return "Done"
 
 # Make sure on public facing site they can only remove racers that match their owned racers
@@ -877,12 +996,64 @@ def stream_overlay():
     return render_template('stream_overlay.html')
 
 @app.route('/api/overlay_data')
-def get_overlay_data():
-    data = Race_Manager.build_overlay_data() # directly builds and gets necessary data
-    if not data:
-        print("Error, no data found")
-        return jsonify({"Error":"No data found"})
-    return jsonify(data)
+def get_overlay_data(): # Fallback for overlays without a socket; overlayData is pushed over Socket.IO
+    etag, body = current_manager().get_overlay_snapshot() # Serialized once per change, not per request
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate, the ETag makes that cheap
+    return response
+
+@app.route('/api/lap_history')
+def get_lap_history(): # ?racer=<id> for one racer, otherwise every racer in the current race
+    racer_id = request.args.get('racer')
+    if racer_id is None:
+        return jsonify(current_manager().lap_history.all_history())
+    history = current_manager().lap_history.racer_history(racer_id)
+    if history is None:
+        return jsonify({"error": f"No lap history for racer {racer_id}"}), 404
+    return jsonify(history)
+
+@app.route('/api/lap_records')
+def get_lap_records(): # Session best, track record and every racer's personal best / last lap delta
+    return jsonify(current_manager().lap_records.snapshot(racers=True))
+
+@app.route('/api/lobbies')
+def get_lobbies(): # Lobbies hosted by this server and where their overlays/chat bot connect
+    return jsonify([{
+        "id": lobby.id,
+        "namespace": lobby.namespace,
+        "primary": lobby.primary,
+        "track_id": lobby.track_id(),
+        "entries_open": lobby.manager.entriesOpen,
+        "entrants": len(lobby.manager.usersEntered)
+    } for lobby in LOBBIES])
+
+@app.route('/api/fanout')
+def get_fanout(): # Frame bus counters: sequence, frames pending/conflated, connected edges
+    if FRAME_BUS is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, "url": FANOUT_URL, **FRAME_BUS.stats()})
+
+@app.route('/api/track_map')
+def get_track_map(): # Current map (the game's current_map.json export) as .smtk, see TrackBinary.py
+    return _track_binary_response(helpers.resource_path('current_map.json'))
+
+@app.route('/api/track_map/<int:track_id>')
+def get_track_map_by_id(track_id): # TrackData/<id>_<name>.json spine as .smtk
+    return _track_binary_response(TrackBinary.find_track_json(track_id))
+
+def _track_binary_response(json_path):
+    try:
+        data = TrackBinary.cached_binary(json_path)
+    except (OSError, ValueError, KeyError) as e:
+        print("Could not convert map data", json_path, e)
+        data = None
+    if data is None:
+        return Response("No map data", status=404)
+    return Response(data, mimetype='application/octet-stream')
 
 @app.route('/tarl_season_display', methods=['GET','POST']) # Displays Season Results using league
 def tarl_season_board(): 
@@ -892,15 +1063,14 @@ def tarl_season_board():
 
 @app.route('/smarl_get_realtime_data', methods=['GET','POST']) # Displays Race Results
 def smarl_get_lapData(): #Get lap data
-    print("REturning",_raceData)
-    return json.dumps(_raceData)
+    print("REturning",last_packet('race'))
+    return json.dumps(last_packet('race'))
 
 
 @app.route('/smarl_map_display', methods=['GET','POST']) # Displays Race Results
 def smarl_map_display(): #Get lap data
     car_data = []
-    map_data = []
-    if Race_Manager.TwitchRaceEnabled == False and Race_Manager.SMARL_ENABLED:
+    if current_manager().TwitchRaceEnabled == False and current_manager().SMARL_ENABLED:
         try: # This isnt actually necessary
             response = requests.get(sharedData.get_smarl_url() + "/get_all_racers")
             response.raise_for_status()
@@ -911,16 +1081,10 @@ def smarl_map_display(): #Get lap data
         pass
         #car_data[]# = Race_Manager.grabUserStats()
 
-    try:
-        file = open("../JsonData/TrackData/current_map.json")
-        jsonData = json.load(file)
-        print("Found Map data map data")
-        map_data = jsonData
-    except Exception as e:
-        print("Could not get map data",e)
-
-
-    return render_template('smarl_map_display.html',all_cars = car_data, map_data = map_data)
+    # The page fetches the map itself as .smtk (a fraction of the JSON, no per node parsing)
+    track_id = request.args.get('track', type=int)
+    map_url = url_for('get_track_map_by_id', track_id=track_id) if track_id is not None else url_for('get_track_map')
+    return render_template('smarl_map_display.html',all_cars = car_data, map_url = map_url)
 
 @app.route('/smarl_session_display', methods=['GET','POST']) # Displays lap history for racers
 def smarl_session_display(): #Get lap data
@@ -947,34 +1111,66 @@ def test_debug():
     return dict(log=console_log)
 
 
-Config_Manager = ConfigManager()
-Race_Manager = RaceManager(Config_Manager,socketio)
-
-
-
-# Can probably move these/remove these since this is passed through as "sio" now
-Race_Manager.api_remove_racer = api_remove_racer
-Race_Manager.api_delete_all_racers = api_delete_all_racers
-Race_Manager.api_set_race = api_set_race
-Race_Manager.api_reset_race = api_reset_race
-def main(): 
+# --- App factory ---
+# Importing this module only defines routes. create_app() builds the per lobby RaceManagers
+# (pure in-memory setup, no IO besides small config/settings reads) and start_subsystems()
+# brings up everything slow or external (OBS, music, stats, raceData polling) once the server
+# is already accepting connections, so a restart mid stream is back on air in well under a
+# second. startup_benchmark.py measures each phase.
+Config_Manager = None
+FRAME_BUS = None
+Race_Manager = None # The lobby on stream
+
+def create_app():
+    """Builds the lobby RaceManagers (once) and returns (app, socketio)."""
+    global Config_Manager, FRAME_BUS, Race_Manager
+    if Race_Manager is not None:
+        return app, socketio
+    Config_Manager = ConfigManager()
+    FRAME_BUS = FramePublisher(FANOUT_URL) if FANOUT_URL else None
+    for lobby in LOBBIES:
+        manager = RaceManager(Config_Manager, LobbyEmitter(socketio, lobby.namespace, FRAME_BUS), lobby)
+        # Can probably move these/remove these since this is passed through as "sio" now
+        # Bound to the lobby: the race tick runs outside of any request
+        manager.api_remove_racer = functools.partial(api_remove_racer, lobby=lobby)
+        manager.api_delete_all_racers = functools.partial(api_delete_all_racers, lobby=lobby)
+        manager.api_set_race = functools.partial(api_set_race, lobby=lobby)
+        manager.api_reset_race = functools.partial(api_reset_race, lobby=lobby)
+        lobby.manager = manager
+    Race_Manager = LOBBIES.default.manager
+    atexit.register(flush_settings)
+    return app, socketio
+
+def flush_settings():
+    """Writes settings changes still waiting for the debounced writer (runs at exit)."""
+    for lobby in LOBBIES:
+        if lobby.manager is not None:
+            lobby.manager.settings_store.close()
+
+def start_subsystems():
+    """Starts every manager and the raceData poller. Runs as a background task next to the server."""
+    started = time.perf_counter()
     sharedData.init()
-    # Define the file name exactly where you need it
-    FILE_TO_WATCH = 'raceData.json'
-    # Start the Poller thread, passing the file name and the Race_Manager instance.
-    poller = RaceDataPoller(
-        file_name=FILE_TO_WATCH, 
-        shared_state_manager=Race_Manager
+    for lobby in LOBBIES:
+        lobby.manager.start()
+    # Start the Poller thread: one observer for every lobby's raceData.json, ticks on a shared worker pool
+    poller = LobbyDataPoller(
+        list(LOBBIES),
+        use_polling=ASYNC_MODE != 'threading' # Native observers block the eventlet/gevent hub
     )
-
-    try:
-        poller.start() # Start the file monitoring thread
-        print(f"Monitoring thread started for {FILE_TO_WATCH}.")
-    except FileNotFoundError as e:
-        print(f"CRITICAL ERROR: Failed to start Poller: {e}")
-    if '__main__' == __name__:
-        socketio.run(app,host='0.0.0.0',port='5056', debug=True,use_reloader=False)
-    
-main()
+    poller.start() # Start the file monitoring thread
+    print(f"Monitoring thread started for {len(poller.feeds)} lobby(s). Subsystems up in {time.perf_counter() - started:.2f}s")
+    return poller
+
+def main():
+    create_app()
+    production = SERVER_MODE == 'production'
+    print(f"Starting server in {SERVER_MODE} mode ({ASYNC_MODE}), {time.perf_counter() - STARTUP_STARTED:.2f}s after launch")
+    socketio.start_background_task(start_subsystems)
+    socketio.run(app,host='0.0.0.0',port=5056, debug=not production,use_reloader=False,log_output=not production,
+                 allow_unsafe_werkzeug=ASYNC_MODE == 'threading') # Dev mode is Werkzeug on purpose, also when launched without a console
+
+if __name__ == '__main__':
+    main()
 
 # -------------------------------------------
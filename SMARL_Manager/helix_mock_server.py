@@ -0,0 +1,171 @@
+# Local fake of the Twitch endpoints TwitchHelix.py uses (token refresh + predictions).
+# Lets the Helix client be exercised without a real channel: tokens can be expired on demand,
+# the rate limit bucket is tiny so 429s actually happen, and responses can be delayed to see
+# that prediction calls no longer block the caller.
+#
+#   python helix_mock_server.py              -> runs the self-check below against a fresh server
+#   python helix_mock_server.py --serve 5077 -> just serves on that port (point HelixClient at
+#                                               http://localhost:5077/helix and /oauth2/token)
+import json, time
+import itertools
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockHelixState:
+    def __init__(self, bucket_size=5, bucket_window=1.0, latency=0.0, refresh_latency=0.2):
+        self.lock = threading.Lock()
+        self.token = "token-0"
+        self.refresh_token = "refresh-0"
+        self.refreshes = 0
+        self.bucket_size = bucket_size
+        self.bucket_window = bucket_window
+        self.bucket_left = bucket_size
+        self.bucket_reset = time.time() + bucket_window
+        self.latency = latency # Seconds added to every Helix response
+        self.refresh_latency = refresh_latency # Widens the window for concurrent refreshes
+        self.predictions = {}
+        self.ids = itertools.count(1)
+        self.requests = 0
+
+    def expire_token(self):
+        with self.lock:
+            self.token = f"expired-{self.refreshes}"
+
+    def take(self):
+        """Rate limit bucket. Returns (allowed, remaining, reset epoch)."""
+        with self.lock:
+            now = time.time()
+            if now >= self.bucket_reset:
+                self.bucket_left = self.bucket_size
+                self.bucket_reset = now + self.bucket_window
+            allowed = self.bucket_left > 0
+            if allowed:
+                self.bucket_left -= 1
+            return allowed, self.bucket_left, self.bucket_reset
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): # Quiet
+            pass
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, str(value))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return self.rfile.read(length) if length else b""
+
+        def do_POST(self):
+            if self.path.startswith('/oauth2/token'):
+                self._body()
+                time.sleep(state.refresh_latency)
+                with state.lock:
+                    state.refreshes += 1
+                    state.token = f"token-{state.refreshes}"
+                    state.refresh_token = f"refresh-{state.refreshes}"
+                    body = {"access_token": state.token, "refresh_token": state.refresh_token}
+                return self._send(200, body)
+            self._helix('POST')
+
+        def do_PATCH(self):
+            self._helix('PATCH')
+
+        def _helix(self, method):
+            payload = json.loads(self._body() or b"{}")
+            with state.lock:
+                state.requests += 1
+                token_ok = self.headers.get('Authorization') == f"Bearer {state.token}"
+            if not token_ok:
+                return self._send(401, {"error": "Unauthorized", "status": 401, "message": "Invalid OAuth token"})
+            allowed, remaining, reset = state.take()
+            headers = {'Ratelimit-Limit': state.bucket_size, 'Ratelimit-Remaining': remaining, 'Ratelimit-Reset': int(reset) + 1}
+            if not allowed:
+                return self._send(429, {"error": "Too Many Requests", "status": 429}, headers)
+            time.sleep(state.latency)
+            if not self.path.startswith('/helix/predictions'):
+                return self._send(404, {"error": "Not Found", "status": 404}, headers)
+            if method == 'POST':
+                prediction_id = f"pred-{next(state.ids)}"
+                outcomes = [{"id": f"{prediction_id}-o{i}", "title": o['title']} for i, o in enumerate(payload.get('outcomes', []))]
+                prediction = {"id": prediction_id, "title": payload.get('title'), "outcomes": outcomes, "status": "ACTIVE"}
+                state.predictions[prediction_id] = prediction
+                return self._send(200, {"data": [prediction]}, headers)
+            prediction = state.predictions.get(payload.get('id'))
+            if prediction is None:
+                return self._send(400, {"error": "Bad Request", "status": 400, "message": "prediction not found"}, headers)
+            prediction['status'] = payload.get('status')
+            prediction['winning_outcome_id'] = payload.get('winning_outcome_id')
+            return self._send(200, {"data": [prediction]}, headers)
+
+    return Handler
+
+
+def serve(state, port=0):
+    """Starts the mock on a background thread. Returns (server, base url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def self_check():
+    from TwitchHelix import HelixClient, Predictions
+    state = MockHelixState(bucket_size=5, bucket_window=1.0, latency=0.15)
+    server, url = serve(state)
+    saved = []
+    helix = HelixClient("client", "secret", "stale-token", "refresh-0", on_tokens=lambda a, r: saved.append(a),
+                        base_url=url + "/helix", token_url=url + "/oauth2/token")
+
+    # 1. Expired token + concurrent callers -> exactly one refresh
+    futures = [helix.submit(helix.request('POST', '/predictions', json={"title": f"t{i}", "outcomes": [{"title": "A"}]}))
+               for i in range(4)]
+    results = [f.result(timeout=20) for f in futures]
+    assert all(r['data'][0]['id'] for r in results)
+    assert state.refreshes == 1 and saved == ["token-1"], (state.refreshes, saved)
+    print(f"single-flight refresh: {len(futures)} concurrent 401s -> {state.refreshes} refresh")
+
+    # 2. More calls than the bucket allows -> waits for the reset instead of failing
+    futures = [helix.submit(helix.request('POST', '/predictions', json={"title": "burst", "outcomes": []})) for _ in range(12)]
+    assert all(f.result(timeout=30) for f in futures)
+    print(f"rate limit: 12 calls through a {state.bucket_size}/s bucket all succeeded")
+
+    # 3. Prediction lifecycle is non-blocking for the caller and ordered
+    predictions = Predictions(helix, "broadcaster")
+    start = time.perf_counter()
+    started = predictions.start("Who will win?", ["A", "B", "The Field"], 120)
+    resolved = predictions.resolve("B")
+    submit_ms = (time.perf_counter() - start) * 1000
+    assert started.result(timeout=20) and resolved.result(timeout=20)
+    total_ms = (time.perf_counter() - start) * 1000
+    ended = [p for p in state.predictions.values() if p['title'] == "Who will win?"][0]
+    assert ended['status'] == "RESOLVED" and ended['winning_outcome_id'].endswith("-o1")
+    print(f"predictions: start+resolve submitted in {submit_ms:.2f} ms, completed in {total_ms:.0f} ms")
+
+    helix.stop()
+    server.shutdown()
+    print("PASS")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mock Twitch Helix server")
+    parser.add_argument('--serve', type=int, metavar='PORT', help="Only serve on PORT (no self-check)")
+    args = parser.parse_args()
+    if args.serve:
+        server, url = serve(MockHelixState(), args.serve)
+        print(f"Mock Helix listening on {url}/helix (tokens at {url}/oauth2/token). Ctrl+C to stop.")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        self_check()
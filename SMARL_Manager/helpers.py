@@ -1,7 +1,8 @@
 import os, math
 import json, sys
 import time
-import datetime
+import threading
+import laptime
 #import sharedData
 dir_path = os.path.dirname(os.path.realpath(__file__))
 json_data = os.path.join(dir_path, "JsonData")
@@ -59,6 +60,56 @@ def get_seconds_from_time(time_str):
         print(f"Error: Non-integer found in time string '{time_str}'.")
         return 0.0
 
+def atomic_write_json(file_path, data, indent=None):
+    """
+    Writes data as JSON to a temp file in the same directory and renames it over file_path.
+    os.replace is atomic on the same filesystem, so readers see either the old file or the
+    new one, never a partially written file.
+    """
+    _atomic_write(file_path, 'w', lambda outfile: json.dump(data, outfile, indent=indent))
+
+def atomic_write_bytes(file_path, data):
+    """atomic_write_json for binary files (TrackBinary's .smtk)."""
+    _atomic_write(file_path, 'wb', lambda outfile: outfile.write(data))
+
+def _atomic_write(file_path, mode, write):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(file_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, mode) as outfile:
+            write(outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        # Don't leave the temp file behind when the dump or the rename fails (file locked, disk full)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+# Runs blocking native calls (mp3 decoding, etc) without stalling the server.
+# Under eventlet/gevent (production mode) application.py swaps this for the hub's
+# real OS thread pool, otherwise the call just runs on the current thread.
+BLOCKING_RUNNER = None
+
+def run_blocking(func, *args):
+    if BLOCKING_RUNNER is None:
+        return func(*args)
+    return BLOCKING_RUNNER(func, *args)
+
+# Starts func on a real OS thread (for code that runs its own event loop, like the asyncio
+# Twitch client). A monkey patched threading.Thread would be a greenlet sharing the server hub,
+# so application.py swaps this in production mode as well.
+NATIVE_THREAD_STARTER = None
+
+def start_native_thread(func):
+    if NATIVE_THREAD_STARTER is None:
+        threading.Thread(target=func, daemon=True).start()
+    else:
+        NATIVE_THREAD_STARTER(func)
+
 def find_racer_by_id(id,dataList): #Finds racer according to id
     if dataList == None: return None
     result = next((item for item in dataList if str(item["racer_id"]) == str(id)), None)
@@ -96,6 +147,33 @@ def findFile(filename, start_dir=".."):
     # If the loops complete without finding the file
     return None
 
+# --- Resource paths ---
+# Files shared with the game (Scripts/globals.lua) and the chat bot live at fixed places under
+# SMARL_Manager, so they are registered here instead of searched for: findFile("..") walks the
+# whole mod folder (every Objects/Gui asset) and did so on every start. Names not in the registry
+# fall back to one findFile walk of this folder, remembered for the rest of the run.
+RESOURCE_PATHS = {
+    'raceData.json': os.path.join(json_data, "RaceOutput", "raceData.json"),
+    'current_map.json': os.path.join(json_data, "TrackData", "current_map.json"),
+    'tuning_profiles.json': os.path.join(json_data, "tuning_profiles.json"),
+    'apiInstructs.json': API_FILE,
+}
+_resolved_paths = {}
+_resolved_lock = threading.Lock()
+
+def resource_path(filename):
+    """Absolute path of a shared resource file (None if unknown and not found). Never walks the tree twice."""
+    with _resolved_lock:
+        if filename in _resolved_paths:
+            return _resolved_paths[filename]
+    path = RESOURCE_PATHS.get(filename)
+    if path is None:
+        print(f"resource_path: {filename} is not registered, searching {dir_path} once")
+        path = findFile(filename, start_dir=dir_path)
+    with _resolved_lock:
+        _resolved_paths[filename] = path
+    return path
+
 def checkZeros(data):
     if data['pos'] == '0': # just a hack to prevent just starting vehicles from showing
         return True
@@ -113,36 +191,32 @@ def getIndexByKey(key,lis):
     newIndex = next((index for (index, d) in enumerate(lis) if d['ID'] == key), None)
     return newIndex
     
-def getTimeFromTimeStr(timeStr):
-    minutes = int(timeStr[0:2])
-    seconds = int(timeStr[3:5])
-    milliseconds = int(timeStr[6:9])
-    myTime = datetime.datetime(2019,7,12,1,minutes,seconds,milliseconds)
-    return myTime
+def getTimeFromTimeStr(timeStr): # Returns int ms (None if invalid). The old datetime version put ms in the microseconds field
+    return laptime.parse(timeStr)
+
+def _racer_best_ms(racer): # Parsed racers carry bestLapMs, older dicts only the formatted string
+    best = racer.get('bestLapMs')
+    return best if best is not None else laptime.parse(racer.get('bestLap'))
 
 def getFastestLap_racer(finishData):
     fastestTime = None
     fastestRacer = None
-    timeStr = None
     for racer in finishData:
-        ch_tStr = racer['bestLap']
-        chTime = getTimeFromTimeStr(ch_tStr)
-        if fastestTime == None:
-            fastestTime = chTime
-            fastestRacer = racer
-            timeStr = ch_tStr
-        elif chTime < fastestTime:
+        chTime = _racer_best_ms(racer)
+        if chTime is None:
+            continue
+        if fastestTime == None or chTime < fastestTime:
             fastestTime = chTime
             fastestRacer = racer
-            timeStr = ch_tStr
+    timeStr = laptime.format_ms(fastestTime) if fastestTime is not None else None
     return timeStr,fastestRacer
 
 def determineFastestLap(allRacers,racerLap): #checks what the fastest lap was
-    racerTime = getTimeFromTimeStr(racerLap)
-    isFastest = True
+    racerTime = racerLap if isinstance(racerLap, int) else laptime.parse(racerLap)
+    if racerTime is None:
+        return False
     for racer in allRacers:
-        ch_tStr = racer['bestLap']
-        chTime = getTimeFromTimeStr(ch_tStr)
-        if chTime < racerTime:
-            isFastest = False
-    return isFastest
\ No newline at end of file
+        chTime = _racer_best_ms(racer)
+        if chTime is not None and chTime < racerTime:
+            return False
+    return True
\ No newline at end of file
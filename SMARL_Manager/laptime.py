@@ -0,0 +1,74 @@
+import math
+import numpy as np
+
+# Lap times are integer milliseconds everywhere inside the manager (None = no time).
+# They used to go float seconds -> "MM:SS.mmm" string -> float seconds/datetime and back,
+# once per racer per tick, and the datetime versions put milliseconds in the microseconds
+# field. Now the game's float seconds are converted once when parsed, compared as ints,
+# and only turned into "MM:SS.mmm" when sent to overlays, chat or the stats file.
+
+NO_TIME = "N/A" # Display text for a missing time
+ZERO_TIME = "00:00.000" # What overlays have always shown before a racer sets a lap
+MAX_VALID_MS = 24 * 60 * 60 * 1000 # Anything longer is a sentinel/garbage value, not a lap
+
+
+def from_seconds(seconds):
+    """Game float seconds -> int ms. 0/negative/invalid (no lap set yet) -> None."""
+    try:
+        seconds = float(seconds)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds) or seconds <= 0:
+        return None
+    ms = int(round(seconds * 1000))
+    return ms if ms < MAX_VALID_MS else None
+
+
+def parse(value):
+    """
+    Stored value -> int ms. Accepts "MM:SS.mmm", "M:SS.mmm", "SS.mmm" strings, plain numbers
+    (seconds, as the game and the old stats sentinel used) or None/"N/A". Invalid -> None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return from_seconds(value)
+    text = str(value).strip()
+    if not text or text == NO_TIME:
+        return None
+    try:
+        minutes, _, rest = text.rpartition(':')
+        whole, _, fraction = rest.partition('.')
+        ms = (int(minutes or 0) * 60 + int(whole)) * 1000 + int((fraction + "000")[:3])
+    except ValueError:
+        return None
+    return ms if 0 < ms < MAX_VALID_MS else None
+
+
+def format_ms(ms, missing=NO_TIME):
+    """int ms -> "MM:SS.mmm" (None -> missing)."""
+    if ms is None or ms < 0:
+        return missing
+    minutes, rest = divmod(int(ms), 60000)
+    seconds, millis = divmod(rest, 1000)
+    return f"{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+def format_ms_list(values, missing=NO_TIME):
+    """Vectorized format_ms for a whole list of ms values (None allowed). Returns a list of strings."""
+    if len(values) == 0:
+        return []
+    ms = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+    valid = ms >= 0
+    safe = np.where(valid, ms, 0)
+    minutes = np.char.zfill((safe // 60000).astype(str), 2)
+    seconds = np.char.zfill((safe // 1000 % 60).astype(str), 2)
+    millis = np.char.zfill((safe % 1000).astype(str), 3)
+    text = np.char.add(np.char.add(np.char.add(minutes, ':'), np.char.add(seconds, '.')), millis)
+    return np.where(valid, text, missing).tolist()
+
+
+def best(values):
+    """Smallest valid time in an iterable of ms values, or None."""
+    valid = [v for v in values if v is not None]
+    return min(valid) if valid else None
@@ -1,11 +1,12 @@
 import os, sys, json, time
+import threading
 #from winreg import *
 import shutil
 #from ast import parse
-from urllib import response
 import requests
 from requests.exceptions import HTTPError
-import datetime
+import laptime
+from TuningSync import TuningSync
 from typing import List, Dict, Any
 
 # RACE SPECIFIC DATA TODO: Pull from api server instead
@@ -57,13 +58,8 @@ def formatString(strng): #formats string to have capital and replace stuf
     output = output.title()
     return output
 
-def getTimefromTimeStr(timeStr):
-    #TODO: Time string validation
-    minutes = int(timeStr[0:2])
-    seconds = int(timeStr[3:5])
-    milliseconds = int(timeStr[6:9])
-    myTime = datetime.datetime(2019,7,12,1,minutes,seconds,milliseconds)
-    return myTime
+def getTimefromTimeStr(timeStr): # Returns int ms (None if invalid) so times compare exactly
+    return laptime.parse(timeStr)
 
 def setRacerData(data):
     global _RacerData
@@ -88,22 +84,6 @@ def pull_all_racers(): # Grabs all racers and tuning data, even owner?
     return filtered_racers
 
 
-def pull_racer_tuning(): # Grabs all racers and tuning data, even owner?
-    all_racers = None
-    jsonResponse = None
-    try:
-        response = requests.get(get_smarl_url() + "/get_racer_tuning") 
-        response.raise_for_status()
-        jsonResponse = response.json()
-    except HTTPError as http_err:
-        print(f'HTTP error occurred: {http_err}')
-        return all_racers
-    except Exception as err:
-        print(f'pullTuningData Other error occurred: {err}')  
-        return all_racers
-    filtered_racers =  [d for d in jsonResponse] # here because no reason really
-    return filtered_racers
-
 def getRacerData(): # Only grabs racers in league
     print("Getting racer data")
     all_racers = None
@@ -166,14 +146,16 @@ def getTrackData(track_id):
 def track_record_managment(track_id,fastestLap,fastestRacer):
     #print("Checking for lap record",fastestLap,fastestRacer,track_id)
     track_data = getTrackData(track_id)
+    curLapTime = laptime.parse(fastestLap)
+    if curLapTime is None or fastestRacer is None:
+        return False
     racerID = fastestRacer['id']
-    curLapTime = getTimefromTimeStr(fastestLap)
 
     new_record = False
-    if track_data['record'] == None:
+    oldLapTime = laptime.parse(track_data['record'])
+    if oldLapTime is None: # No record yet (or an unreadable one)
         new_record = True
     else:
-        oldLapTime = getTimefromTimeStr(track_data['record'])
         if curLapTime < oldLapTime:
             print("New Record Found!",fastestLap,racerID)
             new_record = True
@@ -264,144 +246,176 @@ def init():
 
 
 ##_______________________ API to lua Functions __________
-LAST_ACK = 0
+# Each game instance (lobby) reads its own command file and writes its own ack file, so the
+# handshake state lives in a CommandChannel per lobby. The module functions below keep working
+# on DEFAULT_CHANNEL (the single game instance setup).
+
+class CommandChannel:
+    """Command file + ack handshake with one game instance. send() is serialized per channel."""
+
+    def __init__(self, queue_path=SMARL_COMMAND_QUEUE, ack_path=SMARL_COMMAND_ACK):
+        self.queue_path = queue_path
+        self.ack_path = ack_path
+        self.last_ack = 0
+        self.lock = threading.Lock() # Request threads and the race tick both send commands
+
+    def outputCommandQueue(self, commandQue):
+        """
+        Writes the Python list of commands directly to the file as JSON.
+        This eliminates the need to double-parse in addToQueue.
+        """
+        with open(self.queue_path, 'w') as outfile:
+            # Use json.dump() to write the Python object (list) directly to the file stream.
+            # This is the standard and safest way to write JSON files.
+            json.dump(commandQue, outfile)
+            
+        return True
 
-def outputCommandQueue(commandQue):
-    """
-    Writes the Python list of commands directly to the file as JSON.
-    This eliminates the need to double-parse in addToQueue.
-    """
-    with open(SMARL_COMMAND_QUEUE, 'w') as outfile:
-        # Use json.dump() to write the Python object (list) directly to the file stream.
-        # This is the standard and safest way to write JSON files.
-        json.dump(commandQue, outfile)
+    def resetCommandsFile(self):
+        """
+        Ensures the COMMANDS_FILE exists and contains a valid empty JSON list ([]) 
+        by overwriting it. This is the official initialization for this file.
+        """
+        try:
+            # Opening in 'w' (write) mode will create the file if it doesn't exist
+            # and overwrite any existing content if it does.
+            with open(self.queue_path, 'w') as outfile:
+                json.dump([], outfile)
+            return True
+        except Exception as e:
+            print(f"FATAL ERROR: Could not initialize or reset commands file: {e}")
+            return False
+
+    def initialize_ack_file(self):
+        """Ensures the ACK_FILE exists and contains valid JSON {"status": 0}."""
+        ack_data = {'status': 0}
+        try:
+            with open(self.ack_path, 'w') as outFile:
+                json.dump(ack_data, outFile)
+            return 0
+        except Exception as e:
+            print(f"FATAL ERROR: Could not initialize ACK file: {e}")
+            return -1 # Use a unique return for initialization failure
+
+    def check_ack_file(self): #Checks for ack file and inits if failure
+        # --- INITIAL READ AND TEMPLATE CREATION ---
+        try:
+            with open(self.ack_path, 'r') as inFile:
+                ack_data = json.load(inFile)
+                if not ack_data.get('status',False):
+                    self.initialize_ack_file()
+        except FileNotFoundError:
+            print("ACK file not found. Creating template.")
+            return self.initialize_ack_file()
+        except json.JSONDecodeError:
+            print("ACK file corrupted. Recreating template.")
+            return self.initialize_ack_file()
+        except Exception as e:
+            print(f"Unexpected error reading ACK file: {e}. Recreating template.")
+            return self.initialize_ack_file()
+        return ack_data
+
+    def waitForAcknowledge(self, last_ack_value: int) -> int:
+        """Waits for Lua to acknowledge the previous write by updating its status file."""
+        timeout = 10 
+        start_time = time.time()
+        current_ack_value = -1 # Start with an invalid state
+
+        # --- INITIAL READ AND TEMPLATE CREATION ---
+        ack_data = self.check_ack_file()
+        if not isinstance(ack_data, dict): # Template was just (re)created
+            ack_data = {'status': ack_data}
+        current_ack_value = ack_data.get('status', last_ack_value)
         
-    return True
+        # ------------------------------------------
+
+        # If the file was successfully read but the status value is bad (e.g., file was '{}'),
+        # the .get('status', last_ack_value) handles it, so we proceed to the loop.
+
+        # --- POLLING LOOP ---
+        while current_ack_value == last_ack_value:
+
+            time.sleep(0.05) 
+            if time.time() - start_time > timeout:
+                print("ERROR: Lua acknowledgement timed out.")
+                return -1 
+
+            try:
+                with open(self.ack_path, 'r') as inFile:
+                    ack_data = json.load(inFile)
+                    print('gotackdata',ack_data)
+                current_ack_value = ack_data.get('status', last_ack_value)
+            except:
+                # If corruption happens during the wait, treat as failure
+                print("ERROR: ACK file corrupted during wait loop. Aborting.")
+                return -1
+        return current_ack_value
+
+    def send(self, commands):
+        with self.lock:
+            return self._send_locked(commands)
+
+    def _send_locked(self, commands):
+        # --- PHASE 1: PRE-FLIGHT CHECK & ACKNOWLEDGEMENT WAIT ---
+        
+        if self.last_ack != 0:
+            # If last_ack is NOT 0, a previous command was sent, and we MUST wait 
+            # for Lua to acknowledge it before writing the new command.
+            new_ack = self.waitForAcknowledge(self.last_ack)
+            
+            if new_ack == -1:
+                return "Fail (Handshake Timeout)"
 
-def resetCommandsFile():
-    """
-    Ensures the COMMANDS_FILE exists and contains a valid empty JSON list ([]) 
-    by overwriting it. This is the official initialization for this file.
-    """
-    try:
-        # Opening in 'w' (write) mode will create the file if it doesn't exist
-        # and overwrite any existing content if it does.
-        with open(SMARL_COMMAND_QUEUE, 'w') as outfile:
-            json.dump([], outfile)
-        return True
-    except Exception as e:
-        print(f"FATAL ERROR: Could not initialize or reset commands file: {e}")
-        return False
+            self.last_ack = new_ack # Update the expected ACK value
 
-def initialize_ack_file():
-    """Ensures the ACK_FILE exists and contains valid JSON {"status": 0}."""
-    ack_data = {'status': 0}
-    try:
-        with open(SMARL_COMMAND_ACK, 'w') as outFile:
-            json.dump(ack_data, outFile)
-        return 0
-    except Exception as e:
-        print(f"FATAL ERROR: Could not initialize ACK file: {e}")
-        return -1 # Use a unique return for initialization failure
-
-def check_ack_file(): #Checks for ack file and inits if failure
-    # --- INITIAL READ AND TEMPLATE CREATION ---
-    try:
-        with open(SMARL_COMMAND_ACK, 'r') as inFile:
-            ack_data = json.load(inFile)
-            if not ack_data.get('status',False):
-                initialize_ack_file()
-    except FileNotFoundError:
-        print("ACK file not found. Creating template.")
-        return initialize_ack_file()
-    except json.JSONDecodeError:
-        print("ACK file corrupted. Recreating template.")
-        return initialize_ack_file()
-    except Exception as e:
-        print(f"Unexpected error reading ACK file: {e}. Recreating template.")
-        return initialize_ack_file()
-    return ack_data
+        # If last_ack IS 0 (First Run): 
+        # We skip the wait entirely and proceed immediately to write the first command.
+        # We must assume the initial state (ACK_FILE) is 0, which initialize_ack_file() guarantees.
 
-def waitForAcknowledge(last_ack_value: int) -> int:
-    """Waits for Lua to acknowledge the previous write by updating its status file."""
-    timeout = 10 
-    start_time = time.time()
-    current_ack_value = -1 # Start with an invalid state
-
-    # --- INITIAL READ AND TEMPLATE CREATION ---
-    ack_data = check_ack_file()
-    current_ack_value = ack_data.get('status', last_ack_value)
-    
-    # ------------------------------------------
+        
+        # --- PHASE 2: COMMAND WRITE & EXPECTATION SET ---
 
-    # If the file was successfully read but the status value is bad (e.g., file was '{}'),
-    # the .get('status', last_ack_value) handles it, so we proceed to the loop.
+        # 1. Initialization/Reset: Ensure the command queue file is clean ([])
+        self.resetCommandsFile()
+        
+        # 2. Prepare and write the command
+        current_queue = [] 
+        current_queue.extend(commands)
+        self.outputCommandQueue(current_queue) # <--- This is the trigger for LUA to act!
+
+        # 3. Critical Step: Set the new expectation for the NEXT run.
+        # We wrote the command, so we expect Lua to process it and increment the ACK by 1.
+        #self.last_ack += 1 # @gemini This seems wrong, Lua right now just sets the next ack to what this already is, maintaining the deadlock 
+        
+        #print(f"Command sent. Next expected ACK is {self.last_ack}.")
+        return "Success"
 
-    # --- POLLING LOOP ---
-    while current_ack_value == last_ack_value:
 
-        time.sleep(0.05) 
-        if time.time() - start_time > timeout:
-            print("ERROR: Lua acknowledgement timed out.")
-            return -1 
+DEFAULT_CHANNEL = CommandChannel()
 
-        try:
-            with open(SMARL_COMMAND_ACK, 'r') as inFile:
-                ack_data = json.load(inFile)
-                print('gotackdata',ack_data)
-            current_ack_value = ack_data.get('status', last_ack_value)
-        except:
-            # If corruption happens during the wait, treat as failure
-            print("ERROR: ACK file corrupted during wait loop. Aborting.")
-            return -1
-    return current_ack_value
+def outputCommandQueue(commandQue):
+    return DEFAULT_CHANNEL.outputCommandQueue(commandQue)
 
-def addToQueue(commands):
-    global LAST_ACK
-    
-    # --- PHASE 1: PRE-FLIGHT CHECK & ACKNOWLEDGEMENT WAIT ---
-    
-    if LAST_ACK != 0:
-        # If LAST_ACK is NOT 0, a previous command was sent, and we MUST wait 
-        # for Lua to acknowledge it before writing the new command.
-        new_ack = waitForAcknowledge(LAST_ACK)
-        
-        if new_ack == -1:
-            return "Fail (Handshake Timeout)"
+def resetCommandsFile():
+    return DEFAULT_CHANNEL.resetCommandsFile()
 
-        LAST_ACK = new_ack # Update the expected ACK value
+def initialize_ack_file():
+    return DEFAULT_CHANNEL.initialize_ack_file()
 
-    # If LAST_ACK IS 0 (First Run): 
-    # We skip the wait entirely and proceed immediately to write the first command.
-    # We must assume the initial state (ACK_FILE) is 0, which initialize_ack_file() guarantees.
+def check_ack_file():
+    return DEFAULT_CHANNEL.check_ack_file()
 
-    
-    # --- PHASE 2: COMMAND WRITE & EXPECTATION SET ---
+def waitForAcknowledge(last_ack_value: int) -> int:
+    return DEFAULT_CHANNEL.waitForAcknowledge(last_ack_value)
 
-    # 1. Initialization/Reset: Ensure the command queue file is clean ([])
-    resetCommandsFile()
-    
-    # 2. Prepare and write the command
-    current_queue = [] 
-    current_queue.extend(commands)
-    outputCommandQueue(current_queue) # <--- This is the trigger for LUA to act!
-
-    # 3. Critical Step: Set the new expectation for the NEXT run.
-    # We wrote the command, so we expect Lua to process it and increment the ACK by 1.
-    #LAST_ACK += 1 # @gemini This seems wrong, Lua right now just sets the next ack to what this already is, maintaining the deadlock 
-    
-    #print(f"Command sent. Next expected ACK is {LAST_ACK}.")
-    return "Success"
-
-
-def update_tuning_data(): # Exports updated car and tuning data to file
-    racer_data = pull_racer_tuning()
-    # Filter only important info (not needed anyumore but keeping as template)
-    #racer_data =  [{'racer_id': d['racer_id'],
-    #                'name': d['name'],
-    #                'in_season': d['racer_in_season']
-    #                } for d in racer_data] # here because no reason really
-    print("Updating tuning data",len(racer_data))
-    with open(SMARL_TUNING_DATA, 'w') as outfile:
-        jsonMessage = json.dumps(racer_data)
-        outfile.write(jsonMessage)
+def addToQueue(commands):
+    return DEFAULT_CHANNEL.send(commands)
+
+
+TUNING_SYNC = None # TuningSync, created on first use (reads its cache file)
+
+def update_tuning_data(full=False): # Syncs changed car tuning to tuningData.json, returns the delta (see TuningSync.py)
+    global TUNING_SYNC
+    if TUNING_SYNC is None:
+        TUNING_SYNC = TuningSync(get_smarl_url, tuning_path=SMARL_TUNING_DATA)
+    return TUNING_SYNC.sync(full=full)
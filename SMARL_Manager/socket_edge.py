@@ -0,0 +1,127 @@
+import os, sys
+# Socket.IO edge worker: serves overlays from frames the race manager publishes on the frame bus
+# (see FrameBus.py). Edges keep no race state besides the last overlayData/entrantState per lobby
+# for clients that ask on connect, so any number can run side by side (one per core) and be
+# restarted at will. Monkey patching works like application.py and must stay at the top.
+#
+#   SMARL_FANOUT=local://127.0.0.1:5070 python application.py
+#   python socket_edge.py --port 5060 --bus local://127.0.0.1:5070 --production
+#   python socket_edge.py --port 5061 --bus local://127.0.0.1:5070 --production
+# Overlays then connect with ?edge=<host>:5060 (smarl_utils.js smarlSocketUrl).
+PRODUCTION = '--production' in sys.argv or os.environ.get('SMARL_SERVER_MODE', 'dev').lower() == 'production'
+ASYNC_MODE = 'threading'
+if PRODUCTION:
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+        ASYNC_MODE = 'eventlet'
+    except ImportError:
+        try:
+            from gevent import monkey
+            monkey.patch_all()
+            ASYNC_MODE = 'gevent'
+        except ImportError:
+            print("Production mode requested but neither eventlet nor gevent is installed. Using threading.")
+import argparse
+import threading
+from flask import Flask, jsonify, request
+from flask_socketio import SocketIO, join_room, leave_room
+import WireCodec
+from FrameBus import FrameSubscriber
+from Lobbies import LobbyRegistry, LobbyEmitter
+
+MAX_SOCKET_CLIENTS = int(os.environ.get('SMARL_MAX_CLIENTS', 200))
+CACHED_EVENTS = ('overlayData', 'entrantState') # Replayed to clients that ask on connect
+
+
+class Edge:
+    """Socket.IO server fed by a FrameSubscriber. Frames are emitted in bus order from one thread."""
+
+    def __init__(self, bus_url, namespaces):
+        self.app = Flask(__name__)
+        self.socketio = SocketIO(self.app, async_mode=ASYNC_MODE, cors_allowed_origins='*')
+        self.clients = WireCodec.CodecRegistry()
+        self.lock = threading.Lock()
+        self.cache = {} # (namespace, event) -> last payload
+        self.namespaces = namespaces
+        for namespace in namespaces:
+            self._register(namespace)
+        self.app.add_url_rule('/api/edge', 'edge_status', self.status)
+        self.subscriber = FrameSubscriber(bus_url, self.on_frame)
+
+    def _register(self, namespace):
+        sio = self.socketio
+
+        @sio.on('connect', namespace=namespace)
+        def handle_connect(auth=None):
+            if self.clients.total() >= MAX_SOCKET_CLIENTS:
+                print(f"Rejecting socket client, already at MAX_SOCKET_CLIENTS ({MAX_SOCKET_CLIENTS})")
+                return False
+            self.clients.set(request.sid, WireCodec.CODEC_JSON)
+            join_room(WireCodec.room_for(WireCodec.CODEC_JSON))
+
+        @sio.on('disconnect', namespace=namespace)
+        def handle_disconnect():
+            self.clients.remove(request.sid)
+
+        @sio.on('setCodec', namespace=namespace)
+        def handle_set_codec(jsonData):
+            codec = (jsonData or {}).get('codec', WireCodec.CODEC_JSON)
+            if codec not in WireCodec.CODECS:
+                codec = WireCodec.CODEC_JSON
+            previous = self.clients.set(request.sid, codec)
+            if previous and previous != codec:
+                leave_room(WireCodec.room_for(previous))
+            join_room(WireCodec.room_for(codec))
+            sio.emit('codecAck', {'codec': codec}, to=request.sid, namespace=namespace)
+
+        for event in CACHED_EVENTS:
+            self._register_cached(namespace, 'get' + event[0].upper() + event[1:], event)
+
+    def _register_cached(self, namespace, request_event, event):
+        @self.socketio.on(request_event, namespace=namespace)
+        def handle_get(jsonData=None):
+            with self.lock:
+                data = self.cache.get((namespace, event))
+            if data is not None:
+                self.socketio.emit(event, data, to=request.sid, namespace=namespace)
+
+    def on_frame(self, frame):
+        namespace, event, data = frame['ns'], frame['ev'], frame['data']
+        if namespace not in self.namespaces:
+            return # Lobby this edge was not started with
+        if event in CACHED_EVENTS:
+            with self.lock:
+                self.cache[(namespace, event)] = data
+        if frame.get('enc'):
+            WireCodec.emit_encoded(LobbyEmitter(self.socketio, namespace), event, data, registry=self.clients)
+        else:
+            self.socketio.emit(event, data, to=frame.get('to'), namespace=namespace)
+
+    def status(self):
+        return jsonify({
+            'bus': self.subscriber.url,
+            'clients': self.clients.total(),
+            'received': self.subscriber.received,
+            'last_seq': self.subscriber.last_seq,
+            'gaps': self.subscriber.gaps
+        })
+
+    def run(self, port):
+        self.subscriber.start()
+        print(f"Edge on port {port} ({ASYNC_MODE}) serving {', '.join(self.namespaces)} from {self.subscriber.url}")
+        self.socketio.run(self.app, host='0.0.0.0', port=port, debug=False, use_reloader=False, log_output=not PRODUCTION,
+                          allow_unsafe_werkzeug=ASYNC_MODE == 'threading') # Dev edges run on Werkzeug like application.py
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO fan-out edge for application.py")
+    parser.add_argument('--port', type=int, default=5060)
+    parser.add_argument('--bus', default=os.environ.get('SMARL_FANOUT', 'local://127.0.0.1:5070'), help="Frame bus url (same as the manager's SMARL_FANOUT)")
+    parser.add_argument('--production', action='store_true', help="eventlet/gevent server (also SMARL_SERVER_MODE=production)")
+    args = parser.parse_args()
+    Edge(args.bus, LobbyRegistry.load().namespaces()).run(args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# Load test for the RaceManager web server (run against a live application.py).
+# Connects a number of overlay sockets (half on the compact codec, half on JSON), drives
+# raceData.json at a fixed tick rate so the poller emits, and fires bursts of REST calls at
+# the same time. Reports raceData gaps per socket and API latency, and exits non-zero if the
+# emit loop stalls (a socket goes longer than --max-gap seconds without a tick).
+#
+#   SMARL_SERVER_MODE=production python application.py
+#   python socket_load_test.py --sockets 40 --duration 30
+# Note: this overwrites the watched raceData.json, so run it with the game stopped.
+import os, json, time
+import argparse
+import threading
+import statistics
+import requests
+import socketio
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+RACE_DATA_FILE = os.path.join(dir_path, "JsonData/RaceOutput/raceData.json")
+API_ENDPOINTS = ['/api/overlay_data', '/api/lap_history']
+
+
+class OverlaySocket:
+    """One simulated browser source. Records when each raceData tick arrives."""
+
+    def __init__(self, url, compact):
+        self.url = url
+        self.compact = compact
+        self.arrivals = []
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('connect', self._on_connect)
+        self.client.on('raceData', self._on_race_data)
+
+    def _on_connect(self):
+        if self.compact:
+            self.client.emit('setCodec', {'codec': 'soa'})
+
+    def _on_race_data(self, data):
+        self.arrivals.append(time.monotonic())
+
+    def connect(self):
+        self.client.connect(self.url, wait_timeout=10)
+
+    def close(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+    def max_gap(self):
+        gaps = [b - a for a, b in zip(self.arrivals, self.arrivals[1:])]
+        return max(gaps) if gaps else float('inf')
+
+
+def synthetic_racers(count):
+    """Raw 'rt' entries in the layout RaceControl.sv_output_data writes, for a raceData.json without a field."""
+    return [{'id': float(i + 1), 'name': f"LoadTest_{i + 1}", 'place': i + 1, 'lap': 1, 'lastLap': 0, 'bestLap': 0,
+             'gapTime': f"{i * 0.5:.3f}", 'interval': "0.500", 'locX': 0.0, 'locY': 0.0, 'speed': 0.0,
+             'prog': 0.0, 'dist': 0.0, 'pitState': 0, 'finished': False} for i in range(count)]
+
+
+def drive_race_data(path, tick_rate, stop_event, racers):
+    """Rewrites raceData.json tick_rate times a second (changing speeds each time) so the server emits."""
+    with open(path, 'r') as infile:
+        base = json.load(infile)
+    if not base.get('rt'):
+        base['rt'] = synthetic_racers(racers)
+    tick = 0
+    while not stop_event.is_set():
+        tick += 1
+        for racer in base['rt']:
+            racer['speed'] = (tick % 100) * 0.5 # Change content every tick
+            racer['prog'] = (tick % 600) / 600.0
+        # In place, like the game's sm.json.save: the poller reacts to modified events, and an
+        # atomic rename shows up as a move instead
+        with open(path, 'w') as outfile:
+            json.dump(base, outfile)
+        time.sleep(1.0 / tick_rate)
+
+
+def api_burst(url, burst_size, latencies, errors):
+    for i in range(burst_size):
+        endpoint = API_ENDPOINTS[i % len(API_ENDPOINTS)]
+        start = time.perf_counter()
+        try:
+            requests.get(url + endpoint, timeout=5).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            errors.append(endpoint)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket/API load test for application.py")
+    parser.add_argument('--url', default="http://localhost:5056")
+    parser.add_argument('--sockets', type=int, default=40, help="Overlay sockets to connect")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to run")
+    parser.add_argument('--tick-rate', type=float, default=10.0, help="raceData.json writes per second")
+    parser.add_argument('--burst-size', type=int, default=50, help="REST calls per burst")
+    parser.add_argument('--burst-every', type=float, default=2.0, help="Seconds between bursts")
+    parser.add_argument('--max-gap', type=float, default=1.0, help="Fail if any socket waits longer than this for a tick")
+    parser.add_argument('--race-data', default=RACE_DATA_FILE, help="Watched raceData.json to drive (its current contents are replayed)")
+    parser.add_argument('--racers', type=int, default=16, help="Synthetic racers to add when the raceData.json has none")
+    args = parser.parse_args()
+
+    sockets = [OverlaySocket(args.url, compact=i % 2 == 0) for i in range(args.sockets)]
+    for sock in sockets:
+        sock.connect()
+    print(f"Connected {len(sockets)} sockets to {args.url}")
+
+    stop_event = threading.Event()
+    driver = threading.Thread(target=drive_race_data, args=(args.race_data, args.tick_rate, stop_event, args.racers), daemon=True)
+    driver.start()
+
+    latencies, errors, bursts = [], [], []
+    end_time = time.monotonic() + args.duration
+    while time.monotonic() < end_time:
+        burst = threading.Thread(target=api_burst, args=(args.url, args.burst_size, latencies, errors), daemon=True)
+        burst.start()
+        bursts.append(burst)
+        time.sleep(args.burst_every)
+    stop_event.set()
+    for burst in bursts:
+        burst.join(timeout=10)
+    for sock in sockets:
+        sock.close()
+
+    received = [len(sock.arrivals) for sock in sockets]
+    gaps = [sock.max_gap() for sock in sockets]
+    expected = int(args.duration * args.tick_rate)
+    print(f"raceData ticks per socket: min {min(received)}, median {statistics.median(received)}, expected ~{expected}")
+    print(f"Worst gap between ticks: {max(gaps):.3f}s (limit {args.max_gap}s)")
+    print(f"API: {len(latencies)} ok, {len(errors)} failed, "
+          f"p50 {percentile(latencies, 50) * 1000:.1f} ms, p95 {percentile(latencies, 95) * 1000:.1f} ms, "
+          f"max {max(latencies, default=float('nan')) * 1000:.1f} ms")
+    if max(gaps) > args.max_gap or errors:
+        print("FAIL: emit loop starved or API calls failed")
+        raise SystemExit(1)
+    print("PASS")
+
+
+if __name__ == '__main__':
+    main()
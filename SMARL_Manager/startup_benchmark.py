@@ -0,0 +1,119 @@
+# Startup benchmark for application.py (run with the server stopped; it binds port 5056).
+# Measures, over a few cold starts:
+#   - import:    importing application.py (routes only, nothing started)
+#   - create:    create_app() (per lobby RaceManagers)
+#   - serving:   launch of `python application.py` until /api/lobbies answers
+#   - subsystems: launch until the raceData poller is running
+# plus the path lookup that used to run on every start (helpers.findFile walking the mod
+# folder) next to helpers.resource_path. Exits non-zero if serving takes longer than --budget.
+#
+#   python startup_benchmark.py --runs 5
+#   python startup_benchmark.py --production
+import os, sys, time
+import argparse
+import statistics
+import subprocess
+import threading
+import requests
+import helpers
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+APPLICATION = os.path.join(dir_path, "application.py")
+IMPORT_PROBE = (
+    "import time; t = time.perf_counter(); import application; t1 = time.perf_counter(); "
+    "application.create_app(); t2 = time.perf_counter(); print(f'PROBE {t1 - t:.4f} {t2 - t1:.4f}')"
+)
+
+
+def probe_import(env):
+    """(import seconds, create_app seconds) in a fresh interpreter."""
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=dir_path, env=env, capture_output=True, text=True, timeout=60).stdout
+    line = next(line for line in output.splitlines() if line.startswith('PROBE '))
+    _, import_time, create_time = line.split()
+    return float(import_time), float(create_time)
+
+
+def cold_start(url, env, timeout):
+    """Launches application.py, returns (seconds until it serves, seconds until subsystems are up)."""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, APPLICATION] + (['--production'] if env.get('SMARL_SERVER_MODE') == 'production' else []),
+                               cwd=dir_path, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    subsystems = {}
+
+    def watch_output():
+        for line in process.stdout:
+            if 'Monitoring thread started' in line and 'at' not in subsystems:
+                subsystems['at'] = time.perf_counter() - started
+
+    threading.Thread(target=watch_output, daemon=True).start()
+    serving = None
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if requests.get(url + "/api/lobbies", timeout=0.5).status_code == 200:
+                    serving = time.perf_counter() - started
+                    break
+            except requests.RequestException:
+                time.sleep(0.01)
+        while serving is not None and 'at' not in subsystems and time.perf_counter() - started < timeout:
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return serving, subsystems.get('at')
+
+
+def time_lookup(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values) * 1000:7.1f} ms  max {max(values) * 1000:7.1f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start timings for application.py")
+    parser.add_argument('--url', default="http://localhost:5056")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=30.0, help="Seconds to wait for one start")
+    parser.add_argument('--budget', type=float, default=1.0, help="Fail if the median time until serving exceeds this")
+    parser.add_argument('--production', action='store_true', help="Start the server in production mode (eventlet/gevent)")
+    args = parser.parse_args()
+    env = dict(os.environ, SMARL_SERVER_MODE='production' if args.production else 'dev')
+
+    walk_time, walk_path = time_lookup(helpers.findFile, "raceData.json", os.path.join(dir_path, os.pardir))
+    registry_time, registry_path = time_lookup(helpers.resource_path, "raceData.json")
+    print(f"raceData.json lookup: findFile walk {walk_time * 1000:.1f} ms ({walk_path}), resource_path {registry_time * 1000:.3f} ms ({registry_path})")
+
+    imports, creates, serves, subsystems = [], [], [], []
+    for run in range(args.runs):
+        import_time, create_time = probe_import(env)
+        serving, subsystems_up = cold_start(args.url, env, args.timeout)
+        imports.append(import_time)
+        creates.append(create_time)
+        serves.append(serving)
+        subsystems.append(subsystems_up)
+        print(f"run {run + 1}: import {import_time * 1000:.0f} ms, create_app {create_time * 1000:.0f} ms, "
+              f"serving {'timeout' if serving is None else f'{serving * 1000:.0f} ms'}, "
+              f"subsystems {'n/a' if subsystems_up is None else f'{subsystems_up * 1000:.0f} ms'}")
+
+    print(f"import      {summary(imports)}")
+    print(f"create_app  {summary(creates)}")
+    print(f"serving     {summary(serves)}")
+    print(f"subsystems  {summary(subsystems)}")
+    served = [v for v in serves if v is not None]
+    if len(served) < len(serves) or statistics.median(served) > args.budget:
+        print(f"FAIL: server not serving within the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
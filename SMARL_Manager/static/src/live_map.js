@@ -39,12 +39,14 @@ class LiveMap {
       vis.height = vis.config.containerHeight - vis.config.margin.top - vis.config.margin.bottom;
   
       // Setup Socket for local TCP data serving
-      var socket = io.connect('http://' + location.hostname + ':' + location.port);
+      var socket = io.connect(smarlSocketUrl());
+      useCompactRaceData(socket); // Ask for struct-of-arrays raceData (smarl_utils.js)
       socket.on( 'connect', function() {
         console.log("Socket connected!")    
       });
        
       socket.on('raceData', function( data ) {
+        data = decodeRaceData(data);
         if (data == null){return}
         let size = Object.keys(data).length; 
         if(size > 0){
@@ -84,4 +84,69 @@ function getOverallBestLapTime(data) {
         }
     }
     return bestTimeMs;
-}
\ No newline at end of file
+}
+
+// --- COMPACT RACE DATA (struct-of-arrays codec, see WireCodec.py) ---
+// Short field ids -> full keys. Must match FIELD_IDS/SECTION_IDS in WireCodec.py.
+const SMARL_FIELD_NAMES = {
+    i: 'id', o: 'owner', n: 'name', t: 'tag', u: 'uid', r: 'racer_id',
+    c1: 'primary_color', c2: 'secondary_color', c3: 'tertiary_color',
+    p: 'pos', l: 'lapNum', ll: 'lastLap', bl: 'bestLap',
+    lm: 'lastLapMs', bm: 'bestLapMs',
+    gl: 'gapToLeader', gn: 'gapToNext', x: 'locX', y: 'locY', s: 'speed',
+    pr: 'prog', d: 'dist', f: 'isFocused', st: 'st', fl: 'fl', th: 'th',
+    ps: 'ps', fi: 'finished', sp: 'split', ft: 'finishTime',
+};
+const SMARL_SECTION_NAMES = { md: 'meta_data', qd: 'qualifying_data', fd: 'finish_data', rt: 'realtime_data' };
+
+// Asks the server for compact raceData. Sent on every (re)connect since the server starts each client on JSON.
+function useCompactRaceData(socket) {
+    const request = () => socket.emit('setCodec', { codec: 'soa' });
+    socket.on('connect', request);
+    if (socket.connected) request();
+}
+
+// Turns a compact payload back into the usual {realtime_data: [...], ...} dict. Plain JSON payloads pass through.
+function decodeRaceData(data) {
+    if (data == null || data._soa === undefined) return data;
+    const out = {};
+    for (const [sectionId, value] of Object.entries(data.d)) {
+        const section = SMARL_SECTION_NAMES[sectionId] || sectionId;
+        if (value && value.c !== undefined && value.n !== undefined) {
+            const rows = Array.from({ length: value.n }, () => ({}));
+            for (const [fieldId, column] of Object.entries(value.c)) {
+                const key = SMARL_FIELD_NAMES[fieldId] || fieldId;
+                for (let i = 0; i < value.n; i++) rows[i][key] = column[i];
+            }
+            out[section] = rows;
+        } else {
+            out[section] = value;
+        }
+    }
+    return out;
+}
+
+// --- RACE EVENTS (see RaceEvents.py) ---
+// The server diffs frames once and emits 'raceEvents' (a list per tick) with typed events:
+// status, overtake, pit_entry, pit_exit, best_lap, lapped, finish, dnf.
+// handler(event) is called for each event, optionally only for the given types.
+function onRaceEvents(socket, handler, types) {
+    const wanted = types ? new Set(types) : null;
+    socket.on('raceEvents', (events) => {
+        for (const event of events || []) {
+            if (!wanted || wanted.has(event.type)) handler(event);
+        }
+    });
+}
+
+// --- LOBBIES (see Lobbies.py) ---
+// An overlay follows the lobby named in its own URL (?lobby=<id>) by connecting to that lobby's
+// Socket.IO namespace. Without it (and for the primary lobby) it uses the default namespace.
+// ?edge=<host:port> connects to a socket_edge.py fan-out worker instead of the manager (see FrameBus.py).
+function smarlSocketUrl() {
+    const params = new URLSearchParams(location.search);
+    const edge = params.get('edge');
+    const base = 'http://' + (edge || (document.domain + ':' + location.port));
+    const lobby = params.get('lobby');
+    return lobby ? base + '/lobby/' + encodeURIComponent(lobby) : base;
+}
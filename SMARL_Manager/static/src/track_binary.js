@@ -0,0 +1,66 @@
+/*
+    File: static/src/track_binary.js
+    Reader for .smtk track files (SMARL_Manager/TrackBinary.py has the layout): a 40 byte
+    header, the track name, then one float32 column per field. Columns are wrapped in
+    Float32Arrays over the fetched buffer, nothing is parsed per node.
+*/
+const SMTK_MAGIC = "SMTK";
+const SMTK_HEADER_SIZE = 40;
+const SMTK_FLAG_RACE = 1;
+const SMTK_FLAG_PERP = 2;
+const SMTK_FLAG_SECTOR = 4;
+const SMTK_COLUMNS = [
+    ["id", 0], ["midX", 0], ["midY", 0], ["midZ", 0], ["width", 0], ["dist", 0],
+    ["raceX", SMTK_FLAG_RACE], ["raceY", SMTK_FLAG_RACE], ["raceZ", SMTK_FLAG_RACE],
+    ["perpX", SMTK_FLAG_PERP], ["perpY", SMTK_FLAG_PERP],
+    ["sid", SMTK_FLAG_SECTOR],
+];
+
+// Parses an ArrayBuffer holding an .smtk file. Returns null if it is not one.
+function parseTrackBinary(buffer) {
+    if (buffer.byteLength < SMTK_HEADER_SIZE) return null;
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+    if (magic !== SMTK_MAGIC) return null;
+    const flags = view.getUint16(6, true);
+    const count = view.getUint32(8, true);
+    const nameLength = view.getUint16(36, true);
+    const track = {
+        version: view.getUint16(4, true),
+        flags: flags,
+        count: count,
+        trackId: view.getInt32(12, true),
+        length: view.getFloat32(16, true),
+        bounds: {
+            minX: view.getFloat32(20, true), minY: view.getFloat32(24, true),
+            maxX: view.getFloat32(28, true), maxY: view.getFloat32(32, true),
+        },
+        name: new TextDecoder().decode(new Uint8Array(buffer, SMTK_HEADER_SIZE, nameLength)),
+        columns: {},
+    };
+    let offset = SMTK_HEADER_SIZE + nameLength + ((4 - nameLength % 4) % 4);
+    for (const [field, flag] of SMTK_COLUMNS) {
+        if (flag && !(flags & flag)) continue;
+        track.columns[field] = new Float32Array(buffer, offset, count); // Little endian, like every browser host
+        offset += 4 * count;
+    }
+    // Per node objects in the JSON layout ({id, midX, midY, ...}) for code that expects the old array
+    track.nodes = function () {
+        const fields = Object.keys(track.columns);
+        const nodes = new Array(count);
+        for (let i = 0; i < count; i++) {
+            const node = {};
+            for (const field of fields) node[field] = track.columns[field][i];
+            nodes[i] = node;
+        }
+        return nodes;
+    };
+    return track;
+}
+
+// Fetches and parses an .smtk file. Resolves to null if the server has no map.
+function loadTrackBinary(url) {
+    return fetch(url)
+        .then(response => response.ok ? response.arrayBuffer() : null)
+        .then(buffer => buffer ? parseTrackBinary(buffer) : null);
+}
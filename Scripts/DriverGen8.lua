@@ -116,6 +116,8 @@ function DriverGen8.server_init(self)
     -- Sector timing
     self.lastSectorID = 0
     self.sectorTimes = { 0.0, 0.0, 0.0 } -- [NEW] Storage for split times
+    self.lastLapSectors = { 0.0, 0.0, 0.0 } -- Splits of the last completed lap (sectorTimes is reset on entering S1)
+    self.sectorLaps = 0                     -- Bumped whenever lastLapSectors changes so the manager can spot a new set
     self.lastSectorTimestamp = 0.0       -- [NEW] To calculate duration
 
 
@@ -545,6 +547,13 @@ function DriverGen8.sv_load_tuning_data(self)
     if not success then return end
     local car_data = getKeyValue(data, 'racer_id', self.metaData.ID)
     if not car_data then return end
+    self:sv_apply_tuning(car_data)
+end
+
+-- Applies one racer's tuning (a tuningData.json row, or a tunCAR delta entry from the manager)
+function DriverGen8.sv_apply_tuning(self, car_data)
+    if self.twitchCar then return end
+    if getRaceControl() and getRaceControl().tuningEnabled == false then return end
     self.Tire_Type = tonumber(car_data.tire_type)
     self.Fuel_Level = tonumber(car_data.fuel_level)
     self.Gear_Length = tonumber(car_data.gear_length)
@@ -743,8 +752,12 @@ function DriverGen8.checkSectorCross(self)
 
         -- 2. Handle New Lap (Entering Sector 1)
         if currentSector == 1 then
+            -- Keep the completed lap's splits (S3 was only just written above) before resetting
+            if self.lastSectorID and self.lastSectorID > 0 then
+                self.lastLapSectors = self.sectorTimes
+                self.sectorLaps = (self.sectorLaps or 0) + 1
+            end
             -- Reset sectors for the new lap
-            -- (Note: Sector 3 from previous lap is saved in 'lastLap' total time via checkLapCross)
             self.sectorTimes = { 0.0, 0.0, 0.0 }
         end
 
@@ -19,7 +19,7 @@ RaceControl.colorNormal = sm.color.new(0xffc0cbff)
 RaceControl.colorHighlight = sm.color.new(0xffb6c1ff)
 
 -- Constants for Data Output
-local OUTPUT_DATA = "$CONTENT_DATA/SMARL_Manager/JsonData/RaceOutput/raceData.json"
+local OUTPUT_DATA = OUTPUT_DATA -- globals.lua (per lobby when LOBBY_ID is set)
 local MAP_DATA_PATH = "$CONTENT_DATA/SMARL_Manager/JsonData/TrackData/current_map.json"
 local RACER_DATA_PATH = "$CONTENT_DATA/SMARL_Manager/JsonData/RacerData/"
 local TWITCH_BLUEPRINTS_PATH = "$CONTENT_DATA/SMARL_Manager/TwitchPlays/Blueprints/"
@@ -415,6 +415,8 @@ function RaceControl.sv_output_data(self)
             lastLap = driver.lastLap or 0.0,
             bestLap = driver.bestLap or 0.0,
             st = driver.sectorTimes or {0.0, 0.0, 0.0},
+            lst = driver.lastLapSectors or {0.0, 0.0, 0.0}, -- Splits of the last completed lap
+            lsn = driver.sectorLaps or 0,
             
             -- Gaps (The new smoothed logic)
             gapDist = driver.raceSplit or 0.0,          -- Meters behind leader
@@ -493,7 +495,9 @@ function RaceControl.sv_output_data_old(self)
             tt = driver.Tire_Type or 2,     
             sa = driver.Spoiler_Angle or 0.5,
             gl = driver.Gear_Length or 0.5,  
-            st = driver.sectorTimes or {0, 0, 0}
+            st = driver.sectorTimes or {0, 0, 0},
+            lst = driver.lastLapSectors or {0, 0, 0},
+            lsn = driver.sectorLaps or 0
         }
 
         if driver.perceptionData and driver.perceptionData.Telemetry then
@@ -1,8 +1,8 @@
 -- TwitchManager.lua
 TwitchManager = class(nil)
 
-local API_INSTRUCTIONS = "$CONTENT_DATA/JsonData/commands_to_lua.json"
-local ACK_FILE = "$CONTENT_DATA/JsonData/lua_ack.json"
+local API_INSTRUCTIONS = LOBBY_DATA_PATH and (LOBBY_DATA_PATH .. "commands_to_lua.json") or "$CONTENT_DATA/JsonData/commands_to_lua.json"
+local ACK_FILE = LOBBY_DATA_PATH and (LOBBY_DATA_PATH .. "lua_ack.json") or "$CONTENT_DATA/JsonData/lua_ack.json"
 local DECK_INSTRUCTIONS = "$CONTENT_DATA/JsonData/cameraInput.json" 
 
 function TwitchManager.server_init(self, raceControl)
@@ -58,15 +58,60 @@ function TwitchManager.executeCommand(self, instruction)
     elseif cmd == "impLEG" then self.RC:sv_import_league(val)
     elseif cmd == "pitCAR" then 
          -- self.RC.PitManager:forcePit(val) 
+    elseif cmd == "tunCAR" then self:applyTuning(rawVal)
     end
 end
 
+-- rawVal: { [racer_id] = { tire_type, fuel_level, gear_length, aero_angle } } for the racers whose tuning changed
+function TwitchManager.applyTuning(self, tuning)
+    if type(tuning) ~= "table" then return end
+    local applied = 0
+    for racerId, carData in pairs(tuning) do
+        local driver = getDriverFromMetaId(racerId)
+        if driver and driver.sv_apply_tuning then
+            driver:sv_apply_tuning(carData)
+            applied = applied + 1
+        end
+    end
+    print("TwitchManager: Re-tuned " .. applied .. " cars.")
+end
+
 function TwitchManager.readStreamDeck(self)
     local success, data = pcall(sm.json.open, DECK_INSTRUCTIONS)
-    if not success or type(data) ~= "table" or not data.command then return end
-    local cmd = data.command
-    local val = tonumber(data.value)
+    if not success or type(data) ~= "table" or not data.command then
+        if self.deckSession == nil then self.deckSession = false end -- Nothing stale to skip
+        return
+    end
+    if data.seq and data.commands then
+        -- readDeck.py is the only writer: run the commands newer than the last seen seq, keep the file
+        if self.deckSession == nil then
+            self.deckSession = data.session
+            self.deckSeq = data.seq -- Already there when the game started, not meant for this session
+            return
+        end
+        if data.session ~= self.deckSession then
+            self.deckSession = data.session
+            self.deckSeq = nil -- readDeck.py (re)started after us: unset, so every command it wrote is new
+        end
+        local lastSeq = self.deckSeq or 0
+        if data.seq <= lastSeq then return end
+        for _, entry in ipairs(data.commands) do
+            if entry.seq > lastSeq then
+                self:runDeckCommand(entry.command, tonumber(entry.value))
+            end
+        end
+        self.deckSeq = data.seq
+        return
+    end
+    -- Single command file without seq: consume it. The file is live from here on, so a later
+    -- switch to the seq format must not be mistaken for a stale file left from before the game started
+    self.deckSession = false
+    self.deckSeq = nil
     pcall(sm.json.save, {}, DECK_INSTRUCTIONS)
+    self:runDeckCommand(data.command, tonumber(data.value))
+end
+
+function TwitchManager.runDeckCommand(self, cmd, val)
     if cmd == "cMode" and self.RC.CameraManager then
         self.RC.CameraManager:setCameraMode(val)
     elseif cmd == "raceMode" then
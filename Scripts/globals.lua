@@ -15,8 +15,14 @@ DOWNFORCE_BLOCK_UUID = "1e3b7ff3-d066-4b8b-9cb1-fa4a6ad8cc7c"
 
 -- Paths
 TRACK_DATA_CHANNEL = "SM_AutoRacers_TrackData"
-OUTPUT_DATA = "$CONTENT_DATA/SMARL_Manager/JsonData/RaceOutput/raceData.json"
+-- Lobby (SMARL_Manager/Lobbies.py). nil: the single/primary lobby paths. A game instance that feeds a
+-- secondary lobby sets its lobby id in the mod copy it loads; race data, commands and acks then go
+-- through SMARL_Manager/JsonData/Lobbies/<id>/ (the lobby's "dir" on the manager side).
+LOBBY_ID = nil
+LOBBY_DATA_PATH = LOBBY_ID and ("$CONTENT_DATA/SMARL_Manager/JsonData/Lobbies/" .. LOBBY_ID .. "/") or nil
+OUTPUT_DATA = LOBBY_DATA_PATH and (LOBBY_DATA_PATH .. "raceData.json") or "$CONTENT_DATA/SMARL_Manager/JsonData/RaceOutput/raceData.json"
 MAP_DATA_PATH = "$CONTENT_DATA/SMARL_Manager/JsonData/TrackData/current_map.json"
+RACE_LINE_PATH = "$CONTENT_DATA/SMARL_Manager/JsonData/TrackData/current_raceline.json" -- SMARL_Manager/RaceLine.py output
 RACER_DATA_PATH = "$CONTENT_DATA/SMARL_Manager/JsonData/RacerData/"
 TWITCH_BLUEPRINTS_PATH = "$CONTENT_DATA/SMARL_Manager/TwitchPlays/Blueprints/"
 TUNING_PROFILES ="$CONTENT_DATA/SMARL_Manager/JsonData/tuning_profiles.json"
@@ -263,6 +263,47 @@ function Loader.sv_loadWorldTrackData(self, channel)
     return sm.storage.load(channel)
 end
 
+-- Offline racing line (SMARL_Manager/RaceLine.py). Nodes use the same layout as the scanner
+-- export plus speed/curv. Merged by node id into the track held by the block (the line is
+-- solved in the coordinates the track was scanned in), or used as the whole track if the
+-- block has none yet.
+function Loader.sv_importRaceLine(self)
+    local ok, lineData = pcall(sm.json.open, RACE_LINE_PATH)
+    if not ok or not lineData or not lineData.C or not lineData.C.raceChain then
+        self:sv_sendAlert("Error: No optimized race line found!")
+        return
+    end
+
+    if self.trackData and self.trackData.C and self.trackData.C.raceChain then
+        local byId = {}
+        for _, node in ipairs(lineData.C.raceChain) do byId[node.id] = node end
+        local merged = 0
+        for _, node in ipairs(self.trackData.C.raceChain) do
+            local lineNode = byId[node.id]
+            if lineNode then
+                node.pos = lineNode.pos
+                node.location = nil -- Stored chains use 'pos', offsetSingleChain prefers 'location'
+                node.speed = lineNode.speed
+                node.curv = lineNode.curv
+                merged = merged + 1
+            end
+        end
+        print("Loader: Merged optimized race line into " .. merged .. "/" .. #self.trackData.C.raceChain .. " nodes")
+    else
+        self.trackData = {
+            ["N"] = lineData.N or self.trackName,
+            ["I"] = lineData.I or self.trackID,
+            ["C"] = lineData.C,
+            ["O"] = self.location,
+            ["D"] = self.direction
+        }
+        print("Loader: Loaded optimized race line as track (" .. #lineData.C.raceChain .. " nodes)")
+    end
+    self.storage:save(self.trackData)
+    self:sv_sendAlert(string.format("Race Line Imported (est. lap %.2fs)", lineData.lapTime or 0))
+    self:sv_loadTrack()
+end
+
 -- --- OFFSET CALCULATION ---
 
 function Loader.calculateOffsetData(self)
@@ -335,6 +376,7 @@ end
 function Loader.client_canInteract(self, character)
     sm.gui.setInteractionText("Save World Track -> Block (Blueprint)", sm.gui.getKeyBinding("Use", true))
     sm.gui.setInteractionText( "Load Block Track -> World (Play)", sm.gui.getKeyBinding("Tinker", true))
+    sm.gui.setInteractionText("Import Optimized Race Line -> Block (Crouch +", sm.gui.getKeyBinding("Use", true), ")")
     return true 
 end
 
@@ -346,5 +388,10 @@ function Loader.client_onTinker( self, character, state )
 end
 
 function Loader.client_onInteract(self, character, state)
-     if state then self.network:sendToServer("sv_saveTrack") end
+     if not state then return end
+     if character:isCrouching() then
+         self.network:sendToServer("sv_importRaceLine")
+     else
+         self.network:sendToServer("sv_saveTrack")
+     end
 end
\ No newline at end of file